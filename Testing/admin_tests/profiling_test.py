@@ -0,0 +1,119 @@
+import unittest
+from unittest.mock import patch
+import tempfile
+import threading
+import time
+import shutil
+import tracemalloc
+from collections import Counter
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'backend')))
+from models.cache import configure_caches
+from models.circuit_breaker import configure_breakers
+from models.scheduler import configure_scheduler
+from models.profiling import MIN_INTERVAL, ProfilerBusy, ProfilingMiddleware, collapsed, profile_app, sample_stacks
+
+def busy_loop_for_sampling(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+class TestProfiling(unittest.TestCase):
+    """
+    Unit tests for the on-demand profiler.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.env = patch.dict(os.environ, {'ADMIN_TOKEN': 'secret', 'SESSION_FILE_DIR': self.tmpdir,
+                                           'RATE_LIMITS': 'off', 'CACHE_BACKEND': 'none'})
+        self.env.start()
+        import app as backend
+        self.app = backend.create_app(watch_models=False)
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        self.env.stop()
+        configure_breakers([])
+        configure_scheduler({})
+        configure_caches('none')
+        shutil.rmtree(self.tmpdir)
+
+    def test_sample_stacks(self):
+        """Test that sampling sees the functions other threads are running"""
+        stop = threading.Event()
+        thread = threading.Thread(target=busy_loop_for_sampling, args=(stop,))
+        thread.start()
+        try:
+            stacks, samples = sample_stacks(0.2, 0.005)
+        finally:
+            stop.set()
+            thread.join()
+        self.assertGreater(samples, 5)
+        self.assertIn('busy_loop_for_sampling', collapsed(stacks))
+        self.assertTrue(all(line.rsplit(' ', 1)[1].isdigit() for line in collapsed(stacks).splitlines()))
+
+    def test_zero_interval(self):
+        """Test that a zero interval waits the shortest interval between samples instead of spinning"""
+        stop = threading.Event()
+        with patch.object(stop, 'wait', wraps=stop.wait) as mock_wait:
+            sample_stacks(0.05, 0, stop=stop)
+        self.assertTrue(all(call.args == (MIN_INTERVAL,) for call in mock_wait.call_args_list))
+        self.assertLessEqual(mock_wait.call_count, 0.05 / MIN_INTERVAL + 1)
+
+    def test_cprofile_requests(self):
+        """Test that cprofile mode profiles the given number of requests and then uninstalls itself"""
+        original = self.app.wsgi_app
+        result = {}
+        thread = threading.Thread(target=lambda: result.update(
+            profile_app(self.app, 'cprofile', duration=10, max_requests=2)))
+        thread.start()
+        while not isinstance(self.app.wsgi_app, ProfilingMiddleware):
+            time.sleep(0.001)
+        for _ in range(3):
+            self.assertEqual(self.client.get('/metrics').status_code, 200)
+        thread.join()
+        self.assertEqual(result['requests'], 2)
+        self.assertIn('metrics', result['pstats'])
+        self.assertEqual(self.app.wsgi_app, original)
+        self.assertNotIn('wsgi_app', vars(self.app))
+
+    def test_one_session_at_a_time(self):
+        """Test that a second session is refused while one runs"""
+        thread = threading.Thread(target=profile_app, args=(self.app, 'sampling', 0.3))
+        thread.start()
+        time.sleep(0.05)
+        try:
+            with self.assertRaises(ProfilerBusy):
+                profile_app(self.app, 'sampling', 0.1)
+        finally:
+            thread.join()
+
+    def test_tracemalloc_diff(self):
+        """Test that allocation growth during the session is reported and tracing stops afterwards"""
+        retained = []
+
+        def allocate_while_sampling(duration, interval):
+            retained.extend(bytearray(1024) for _ in range(2000))
+            return Counter(), 0
+
+        with patch('models.profiling.sample_stacks', side_effect=allocate_while_sampling):
+            report = profile_app(self.app, 'sampling', 0.1, trace_memory=True)
+        self.assertTrue(any('profiling_test.py' in line for line in report['tracemalloc']))
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_endpoint(self):
+        """Test that the endpoint requires the admin token and returns the report"""
+        self.assertEqual(self.client.post('/admin/profile', json={'duration': 0.05}).status_code, 401)
+        headers = {'Authorization': 'Bearer secret'}
+        report = self.client.post('/admin/profile', json={'duration': 0.05}, headers=headers).get_json()
+        self.assertEqual(report['mode'], 'sampling')
+        self.assertIn('collapsed', report)
+        response = self.client.post('/admin/profile?format=text', json={'duration': 0.05}, headers=headers)
+        self.assertEqual(response.mimetype, 'text/plain')
+        response = self.client.post('/admin/profile', json={'mode': 'perf'}, headers=headers)
+        self.assertEqual(response.status_code, 400)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import unittest
+import importlib.util
+from unittest.mock import patch
+import asyncio
+import json
+import shutil
+import tempfile
+import threading
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'backend')))
+from models.cache import configure_caches
+from models.circuit_breaker import configure_breakers
+from models.scheduler import configure_scheduler
+from models.fertilizer_recomm_oo import FertilizerPredictor
+
+
+# httpx and asgiref only come with the asgi extra
+ASGI_EXTRA = bool(importlib.util.find_spec('asgiref') and importlib.util.find_spec('httpx'))
+
+
+def request(app, method, path, body=b'', headers=()):
+    """Sends one HTTP request through an ASGI app and returns (status, headers, body)."""
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': b'', 'root_path': '',
+             'headers': [(b'content-type', b'application/json')] + list(headers), 'http_version': '1.1',
+             'scheme': 'http', 'server': ('testserver', 80), 'client': ('127.0.0.1', 1234)}
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    start, *body = sent
+    return start['status'], dict(start['headers']), b''.join(message.get('body', b'') for message in body)
+
+
+@unittest.skipUnless(ASGI_EXTRA, 'the asgi extra is not installed')
+class TestAsgiApp(unittest.TestCase):
+    """
+    Unit tests for the ASGI application.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.env = patch.dict(os.environ, {'SESSION_FILE_DIR': self.tmpdir, 'RATE_LIMITS': 'off',
+                                           'CACHE_BACKEND': 'none', 'WEATHER_API_KEY': 'key'})
+        self.env.start()
+        import app as backend
+        from asgi import create_asgi_app
+        self.flask_app = backend.create_app(watch_models=False)
+        self.app = create_asgi_app(self.flask_app)
+
+    def tearDown(self):
+        self.env.stop()
+        configure_breakers([])
+        configure_scheduler({})
+        configure_caches('none')
+        shutil.rmtree(self.tmpdir)
+
+    @patch.object(FertilizerPredictor, 'run_async')
+    def test_fertilizer_recommendation(self, mock_run_async):
+        """Test that recommendations are served by the async pipeline"""
+        mock_run_async.return_value = {'Urea (25kg bags)': 4, 'DAP (25kg bags)': 3, 'MOP (25kg bags)': 2}
+        body = json.dumps({'area_name': 'Kampala', 'crop_type': 'maize', 'farm_size_acres': 10,
+                           'intervals': True}).encode()
+
+        status, headers, content = request(self.app, 'POST', '/fertilizer_recommendation', body,
+                                           [(b'x-request-id', b'abc')])
+
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(content), mock_run_async.return_value)
+        self.assertEqual(headers[b'x-request-id'], b'abc')
+        mock_run_async.assert_called_once_with(intervals=True)
+
+    @patch.object(FertilizerPredictor, 'run_async', return_value={})
+    def test_intervals_flag(self, mock_run_async):
+        """Test that only JSON true and true-like strings ask for intervals"""
+        for flag, expected in ((True, True), ('true', True), ('1', True), ('false', False), ('0', False),
+                               (0, False), (None, False)):
+            body = json.dumps({'area_name': 'Kampala', 'crop_type': 'maize', 'farm_size_acres': 10,
+                               'intervals': flag}).encode()
+            request(self.app, 'POST', '/fertilizer_recommendation', body)
+            self.assertEqual(mock_run_async.call_args, ((), {'intervals': expected}), flag)
+
+    def test_missing_parameters(self):
+        """Test that requests without the required parameters are rejected"""
+        status, _, content = request(self.app, 'POST', '/fertilizer_recommendation', b'{"area_name": "Kampala"}')
+        self.assertEqual(status, 400)
+        self.assertEqual(json.loads(content), {"error": "Missing required parameters"})
+        self.assertEqual(request(self.app, 'POST', '/fertilizer_recommendation', b'{')[0], 400)
+
+    @patch.object(FertilizerPredictor, 'run_async', side_effect=RuntimeError('boom'))
+    def test_errors(self, mock_run_async):
+        """Test that handler errors become 500 responses"""
+        body = b'{"area_name": "Kampala", "crop_type": "maize", "farm_size_acres": 1}'
+        with self.assertLogs('asgi', 'ERROR'):
+            status = request(self.app, 'POST', '/fertilizer_recommendation', body)[0]
+        self.assertEqual(status, 500)
+
+    def test_other_routes_use_flask(self):
+        """Test that routes without an async handler are served by the Flask application"""
+        status, headers, content = request(self.app, 'GET', '/metrics')
+        self.assertEqual(status, 200)
+        self.assertTrue(headers[b'content-type'].startswith(b'text/plain'))
+        self.assertIn(b'farmai_', content)
+        self.assertEqual(request(self.app, 'GET', '/missing')[0], 404)
+
+    def test_flask_requests_overlap(self):
+        """Test that Flask requests run in threads of their own rather than one after another"""
+        barrier = threading.Barrier(2, timeout=2)
+        self.flask_app.add_url_rule('/rendezvous', 'rendezvous', lambda: str(barrier.wait()))
+        statuses = []
+        threads = [threading.Thread(target=lambda: statuses.append(request(self.app, 'GET', '/rendezvous')[0]))
+                   for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(statuses, [200, 200])
+
+    def test_lifespan(self):
+        """Test that startup and shutdown are acknowledged"""
+        messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        asyncio.run(self.app({'type': 'lifespan'}, receive, send))
+        self.assertEqual(sent, ['lifespan.startup.complete', 'lifespan.shutdown.complete'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,247 @@
+"""
+Micro-benchmarks for the backend hot paths.
+
+Runs DataPreparer, FertilizerCalculator, CreditScoringModel.predict and explain and crop model
+loading at several batch sizes using only the repository's CSV data and joblib
+models, then reports latency percentiles, throughput and allocations.
+
+Usage:
+    python bench_hot_paths.py                      # run and print results
+    python bench_hot_paths.py --save-baseline      # store results as the baseline
+    python bench_hot_paths.py --compare --threshold 0.25
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+import joblib
+import numpy as np
+import pandas as pd
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+backend_root = os.path.join(project_root, 'backend')
+sys.path.append(backend_root)
+sys.path.append(os.path.join(backend_root, 'training'))
+
+from models.credit_scoring_model import CreditScoringModel, FEATURE_NAMES
+from models.fertilizer_recomm_oo import DataPreparer, FertilizerCalculator
+
+DATA_PATH = os.path.join(backend_root, 'data', 'soil_climate_yield_data.csv')
+MODEL_DIR = os.path.join(backend_root, 'training')
+CREDIT_MODEL_PATH = os.path.join(backend_root, 'models', 'credit_scoring_model.pkl')
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baselines', 'hot_paths.json')
+BATCH_SIZES = (1, 100, 10000)
+SOIL_COLUMNS = {
+    'PHAQ': 'phh2o_0-5cm_mean',
+    'TOTC': 'soc_0-5cm_mean',
+    'TOTN': 'nitrogen_0-5cm_mean',
+    'CECS': 'cec_0-5cm_mean'
+}
+FEATURES = ['PHAQ', 'TOTC', 'TOTN', 'CECS', 'TEMP', 'RAIN', 'HUMI', 'SUNH']
+
+
+def sample_rows(df, n, seed=0):
+    """Resample the dataset to exactly n rows."""
+    return df.sample(n=n, replace=True, random_state=seed).reset_index(drop=True)
+
+
+def load_credit_model():
+    """Load the trained credit model, or train one on synthetic data if it is missing."""
+    model = CreditScoringModel()
+    if os.path.exists(CREDIT_MODEL_PATH):
+        model.load_model(CREDIT_MODEL_PATH)
+    else:
+        from train_credit_scoring_model import generate_synthetic_data
+        data = generate_synthetic_data(1000)
+        model.train_model(data[FEATURE_NAMES], model.calculate_credit_scores(data))
+    return model
+
+
+def build_cases(batch_sizes):
+    """
+    Build the benchmark cases.
+
+    Returns:
+        list: (name, batch size, callable) tuples.
+    """
+    df = pd.read_csv(DATA_PATH)
+    credit_model = load_credit_model()
+    maize_model = joblib.load(os.path.join(MODEL_DIR, 'model_maize.joblib'))
+    calculator = FertilizerCalculator()
+    coefficients = np.array([1.0, 0.5, 0.2])
+
+    cases = []
+    for crop in ('maize', 'cassava', 'beans'):
+        path = os.path.join(MODEL_DIR, f'model_{crop}.joblib')
+        cases.append((f'model_load.{crop}', 1, lambda path=path: joblib.load(path)))
+
+    for n in batch_sizes:
+        rows = sample_rows(df, n)
+        soil_df = rows[list(SOIL_COLUMNS)].rename(columns=SOIL_COLUMNS)
+        weather = {'TEMP': 24.2, 'HUMI': 81.0, 'RAIN': 1493.8, 'SUNH': 7.4}
+        prepared = rows[FEATURES]
+        yields = maize_model.predict(prepared)
+        credit_features = pd.DataFrame({
+            name: np.resize(values, n) for name, values in {
+                'income_stability': np.linspace(0.1, 0.5, 97),
+                'income_mean': np.linspace(500, 2000, 89),
+                'expense_stability': np.linspace(0.1, 0.5, 83),
+                'expense_mean': np.linspace(200, 800, 79),
+                'yield_consistency': np.linspace(10, 50, 73),
+                'community_engagement': np.arange(10)
+            }.items()
+        })
+
+        cases.extend([
+            ('data_preparer.prepare_data_for_model', n,
+             lambda soil_df=soil_df: DataPreparer.prepare_data_for_model(soil_df, weather)),
+            ('fertilizer_calculator.calculate_fertilizer_requirements', n,
+             lambda yields=yields: calculator.calculate_fertilizer_requirements(yields[:, None], coefficients, 4.04686)),
+            ('fertilizer_calculator.predict_fertilizer_requirements', n,
+             lambda prepared=prepared: calculator.predict_fertilizer_requirements(prepared, 'maize', 10)),
+            ('fertilizer_calculator.predict_with_intervals', n,
+             lambda prepared=prepared: calculator.predict_with_intervals(prepared, 'maize')),
+            ('credit_scoring_model.predict', n,
+             lambda credit_features=credit_features: credit_model.predict(credit_features)),
+            ('credit_scoring_model.explain', n,
+             lambda credit_features=credit_features: credit_model.explain(credit_features)),
+        ])
+    return cases
+
+
+def measure(fn, batch_size, repeats, warmup=2):
+    """
+    Time a callable and record its allocations.
+
+    Parameters:
+        fn (callable): The code under test.
+        batch_size (int): Items processed by one call, used for throughput.
+        repeats (int): Number of timed calls.
+        warmup (int): Untimed calls made first.
+
+    Returns:
+        dict: Latency percentiles in milliseconds, throughput in items per second
+            and the allocation peak and block count of a single call.
+    """
+    for _ in range(warmup):
+        fn()
+
+    timings = np.empty(repeats)
+    for i in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings[i] = time.perf_counter() - start
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, 'filename') if stat.count_diff > 0)
+
+    p50, p90, p99 = np.percentile(timings, [50, 90, 99]) * 1000
+    return {
+        'batch_size': batch_size,
+        'repeats': repeats,
+        'p50_ms': float(p50),
+        'p90_ms': float(p90),
+        'p99_ms': float(p99),
+        'mean_ms': float(timings.mean() * 1000),
+        'throughput_per_s': float(batch_size / timings.mean()),
+        'alloc_peak_bytes': int(peak),
+        'alloc_blocks': int(blocks)
+    }
+
+
+def run_benchmarks(batch_sizes=BATCH_SIZES, repeats=30, time_budget=2.0):
+    """
+    Run every case and collect its measurements.
+
+    Parameters:
+        batch_sizes (tuple): Batch sizes to benchmark.
+        repeats (int): Maximum timed calls per case.
+        time_budget (float): Approximate seconds to spend per case; slow cases
+            get fewer repeats, but never fewer than 5.
+
+    Returns:
+        dict: Measurements keyed by '<case>@<batch size>'.
+    """
+    results = {}
+    for name, batch_size, fn in build_cases(batch_sizes):
+        start = time.perf_counter()
+        fn()
+        single = time.perf_counter() - start
+        case_repeats = int(max(5, min(repeats, time_budget / max(single, 1e-9))))
+        results[f'{name}@{batch_size}'] = measure(fn, batch_size, case_repeats)
+    return results
+
+
+def compare_to_baseline(results, baseline, threshold):
+    """
+    Find cases whose median latency regressed past the threshold.
+
+    Parameters:
+        results (dict): Current measurements.
+        baseline (dict): Stored measurements.
+        threshold (float): Allowed relative slowdown, e.g. 0.25 for 25%.
+
+    Returns:
+        list: (case, baseline p50, current p50) for every regressed case.
+    """
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if previous and current['p50_ms'] > previous['p50_ms'] * (1 + threshold):
+            regressions.append((key, previous['p50_ms'], current['p50_ms']))
+    return regressions
+
+
+def print_results(results):
+    print(f"{'case':<70}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'items/s':>14}{'peak KiB':>11}{'blocks':>9}")
+    for key, r in results.items():
+        print(f"{key:<70}{r['p50_ms']:>10.3f}{r['p90_ms']:>10.3f}{r['p99_ms']:>10.3f}"
+              f"{r['throughput_per_s']:>14.1f}{r['alloc_peak_bytes'] / 1024:>11.1f}{r['alloc_blocks']:>9}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the backend hot paths.')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=list(BATCH_SIZES))
+    parser.add_argument('--repeats', type=int, default=30)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Path of the JSON baseline file')
+    parser.add_argument('--save-baseline', action='store_true', help='Store the results as the new baseline')
+    parser.add_argument('--compare', action='store_true', help='Fail if results regress against the baseline')
+    parser.add_argument('--threshold', type=float, default=float(os.getenv('BENCH_THRESHOLD', 0.25)),
+                        help='Allowed relative p50 slowdown before failing')
+    args = parser.parse_args(argv)
+    if args.compare and not args.save_baseline and not os.path.exists(args.baseline):
+        parser.error(f'no baseline at {args.baseline}; record one first with --save-baseline')
+
+    logging.getLogger().setLevel(logging.WARNING)
+    results = run_benchmarks(tuple(args.batch_sizes), args.repeats)
+    print_results(results)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f'Baseline saved to {args.baseline}')
+
+    if args.compare:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.threshold)
+        for key, before, after in regressions:
+            print(f'REGRESSION {key}: p50 {before:.3f} ms -> {after:.3f} ms')
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
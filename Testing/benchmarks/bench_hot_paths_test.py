@@ -0,0 +1,38 @@
+import unittest
+from unittest.mock import patch
+import contextlib
+import io
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+from bench_hot_paths import compare_to_baseline, main, measure
+
+class TestBenchHotPaths(unittest.TestCase):
+
+    def test_measure(self):
+        """Test that measure reports percentiles, throughput and allocations"""
+        result = measure(lambda: [0] * 1000, batch_size=10, repeats=5, warmup=0)
+        self.assertEqual(result['repeats'], 5)
+        self.assertTrue(result['p50_ms'] <= result['p90_ms'] <= result['p99_ms'])
+        self.assertGreater(result['throughput_per_s'], 0)
+        self.assertGreater(result['alloc_peak_bytes'], 0)
+
+    def test_compare_to_baseline(self):
+        """Test that only slowdowns past the threshold are reported"""
+        baseline = {'a@1': {'p50_ms': 10.0}, 'b@1': {'p50_ms': 10.0}}
+        results = {'a@1': {'p50_ms': 12.0}, 'b@1': {'p50_ms': 13.0}, 'c@1': {'p50_ms': 99.0}}
+        regressions = compare_to_baseline(results, baseline, threshold=0.25)
+        self.assertEqual(regressions, [('b@1', 10.0, 13.0)])
+
+    @patch('bench_hot_paths.run_benchmarks')
+    def test_compare_without_baseline(self, mock_run):
+        """Test that comparing against a missing baseline exits with a usage error before benchmarking"""
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr), self.assertRaises(SystemExit) as raised:
+            main(['--compare', '--baseline', os.path.join(os.path.dirname(__file__), 'missing.json')])
+        self.assertEqual(raised.exception.code, 2)
+        self.assertIn('--save-baseline', stderr.getvalue())
+        mock_run.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+"""
+Benchmark of the full and targeted SoilGrids queries.
+
+Compares the response size, the time to turn a response into the model's input
+and the latency of the whole soil stage, served by the fake SoilGrids upstream
+from Testing/load_tests, for the default query returning every property, depth
+and statistic against SOILGRIDS_QUERY=targeted.
+
+Usage:
+    python bench_soil_query.py
+    python bench_soil_query.py --repeats 100 --json results.json
+"""
+import argparse
+import json
+import os
+import sys
+from unittest.mock import patch
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.append(os.path.dirname(__file__))
+sys.path.append(os.path.join(project_root, 'Testing', 'load_tests'))
+sys.path.append(os.path.join(project_root, 'backend'))
+
+from bench_hot_paths import measure
+from fake_upstreams import FakeSoilGrids
+from models import fertilizer_recomm_oo as pipeline
+from models.fertilizer_recomm_oo import DataPreparer, SoilDataFetcher
+
+LATITUDE, LONGITUDE = 0.3177137, 32.5813539
+WEATHER = {'TEMP': 25.0, 'RAIN': 2.0, 'HUMI': 70.0, 'SUNH': 12.0}
+TARGETED_QUERY = {'property': list(pipeline.SOIL_PROPERTIES), 'depth': [pipeline.DEPTH],
+                  'value': [SoilDataFetcher.STATISTIC]}
+
+
+def parse_full(content):
+    """The default path: decode, flatten into a one-row DataFrame and select the features."""
+    soil_properties = SoilDataFetcher.flatten_soil_properties(json.loads(content))
+    return DataPreparer.prepare_data_for_model(SoilDataFetcher.soil_frame(soil_properties), WEATHER)
+
+
+def parse_targeted(content):
+    """The targeted path: parse straight into the feature array."""
+    values = SoilDataFetcher.parse_soil_features(content)
+    return DataPreparer.prepare_from_features(dict(DataPreparer.soil_features(values), **WEATHER))
+
+
+def run_benchmarks(repeats=50):
+    """
+    Measure both query modes.
+
+    Returns:
+        dict: Payload bytes per mode, and measurements keyed by '<stage>@<mode>'.
+    """
+    soilgrids = FakeSoilGrids().start()
+    try:
+        payloads = {'full': soilgrids.payload, 'targeted': soilgrids.filtered_payload(TARGETED_QUERY)}
+        results = {'payload_bytes': {mode: len(payload) for mode, payload in payloads.items()}}
+        results['parse@full'] = measure(lambda: parse_full(payloads['full']), 1, repeats)
+        results['parse@targeted'] = measure(lambda: parse_targeted(payloads['targeted']), 1, repeats)
+
+        full, targeted = SoilDataFetcher(targeted=False), SoilDataFetcher(targeted=True)
+        with patch.object(pipeline, 'SOILGRIDS_URL', soilgrids.url):
+            results['soil_stage@full'] = measure(
+                lambda: DataPreparer.prepare_data_for_model(full.fetch_soil_data(LATITUDE, LONGITUDE), WEATHER),
+                1, repeats)
+            results['soil_stage@targeted'] = measure(
+                lambda: DataPreparer.prepare_from_features(
+                    dict(zip(pipeline.SOIL_FEATURES, targeted.fetch_soil_features(LATITUDE, LONGITUDE)), **WEATHER)),
+                1, repeats)
+    finally:
+        soilgrids.stop()
+    return results
+
+
+def print_results(results):
+    sizes = results['payload_bytes']
+    print(f"payload bytes: full {sizes['full']}, targeted {sizes['targeted']} "
+          f"({sizes['full'] / sizes['targeted']:.1f}x smaller)")
+    print(f"{'case':<24}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'peak KiB':>11}{'blocks':>9}")
+    for key, r in results.items():
+        if key == 'payload_bytes':
+            continue
+        print(f"{key:<24}{r['p50_ms']:>10.3f}{r['p90_ms']:>10.3f}{r['p99_ms']:>10.3f}"
+              f"{r['alloc_peak_bytes'] / 1024:>11.1f}{r['alloc_blocks']:>9}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the full and targeted SoilGrids queries.')
+    parser.add_argument('--repeats', type=int, default=50)
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.repeats)
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
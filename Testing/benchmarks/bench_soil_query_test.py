@@ -0,0 +1,25 @@
+import unittest
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+from bench_soil_query import TARGETED_QUERY, parse_full, parse_targeted, run_benchmarks
+from fake_upstreams import FakeSoilGrids
+
+class TestBenchSoilQuery(unittest.TestCase):
+
+    def test_modes_agree(self):
+        """Test that every case is measured and the targeted payload is smaller"""
+        results = run_benchmarks(repeats=2)
+        self.assertLess(results['payload_bytes']['targeted'], results['payload_bytes']['full'])
+        self.assertEqual(set(results), {'payload_bytes', 'parse@full', 'parse@targeted',
+                                        'soil_stage@full', 'soil_stage@targeted'})
+
+    def test_parsers_agree(self):
+        """Test that the full and targeted parsers select the same features"""
+        soilgrids = FakeSoilGrids()
+        full = parse_full(soilgrids.payload)
+        targeted = parse_targeted(soilgrids.filtered_payload(TARGETED_QUERY))
+        self.assertEqual(full.values.tolist(), targeted.values.tolist())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+"""
+Import-time profile of the backend.
+
+Imports a backend module in a fresh interpreter with `-X importtime`, then reports
+the total import time, its slowest direct imports and which heavy dependencies
+were loaded. Results can be stored as a JSON baseline and compared against it so
+that startup cost is tracked over releases.
+
+Usage:
+    python import_profile.py                       # profile `import app`
+    python import_profile.py --save-baseline
+    python import_profile.py --compare --threshold 0.3
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+backend_root = os.path.join(project_root, 'backend')
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baselines', 'import_profile.json')
+HEAVY_MODULES = ('pandas', 'sklearn', 'scipy', 'openai', 'joblib', 'requests', 'numpy', 'flask_session')
+
+
+def parse_importtime(stderr):
+    """
+    Parse `-X importtime` output.
+
+    Returns:
+        list: (module, self microseconds, cumulative microseconds, nesting depth) per import.
+    """
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        imports.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return imports
+
+
+def profile_import(module='app', top=15):
+    """
+    Import a module in a fresh interpreter and summarize where the time went.
+
+    Parameters:
+        module (str): Module to import, resolved from the backend directory.
+        top (int): Number of slowest direct imports to report.
+
+    Returns:
+        dict: Total import time, the slowest direct imports and the heavy
+            dependencies that were loaded.
+    """
+    code = (f'import sys, json; import {module}; '
+            f'print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))')
+    env = dict(os.environ, OPENAI_API_KEY=os.getenv('OPENAI_API_KEY', 'import-profile'))
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=backend_root,
+                               env=env, capture_output=True, text=True, check=True)
+    imports = parse_importtime(completed.stderr)
+    index = max(i for i, item in enumerate(imports) if item[0] == module and item[3] == 0)
+    target = imports[index]
+    # Children are reported before their parent, so the module's direct imports are
+    # the depth 1 entries between it and the previous top-level import
+    direct = []
+    for item in reversed(imports[:index]):
+        if item[3] == 0:
+            break
+        if item[3] == 1:
+            direct.append(item)
+    slowest = sorted(direct, key=lambda item: item[2], reverse=True)[:top]
+    return {
+        'module': module,
+        'total_ms': target[2] / 1000,
+        'slowest': [{'module': name, 'cumulative_ms': cumulative / 1000} for name, _, cumulative, _ in slowest],
+        'heavy_modules_loaded': json.loads(completed.stdout.strip().splitlines()[-1])
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Profile backend import time.')
+    parser.add_argument('--module', default='app')
+    parser.add_argument('--runs', type=int, default=5, help='Imports to run; the fastest total is reported')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--compare', action='store_true')
+    parser.add_argument('--threshold', type=float, default=0.3, help='Allowed relative slowdown before failing')
+    args = parser.parse_args(argv)
+    if args.compare and not args.save_baseline and not os.path.exists(args.baseline):
+        parser.error(f'no baseline at {args.baseline}; record one first with --save-baseline')
+
+    report = min((profile_import(args.module) for _ in range(args.runs)), key=lambda r: r['total_ms'])
+    print(f"import {report['module']}: {report['total_ms']:.1f} ms")
+    print(f"heavy modules loaded: {', '.join(report['heavy_modules_loaded']) or 'none'}")
+    for item in report['slowest']:
+        print(f"  {item['cumulative_ms']:9.1f} ms  {item['module']}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Baseline saved to {args.baseline}')
+
+    if args.compare:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if report['total_ms'] > baseline['total_ms'] * (1 + args.threshold):
+            print(f"REGRESSION import {args.module}: {baseline['total_ms']:.1f} ms -> {report['total_ms']:.1f} ms")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
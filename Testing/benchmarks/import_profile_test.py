@@ -0,0 +1,23 @@
+import unittest
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+from import_profile import parse_importtime, profile_import
+
+class TestImportProfile(unittest.TestCase):
+
+    def test_parse_importtime(self):
+        """Test parsing of -X importtime output"""
+        stderr = ('import time: self [us] | cumulative | imported package\n'
+                  'import time:       120 |        120 |   json.decoder\n'
+                  'import time:       300 |        420 | json\n')
+        self.assertEqual(parse_importtime(stderr), [('json.decoder', 120, 120, 1), ('json', 300, 420, 0)])
+
+    def test_app_import_is_lazy(self):
+        """Test that importing the app does not load the heavy dependencies"""
+        report = profile_import('app')
+        for module in ('pandas', 'sklearn', 'openai', 'joblib', 'flask_session'):
+            self.assertNotIn(module, report['heavy_modules_loaded'])
+
+if __name__ == '__main__':
+    unittest.main()
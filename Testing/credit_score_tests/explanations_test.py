@@ -0,0 +1,159 @@
+import unittest
+from unittest.mock import patch
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+import sys
+import os
+from sklearn.linear_model import LinearRegression
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'backend')))
+from models.cache import configure_caches
+from models.circuit_breaker import configure_breakers
+from models.scheduler import configure_scheduler
+from models.credit_scoring_model import CreditScoringModel, EXPLAIN_APPLY_ROWS, FEATURE_NAMES, ExplanationUnavailable
+from models.forest import compiled_forest
+
+
+def farmers(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'income_stability': rng.uniform(0.1, 0.5, rows),
+        'income_mean': rng.uniform(500, 2000, rows),
+        'expense_stability': rng.uniform(0.1, 0.5, rows),
+        'expense_mean': rng.uniform(200, 800, rows),
+        'yield_consistency': rng.uniform(10, 50, rows),
+        'community_engagement': rng.integers(0, 10, rows)
+    })
+
+
+def path_contributions(model, row):
+    """Walk each tree's decision path one node at a time and credit every split"""
+    X = row.to_numpy(dtype=np.float32).reshape(1, -1)
+    contributions = np.zeros(len(FEATURE_NAMES))
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        path = estimator.decision_path(X).indices
+        for parent, child in zip(path[:-1], path[1:]):
+            contributions[tree.feature[parent]] += tree.value[child, 0, 0] - tree.value[parent, 0, 0]
+    return contributions / len(model.estimators_)
+
+
+class TestCreditExplanations(unittest.TestCase):
+    """
+    Unit tests for the per-feature explanations of credit scores.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.model = CreditScoringModel()
+        data = farmers(300)
+        cls.model.train_model(data, cls.model.calculate_credit_scores(data))
+        cls.rows = farmers(20, seed=1)
+
+    def test_contributions_add_up(self):
+        """Test that bias plus contributions gives the model's score"""
+        scores, bias, contributions = self.model.explain(self.rows)
+        self.assertEqual(contributions.shape, (20, len(FEATURE_NAMES)))
+        np.testing.assert_allclose(scores, self.model.predict(self.rows))
+        np.testing.assert_allclose(bias + contributions.sum(axis=1), scores)
+
+    def test_matches_decision_paths(self):
+        """Test the vectorized walk against each tree's decision path"""
+        _, _, contributions = self.model.explain(self.rows)
+        for i in (0, 7, 19):
+            np.testing.assert_allclose(contributions[i], path_contributions(self.model.model, self.rows.iloc[i]),
+                                       atol=1e-9)
+
+    def test_large_batches(self):
+        """Test that batches whose leaves come from sklearn's apply get the same explanations"""
+        rows = farmers(EXPLAIN_APPLY_ROWS, seed=2)
+        forest = compiled_forest(self.model.model)
+        for expected, actual in zip(forest.contributions(rows), self.model.explain(rows)):
+            np.testing.assert_allclose(actual, expected)
+
+    def test_column_order(self):
+        """Test that columns are taken by name, whatever their order"""
+        shuffled = self.rows[FEATURE_NAMES[::-1]]
+        np.testing.assert_allclose(self.model.predict(shuffled), self.model.predict(self.rows))
+        np.testing.assert_allclose(self.model.explain(shuffled)[2], self.model.explain(self.rows)[2])
+
+    def test_requires_a_forest(self):
+        """Test that explanations need a trained tree ensemble"""
+        with self.assertRaises(Exception):
+            CreditScoringModel().explain(self.rows)
+        model = CreditScoringModel()
+        model.model = LinearRegression().fit(self.rows, self.rows['income_mean'])
+        with self.assertRaises(ExplanationUnavailable):
+            model.explain(self.rows)
+
+    def test_missing_values(self):
+        """Test that missing values take the same branches as in sklearn"""
+        rows = self.rows.copy()
+        rows.iloc[::2, 1] = np.nan
+        rows.iloc[::3, 4] = np.nan
+        forest = compiled_forest(self.model.model)
+        np.testing.assert_array_equal(forest.apply(rows), self.model.model.apply(rows))
+        scores, bias, contributions = self.model.explain(rows)
+        np.testing.assert_allclose(scores, self.model.predict(rows))
+        np.testing.assert_allclose(bias + contributions.sum(axis=1), scores)
+
+
+class TestPredictRoute(unittest.TestCase):
+    """
+    Unit tests for the explain mode of /predict.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.env = patch.dict(os.environ, {'SESSION_FILE_DIR': self.tmpdir, 'RATE_LIMITS': 'off',
+                                           'CACHE_BACKEND': 'none'})
+        self.env.start()
+        import app as backend
+        self.model = CreditScoringModel()
+        data = farmers(200)
+        self.model.train_model(data, self.model.calculate_credit_scores(data))
+        self.store = patch.object(backend.MODEL_STORE, 'get_credit_model', return_value=self.model)
+        self.store.start()
+        self.client = backend.create_app(watch_models=False).test_client()
+        self.rows = farmers(3, seed=1)
+
+    def tearDown(self):
+        self.store.stop()
+        self.env.stop()
+        configure_breakers([])
+        configure_scheduler({})
+        configure_caches('none')
+        shutil.rmtree(self.tmpdir)
+
+    def test_explain(self):
+        """Test that explain returns the scores with a bias and contributions per row"""
+        body = self.rows[FEATURE_NAMES[::-1]].to_dict(orient='records')
+        plain = self.client.post('/predict', json=body).get_json()
+        result = self.client.post('/predict?explain=true', json=body).get_json()
+
+        np.testing.assert_allclose(result['scores'], plain)
+        self.assertEqual(len(result['explanations']), 3)
+        for score, explanation in zip(result['scores'], result['explanations']):
+            self.assertEqual(sorted(explanation['contributions']), sorted(FEATURE_NAMES))
+            self.assertAlmostEqual(explanation['bias'] + sum(explanation['contributions'].values()), score)
+
+    def test_missing_column(self):
+        """Test that a missing feature column is a client error in both modes"""
+        body = self.rows.drop(columns='income_mean').to_dict(orient='records')
+        for url in ('/predict', '/predict?explain=true'):
+            response = self.client.post(url, json=body)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('income_mean', response.get_json()['error'])
+
+    def test_model_without_explanations(self):
+        """Test that a model that cannot explain its scores is a server error, not a client one"""
+        self.model.model = LinearRegression().fit(self.rows[FEATURE_NAMES], self.rows['income_mean'])
+        body = self.rows.to_dict(orient='records')
+        self.assertEqual(self.client.post('/predict', json=body).status_code, 200)
+        response = self.client.post('/predict?explain=true', json=body)
+        self.assertEqual(response.status_code, 501)
+        self.assertIn('tree ensemble', response.get_json()['error'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+import unittest
+from unittest.mock import patch
+import itertools
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'backend')))
+from models.cache import configure_caches
+from models.circuit_breaker import configure_breakers
+from models.scheduler import configure_scheduler
+from models.credit_scoring_model import CreditScoringModel, FEATURE_NAMES
+from models.sensitivity import SensitivityAnalyzer
+
+FARMER = {
+    'income_stability': 0.3,
+    'income_mean': 900,
+    'expense_stability': 0.2,
+    'expense_mean': 400,
+    'yield_consistency': 30,
+    'community_engagement': 5
+}
+
+
+def trained_model():
+    """Train a small credit model on random farmers"""
+    rng = np.random.default_rng(0)
+    model = CreditScoringModel()
+    features = pd.DataFrame({
+        'income_stability': rng.uniform(0.1, 0.5, 200),
+        'income_mean': rng.uniform(500, 2000, 200),
+        'expense_stability': rng.uniform(0.1, 0.5, 200),
+        'expense_mean': rng.uniform(200, 800, 200),
+        'yield_consistency': rng.uniform(10, 50, 200),
+        'community_engagement': rng.integers(0, 10, 200)
+    })
+    model.train_model(features, model.calculate_credit_scores(features))
+    return model
+
+
+class TestSensitivityAnalyzer(unittest.TestCase):
+
+    def setUp(self):
+        """Set up a small trained model and a grid over three features"""
+        self.model = trained_model()
+        self.farmer = dict(FARMER)
+        self.grid = {
+            'income_mean': np.linspace(500, 2000, 4),
+            'expense_mean': np.linspace(200, 800, 3),
+            'community_engagement': [0, 5, 10]
+        }
+
+    def brute_force(self, method):
+        """Score the grid row by row the way the analysis script does"""
+        rows = []
+        for inc, exp, com in itertools.product(*self.grid.values()):
+            row = dict(self.farmer, income_mean=inc, expense_mean=exp, community_engagement=com)
+            rows.append(row)
+        df = pd.DataFrame(rows)[FEATURE_NAMES]
+        if method == 'formula':
+            df['score'] = df.apply(self.model.calculate_credit_score, axis=1)
+        else:
+            df['score'] = self.model.predict(df[FEATURE_NAMES])
+        return df
+
+    def test_calculate_credit_scores_matches_row_version(self):
+        """Test the vectorized formula against calculate_credit_score"""
+        df = self.brute_force('formula')
+        np.testing.assert_allclose(self.model.calculate_credit_scores(df), df['score'])
+
+    def test_grid_summary_marginals(self):
+        """Test chunked marginals against a materialized grid"""
+        for method in ('formula', 'model'):
+            analyzer = SensitivityAnalyzer(self.model, chunk_size=5, method=method)
+            summary = analyzer.grid_summary(self.grid, base=self.farmer)
+            df = self.brute_force(method)
+
+            self.assertEqual(summary['points'], 36)
+            self.assertAlmostEqual(summary['mean'], df['score'].mean())
+            self.assertEqual(sum(summary['histogram']['counts']), 36)
+            for name in self.grid:
+                grouped = df.groupby(name)['score']
+                np.testing.assert_allclose(summary['marginals'][name]['mean'], grouped.mean())
+                np.testing.assert_allclose(summary['marginals'][name]['min'], grouped.min())
+                np.testing.assert_allclose(summary['marginals'][name]['max'], grouped.max())
+
+    def test_what_if(self):
+        """Test what-if scores and deltas for a single farmer"""
+        analyzer = SensitivityAnalyzer(self.model, chunk_size=7)
+        result = analyzer.what_if(self.farmer, self.grid)
+        df = self.brute_force('model')
+
+        scores = np.array(result['scores'])
+        self.assertEqual(result['features'], ['income_mean', 'expense_mean', 'community_engagement'])
+        self.assertEqual(scores.shape, (4, 3, 3))
+        np.testing.assert_allclose(scores.ravel(), df['score'])
+        np.testing.assert_allclose(np.array(result['deltas']), scores - result['base_score'])
+
+    def test_invalid_requests(self):
+        """Test that unknown features, missing base values and oversized grids are rejected"""
+        analyzer = SensitivityAnalyzer(self.model)
+        with self.assertRaises(ValueError):
+            analyzer.grid_summary({'unknown': [1, 2]}, base=self.farmer)
+        with self.assertRaises(ValueError):
+            analyzer.grid_summary(self.grid)
+        with self.assertRaises(ValueError):
+            analyzer.what_if(self.farmer, self.grid, max_points=10)
+
+    def test_what_if_ignores_other_farmer_keys(self):
+        """Test that farmer records may carry keys besides the model features"""
+        analyzer = SensitivityAnalyzer(self.model)
+        result = analyzer.what_if(dict(self.farmer, name='Achieng', farmer_id=17), self.grid)
+        self.assertEqual(result, analyzer.what_if(self.farmer, self.grid))
+
+
+class TestWhatIfRoute(unittest.TestCase):
+    """
+    Unit tests for the /what_if route.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.env = patch.dict(os.environ, {'SESSION_FILE_DIR': self.tmpdir, 'RATE_LIMITS': 'off',
+                                           'CACHE_BACKEND': 'none'})
+        self.env.start()
+        import app as backend
+        self.farmer = dict(FARMER)
+        self.store = patch.object(backend.MODEL_STORE, 'get_credit_model', return_value=trained_model())
+        self.store.start()
+        self.client = backend.create_app(watch_models=False).test_client()
+
+    def tearDown(self):
+        self.store.stop()
+        self.env.stop()
+        configure_breakers([])
+        configure_scheduler({})
+        configure_caches('none')
+        shutil.rmtree(self.tmpdir)
+
+    def test_what_if(self):
+        """Test that a farmer record with extra keys gets scores over the grid"""
+        farmer = dict(self.farmer, name='Achieng')
+        response = self.client.post('/what_if', json={'farmer': farmer,
+                                                      'grid': {'income_mean': [500, 1000, 2000]}})
+        self.assertEqual(response.status_code, 200)
+        result = response.get_json()
+        self.assertEqual(result['features'], ['income_mean'])
+        self.assertEqual(len(result['scores']), 3)
+
+    def test_bad_grid(self):
+        """Test that a grid that is not an object, or names unknown features, is a client error"""
+        for grid in ([500, 1000], 'income_mean', {'unknown': [1, 2]}, {'income_mean': ['a lot']}):
+            response = self.client.post('/what_if', json={'farmer': self.farmer, 'grid': grid})
+            self.assertEqual(response.status_code, 400, grid)
+            self.assertIn('error', response.get_json())
+
+    def test_too_many_points(self):
+        """Test that grids beyond the point limit are rejected"""
+        grid = {'income_mean': list(range(101)), 'expense_mean': list(range(100))}
+        response = self.client.post('/what_if', json={'farmer': self.farmer, 'grid': grid})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('10000', response.get_json()['error'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import unittest
+from unittest.mock import patch
+import tempfile
+import threading
+import numpy as np
+import pandas as pd
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'backend')))
+from models.dataset import ColumnarDataset, SOIL_YIELD_CSV, downcast, load_dataset, parquet_available
+
+class TestColumnarDataset(unittest.TestCase):
+    """
+    Unit tests for the ColumnarDataset class.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.csv = os.path.join(self.tmpdir.name, 'sites.csv')
+        self.cache_dir = os.path.join(self.tmpdir.name, 'cache')
+        self.write_csv(7.699999809)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write_csv(self, phaq):
+        with open(self.csv, 'w') as f:
+            f.write('PRID,PHAQ,RAIN,HUGE,COUNT\n')
+            f.write(f'CU001,{phaq},1493.800049,1e300,3\n')
+            f.write('CU002,5.400000095,1112.0,2.5,4\n')
+
+    def test_load_selected_columns(self):
+        """Test that only the requested columns are returned, in the requested order"""
+        df = ColumnarDataset(self.csv, self.cache_dir, use_parquet=False).load(['RAIN', 'PRID'])
+        self.assertEqual(list(df.columns), ['RAIN', 'PRID'])
+        self.assertEqual(list(df['PRID']), ['CU001', 'CU002'])
+
+    def test_downcast(self):
+        """Test that float32-representable and integer columns are narrowed"""
+        df = ColumnarDataset(self.csv, self.cache_dir, use_parquet=False).load()
+        self.assertEqual(df['PHAQ'].dtype, np.float32)
+        self.assertEqual(df['RAIN'].dtype, np.float32)
+        self.assertEqual(df['HUGE'].dtype, np.float64)
+        self.assertEqual(df['COUNT'].dtype, np.int8)
+
+    def test_cache_reused(self):
+        """Test that the CSV is parsed once, even when it is only touched"""
+        dataset = ColumnarDataset(self.csv, self.cache_dir, use_parquet=False)
+        dataset.load()
+        os.utime(self.csv, ns=(0, 0))
+        with patch('pandas.read_csv') as mock_read_csv:
+            df = ColumnarDataset(self.csv, self.cache_dir, use_parquet=False).load(['PHAQ'])
+        mock_read_csv.assert_not_called()
+        self.assertAlmostEqual(float(df['PHAQ'][0]), 7.7, places=5)
+
+    def test_invalidated_by_content(self):
+        """Test that changing the CSV rebuilds the cache"""
+        ColumnarDataset(self.csv, self.cache_dir, use_parquet=False).load()
+        self.write_csv(6.099999905)
+        df = ColumnarDataset(self.csv, self.cache_dir, use_parquet=False).load(['PHAQ'])
+        self.assertAlmostEqual(float(df['PHAQ'][0]), 6.1, places=5)
+
+    def test_concurrent_builds(self):
+        """Test that builds racing each other leave one complete cache and no staging directories"""
+        datasets = [ColumnarDataset(self.csv, self.cache_dir, use_parquet=False) for _ in range(8)]
+        errors = []
+
+        def build(dataset):
+            try:
+                dataset.build()
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=build, args=(dataset,)) for dataset in datasets]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(os.listdir(self.cache_dir), ['sites'])
+        self.assertEqual(sorted(os.listdir(datasets[0].cache_dir)), ['0.npy', '1.npy', '2.npy', '3.npy', '4.npy',
+                                                                     'manifest.json'])
+        self.assertTrue(datasets[0].is_fresh())
+        self.assertEqual(list(datasets[0].load(['PRID'])['PRID']), ['CU001', 'CU002'])
+
+    def test_unknown_column(self):
+        """Test that asking for a column the CSV lacks raises KeyError"""
+        with self.assertRaises(KeyError):
+            ColumnarDataset(self.csv, self.cache_dir, use_parquet=False).load(['LATI'])
+
+    @unittest.skipUnless(parquet_available(), 'pyarrow is not installed')
+    def test_parquet(self):
+        """Test that the Parquet cache returns the same data"""
+        df = ColumnarDataset(self.csv, self.cache_dir, use_parquet=True).load(['PHAQ', 'COUNT'])
+        self.assertEqual(df['PHAQ'].dtype, np.float32)
+        self.assertEqual(list(df['COUNT']), [3, 4])
+
+    def test_training_data(self):
+        """Test that the training table is read back without losing precision"""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cached = load_dataset(SOIL_YIELD_CSV, ['PHAQ', 'TOTN', 'Estimated_Maize_Yield'], cache_dir)
+        parsed = pd.read_csv(SOIL_YIELD_CSV, usecols=['PHAQ', 'TOTN', 'Estimated_Maize_Yield'])
+        np.testing.assert_allclose(cached.to_numpy(dtype=float), parsed.to_numpy(), rtol=1e-6)
+
+    def test_downcast_keeps_nan(self):
+        """Test that missing values do not prevent narrowing"""
+        df = downcast(pd.DataFrame({'x': [0.5, np.nan]}))
+        self.assertEqual(df['x'].dtype, np.float32)
+        self.assertTrue(np.isnan(df['x'][1]))
+
+    def test_downcast_out_of_range_is_quiet(self):
+        """Test that values beyond float32's range keep their column wide without an overflow warning"""
+        with np.errstate(over='raise'):
+            df = downcast(pd.DataFrame({'x': [1e300, 2.5]}))
+        self.assertEqual(df['x'].dtype, np.float64)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+import unittest
+import importlib.util
+from unittest.mock import Mock, patch
+import asyncio
+import time
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'load_tests')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'backend')))
+import requests
+from fake_upstreams import FakeUpstreams, UpstreamBehaviour
+from models import async_http
+from models import fertilizer_recomm_oo as pipeline
+from models.circuit_breaker import OPEN, configure_breakers, get_breaker
+from models.fertilizer_recomm_oo import FertilizerPredictor, SoilDataFetcher, UpstreamUnavailable, http_get_async
+
+
+# httpx and asgiref only come with the asgi extra
+ASGI_EXTRA = bool(importlib.util.find_spec('asgiref') and importlib.util.find_spec('httpx'))
+
+
+async def serve(handler):
+    """Starts a one-off HTTP server on a free port that answers with handler(reader, writer)."""
+    server = await asyncio.start_server(handler, '127.0.0.1', 0)
+    return server, f'http://127.0.0.1:{server.sockets[0].getsockname()[1]}'
+
+
+@unittest.skipUnless(ASGI_EXTRA, 'the asgi extra is not installed')
+class TestAsyncHttp(unittest.TestCase):
+    """
+    Unit tests for the asyncio HTTP client.
+    """
+
+    def test_chunked_response(self):
+        """Test that chunked bodies are reassembled and headers read case-insensitively"""
+        async def handler(reader, writer):
+            request = await reader.readuntil(b'\r\n\r\n')
+            writer.write(b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\nX-Path: ' + request.split()[1] + b'\r\n\r\n'
+                         b'5\r\n{"a":\r\n3\r\n 1}\r\n0\r\n\r\n')
+            await writer.drain()
+            writer.close()
+
+        async def main():
+            server, url = await serve(handler)
+            async with server:
+                return await async_http.get(f'{url}/search?q=Kampala Uganda&format=json')
+
+        response = asyncio.run(main())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'a': 1})
+        self.assertEqual(response.headers['x-path'], '/search?q=Kampala%20Uganda&format=json')
+
+    def test_timeout(self):
+        """Test that a call outlasting its timeout raises requests.Timeout"""
+        async def handler(reader, writer):
+            # Never answer; close once the client gives up, or the server would wait for this connection
+            await reader.read()
+            writer.close()
+
+        async def main():
+            server, url = await serve(handler)
+            async with server:
+                await async_http.get(url, timeout=0.1)
+
+        with self.assertRaises(requests.Timeout):
+            asyncio.run(main())
+
+    def test_connection_refused(self):
+        """Test that connection failures raise requests.ConnectionError"""
+        async def main():
+            server, url = await serve(lambda reader, writer: None)
+            server.close()
+            await server.wait_closed()
+            await async_http.get(url)
+
+        with self.assertRaises(requests.ConnectionError):
+            asyncio.run(main())
+
+
+@unittest.skipUnless(ASGI_EXTRA, 'the asgi extra is not installed')
+class TestAsyncPipeline(unittest.TestCase):
+    """
+    Unit tests for the async fetchers and FertilizerPredictor.run_async against the fake upstreams.
+    """
+
+    def setUp(self):
+        self.fakes = FakeUpstreams().__enter__()
+        self.urls = patch.multiple(pipeline, NOMINATIM_URL=self.fakes.nominatim.url,
+                                   SOILGRIDS_URL=self.fakes.soilgrids.url, OPENWEATHER_URL=self.fakes.openweather.url)
+        self.urls.start()
+
+    def tearDown(self):
+        self.urls.stop()
+        self.fakes.__exit__(None, None, None)
+        configure_breakers([])
+
+    def test_same_result_as_sync(self):
+        """Test that run_async recommends what run does, in full and targeted soil modes"""
+        for targeted in (False, True):
+            predictor = FertilizerPredictor('Kampala', 'fake-key', 'maize', 10,
+                                            soil_fetcher=SoilDataFetcher(targeted=targeted))
+            self.assertEqual(asyncio.run(predictor.run_async(intervals=True)), predictor.run(intervals=True))
+
+    def test_requests_in_flight(self):
+        """Test that slow upstreams do not serialize concurrent recommendations"""
+        for upstream in (self.fakes.nominatim, self.fakes.soilgrids, self.fakes.openweather):
+            upstream.behaviour = UpstreamBehaviour(latency=0.3)
+
+        async def main():
+            predictors = [FertilizerPredictor('Kampala', 'fake-key', 'maize', size) for size in range(1, 31)]
+            return await asyncio.gather(*(predictor.run_async() for predictor in predictors))
+
+        start = time.monotonic()
+        results = asyncio.run(main())
+        elapsed = time.monotonic() - start
+        self.assertTrue(all(results))
+        # 30 recommendations of three 0.3s calls each would take 27s one at a time
+        self.assertLess(elapsed, 6)
+        self.assertEqual(self.fakes.stats()['soilgrids']['requests'], 30)
+
+    def test_breaker_opens(self):
+        """Test that async calls count towards and respect the circuit breaker"""
+        configure_breakers(failure_threshold=2, reset_seconds=60)
+        self.fakes.openweather.behaviour = UpstreamBehaviour(error_rate=1.0, error_status=502)
+        url = f'{self.fakes.openweather.url}/data/3.0/onecall'
+
+        async def main():
+            for _ in range(2):
+                self.assertEqual((await http_get_async('openweather', url)).status_code, 502)
+            with self.assertRaises(UpstreamUnavailable):
+                await http_get_async('openweather', url)
+
+        asyncio.run(main())
+        self.assertEqual(get_breaker('openweather').state, OPEN)
+        self.assertEqual(self.fakes.stats()['openweather']['requests'], 2)
+
+
+class TestSoilAttempts(unittest.TestCase):
+    """
+    Unit tests for the attempts shared by the sync and async soil fetchers.
+    """
+
+    def test_sync_and_async_agree(self):
+        """Test that both fetchers try the same points and handle each response alike"""
+        empty = Mock(status_code=200)
+        empty.json.return_value = {'properties': {}}
+        found = Mock(status_code=200)
+        found.json.return_value = {'properties': {'layers': [
+            {'name': 'phh2o', 'depths': [{'label': '0-5cm', 'values': {'mean': 58}}]}]}}
+
+        def run(fetch, mock_name):
+            outcomes = [requests.ConnectionError(), Mock(status_code=503), empty, found]
+            with patch.object(pipeline, mock_name, side_effect=outcomes) as mock_get, \
+                    patch.object(pipeline, 'get_scheduler', return_value=Mock()):
+                result = fetch()
+            return result, [call.args[1] for call in mock_get.call_args_list]
+
+        fetcher = SoilDataFetcher()
+        sync_result, sync_urls = run(lambda: fetcher.fetch_soil_data(0.0, 32.0), 'http_get')
+        async_result, async_urls = run(lambda: asyncio.run(fetcher.fetch_soil_data_async(0.0, 32.0)),
+                                       'http_get_async')
+
+        self.assertEqual(len(sync_urls), 4)
+        self.assertEqual(sync_urls, async_urls)
+        self.assertEqual(sync_urls, [fetcher.query_url(*point) for point in
+                                     list(SoilDataFetcher.soil_offsets(0.0, 32.0, 0.5, 10, 0.05))[:4]])
+        self.assertEqual(sync_result.to_dict(), async_result.to_dict())
+        self.assertEqual(sync_result['phh2o_0-5cm_mean'].iloc[0], 58)
+
+if __name__ == '__main__':
+    unittest.main()
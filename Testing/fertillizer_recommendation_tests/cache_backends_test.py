@@ -0,0 +1,181 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import multiprocessing
+import shutil
+import tempfile
+import asyncio
+import threading
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'backend')))
+from models.cache import (LocalCache, SQLiteCache, TieredCache, cache_key, configure_caches, get_cache,
+                          dumps, loads)
+from models.fertilizer_recomm_oo import Geocoder, SoilDataFetcher, WeatherDataFetcher
+from fake_clock import FakeClock
+
+def write_from_child(path):
+    SQLiteCache('test', path).set('geocode:v1:kampala', [0.3476, 32.5825])
+
+
+class TestSerialization(unittest.TestCase):
+    """
+    Unit tests for the cache serialization and key scheme.
+    """
+
+    def test_round_trip(self):
+        """Test that values survive serialization, with tuples as lists"""
+        soil = {f'phh2o_0-5cm_Q{i}': i * 1.5 for i in range(40)}
+        for value in [(0.3476, 32.5825), soil, {'TEMP': 25.0, 'HUMI': None}]:
+            self.assertEqual(loads(dumps(value)), list(value) if isinstance(value, tuple) else value)
+
+    def test_large_values_are_compressed(self):
+        """Test that values beyond the threshold are stored compressed"""
+        soil = {f'phh2o_0-5cm_Q{i}': 5.5 for i in range(40)}
+        blob = dumps(soil)
+        self.assertEqual(blob[:1], b'z')
+        self.assertLess(len(blob), len(str(soil)) / 2)
+        self.assertEqual(dumps([1, 2])[:1], b'j')
+
+    def test_cache_key(self):
+        """Test that keys carry the namespace and the format version"""
+        self.assertEqual(cache_key('soil', '0.3476', '32.5825'), 'soil:v1:0.3476|32.5825')
+
+
+class TestSQLiteCache(unittest.TestCase):
+    """
+    Unit tests for the SQLiteCache and TieredCache classes.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'cache.sqlite3')
+        self.clock = FakeClock(1000.0)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_shared_between_workers(self):
+        """Test that an entry written by another process is read back"""
+        process = multiprocessing.get_context('fork').Process(target=write_from_child, args=(self.path,))
+        process.start()
+        process.join()
+        self.assertEqual(SQLiteCache('test', self.path).get('geocode:v1:kampala'), [0.3476, 32.5825])
+
+    def test_ttl(self):
+        """Test that expired entries are misses"""
+        cache = SQLiteCache('test', self.path, ttl=10, clock=self.clock)
+        cache.set('a', 1)
+        self.clock.now += 10
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_prune_bounds_size(self):
+        """Test that pruning keeps the entries furthest from expiry within maxsize"""
+        cache = SQLiteCache('test', self.path, ttl=10, maxsize=3, prune_every=5, clock=self.clock)
+        for i in range(5):
+            cache.set(str(i), i, ttl=10 + i)
+        self.assertEqual(len(cache), 3)
+        self.assertEqual([cache.get(str(i)) for i in range(5)], [None, None, 2, 3, 4])
+
+    def test_tiered_cache(self):
+        """Test that shared entries are copied into the front tier until they expire"""
+        shared = SQLiteCache('test_shared', self.path, ttl=60, clock=self.clock)
+        shared.set('a', [1, 2], ttl=5)
+        front_clock = FakeClock(0)
+        cache = TieredCache(LocalCache('test', ttl=60, clock=front_clock), shared)
+        self.assertEqual(cache.get('a'), [1, 2])
+        self.assertEqual(cache.front.get('a'), [1, 2])
+        front_clock.now = 5
+        self.assertIsNone(cache.front.get('a'))
+
+        cache.set('b', 3)
+        self.assertEqual(shared.get('b'), 3)
+        self.assertEqual(cache.stats()['shared']['hits'], 2)
+
+    def test_tiered_cache_async(self):
+        """Test that async reads and writes reach the shared tier in a worker thread"""
+        shared = SQLiteCache('test_shared', self.path, ttl=60, clock=self.clock)
+        shared.set('a', [1, 2])
+        cache = TieredCache(LocalCache('test', ttl=60), shared)
+        threads = set()
+        get_entry, set_shared = shared.get_entry, shared.set
+
+        def record_thread(call):
+            def wrapper(*args):
+                threads.add(threading.get_ident())
+                return call(*args)
+            return wrapper
+
+        async def main():
+            value = await cache.get_async('a')
+            await cache.set_async('b', 3)
+            return value, await cache.get_async('a')
+
+        with patch.object(shared, 'get_entry', side_effect=record_thread(get_entry)), \
+                patch.object(shared, 'set', side_effect=record_thread(set_shared)):
+            self.assertEqual(asyncio.run(main()), ([1, 2], [1, 2]))
+        self.assertEqual(shared.get('b'), 3)
+        self.assertTrue(threads)
+        self.assertNotIn(threading.get_ident(), threads)
+
+    def test_configure_shared_backend(self):
+        """Test that the shared backend puts a SQLite tier behind every namespace"""
+        caches = configure_caches('shared', self.path)
+        try:
+            self.assertEqual(set(caches), {'geocode', 'soil', 'weather', 'recommendation'})
+            self.assertTrue(all(isinstance(cache, TieredCache) for cache in caches.values()))
+        finally:
+            configure_caches('none')
+
+
+class TestFetcherCaches(unittest.TestCase):
+    """
+    Unit tests for the caching of the geocode, soil and weather fetchers.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        configure_caches('shared', os.path.join(self.tmpdir, 'cache.sqlite3'))
+
+    def tearDown(self):
+        configure_caches('none')
+        shutil.rmtree(self.tmpdir)
+
+    def response(self, payload):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = payload
+        return mock_response
+
+    @patch('requests.get')
+    def test_geocode(self, mock_get):
+        """Test that spellings of an area differing only in case share one geocode"""
+        mock_get.return_value = self.response([{'lat': '0.3476', 'lon': '32.5825'}])
+        self.assertEqual(Geocoder.geocode_area_name('Kampala'), (0.3476, 32.5825))
+        get_cache('geocode').front.clear()
+        self.assertEqual(Geocoder.geocode_area_name(' kampala '), (0.3476, 32.5825))
+        mock_get.assert_called_once()
+
+    @patch('requests.get')
+    def test_soil(self, mock_get):
+        """Test that a cached soil lookup returns the same one-row DataFrame"""
+        mock_get.return_value = self.response({'properties': {'layers': [
+            {'name': 'phh2o', 'depths': [{'label': '0-5cm', 'values': {'mean': 56, 'Q0.5': 55}}]}]}})
+        first = SoilDataFetcher().fetch_soil_data(0.3476, 32.5825)
+        get_cache('soil').front.clear()
+        second = SoilDataFetcher().fetch_soil_data(0.3476, 32.5825)
+        self.assertEqual(second.to_dict(), first.to_dict())
+        mock_get.assert_called_once()
+
+    @patch('requests.get')
+    def test_weather(self, mock_get):
+        """Test that nearby locations share the weather of the current time bucket"""
+        mock_get.return_value = self.response({'current': {'temp': 25.0, 'humidity': 80, 'uvi': 6}})
+        first = WeatherDataFetcher().fetch_weather_data(0.3476, 32.5825, 'key')
+        first['TEMP'] = None
+        second = WeatherDataFetcher().fetch_weather_data(0.3481, 32.5831, 'key')
+        self.assertEqual(second, {'TEMP': 25.0, 'HUMI': 80, 'RAIN': 1112, 'SUNH': 6})
+        mock_get.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import tempfile
+import shutil
+import sys
+import os
+import requests
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'backend')))
+from models.cache import configure_caches
+from models.circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN, configure_breakers, get_breaker
+from models.scheduler import configure_scheduler
+from models.fertilizer_recomm_oo import SoilDataFetcher, UpstreamUnavailable, http_get
+from fake_clock import FakeClock
+
+class TestCircuitBreaker(unittest.TestCase):
+    """
+    Unit tests for the CircuitBreaker class.
+    """
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker('soilgrids', failure_threshold=3, slow_call_seconds=2, reset_seconds=10,
+                                      probe_successes=2, clock=self.clock)
+
+    def fail(self, times):
+        for _ in range(times):
+            self.assertTrue(self.breaker.allow())
+            self.breaker.record(False)
+
+    def test_opens_after_consecutive_failures(self):
+        """Test that the breaker opens after failure_threshold consecutive failures"""
+        self.fail(2)
+        self.breaker.record(True)
+        self.fail(2)
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.fail(1)
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertFalse(self.breaker.allow())
+
+    def test_slow_calls_count_as_failures(self):
+        """Test that calls slower than slow_call_seconds count as failures"""
+        for _ in range(3):
+            self.breaker.allow()
+            self.breaker.record(True, duration=2.5)
+        self.assertEqual(self.breaker.state, OPEN)
+
+    def test_half_open_probes_close(self):
+        """Test that successful probes one at a time close the breaker"""
+        self.fail(3)
+        self.clock.now = 10
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record(True)
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record(True)
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_failed_probe_reopens(self):
+        """Test that a failed probe reopens the breaker for another reset period"""
+        self.fail(3)
+        self.clock.now = 10
+        self.fail(1)
+        self.assertEqual(self.breaker.state, OPEN)
+        self.clock.now = 15
+        self.assertFalse(self.breaker.allow())
+        self.assertEqual(self.breaker.snapshot()['retry_in_seconds'], 5)
+
+    def test_cancelled_probe(self):
+        """Test that a probe given up before the call lets another probe through"""
+        self.fail(3)
+        self.clock.now = 10
+        self.assertTrue(self.breaker.allow())
+        self.breaker.cancel()
+        self.assertTrue(self.breaker.allow())
+
+
+class TestBreakersInPipeline(unittest.TestCase):
+    """
+    Unit tests for the circuit breakers of the upstream calls.
+    """
+
+    def setUp(self):
+        configure_breakers(failure_threshold=2, reset_seconds=60)
+
+    def tearDown(self):
+        configure_breakers([])
+
+    @patch('requests.get', side_effect=requests.ConnectionError('refused'))
+    def test_fails_fast_when_open(self, mock_get):
+        """Test that calls fail fast without reaching the upstream once the breaker opens"""
+        for _ in range(2):
+            with self.assertRaises(requests.ConnectionError):
+                http_get('openweather', 'http://openweather/onecall')
+        with self.assertRaises(UpstreamUnavailable):
+            http_get('openweather', 'http://openweather/onecall')
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(get_breaker('openweather').state, OPEN)
+
+    @patch('requests.get')
+    def test_server_errors_open_the_breaker(self, mock_get):
+        """Test that 5xx responses count as failures but 4xx responses do not"""
+        mock_get.return_value = MagicMock(status_code=404, headers={})
+        for _ in range(3):
+            http_get('nominatim', 'http://nominatim/search')
+        self.assertEqual(get_breaker('nominatim').state, CLOSED)
+        mock_get.return_value = MagicMock(status_code=502, headers={})
+        for _ in range(2):
+            http_get('nominatim', 'http://nominatim/search')
+        self.assertEqual(get_breaker('nominatim').state, OPEN)
+
+    @patch('requests.get')
+    def test_soil_fetch_stops_when_open(self, mock_get):
+        """Test that the soil fetcher stops its attempts once the breaker opens"""
+        mock_get.return_value = MagicMock(status_code=500, headers={})
+        with patch('models.fertilizer_recomm_oo.sleep'):
+            self.assertIsNone(SoilDataFetcher().fetch_soil_data(0.0, 32.0))
+        self.assertEqual(mock_get.call_count, 2)
+
+
+class TestAdminBreakers(unittest.TestCase):
+    """
+    Unit tests for the circuit breaker admin endpoints.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.env = patch.dict(os.environ, {'ADMIN_TOKEN': 'secret', 'SESSION_FILE_DIR': self.tmpdir,
+                                           'RATE_LIMITS': 'off', 'CACHE_BACKEND': 'none'})
+        self.env.start()
+        import app as backend
+        self.client = backend.create_app(watch_models=False).test_client()
+
+    def tearDown(self):
+        self.env.stop()
+        configure_breakers([])
+        configure_scheduler({})
+        configure_caches('none')
+        shutil.rmtree(self.tmpdir)
+
+    def test_requires_token(self):
+        """Test that the endpoints reject callers without the admin token"""
+        self.assertEqual(self.client.get('/admin/breakers').status_code, 401)
+        response = self.client.get('/admin/breakers', headers={'Authorization': 'Bearer wrong'})
+        self.assertEqual(response.status_code, 401)
+        with patch.dict(os.environ, {'ADMIN_TOKEN': ''}):
+            response = self.client.get('/admin/breakers', headers={'Authorization': 'Bearer '})
+        self.assertEqual(response.status_code, 404)
+
+    def test_breaker_states_and_reset(self):
+        """Test that breaker states are listed and a breaker can be closed"""
+        headers = {'Authorization': 'Bearer secret'}
+        for _ in range(get_breaker('soilgrids').failure_threshold):
+            get_breaker('soilgrids').allow()
+            get_breaker('soilgrids').record(False)
+        breakers = self.client.get('/admin/breakers', headers=headers).get_json()['breakers']
+        self.assertEqual(set(breakers), {'nominatim', 'soilgrids', 'openweather'})
+        self.assertEqual(breakers['soilgrids']['state'], OPEN)
+
+        response = self.client.post('/admin/breakers/soilgrids/reset', headers=headers)
+        self.assertEqual(response.get_json()['soilgrids']['state'], CLOSED)
+        self.assertEqual(self.client.post('/admin/breakers/unknown/reset', headers=headers).status_code, 404)
+
+if __name__ == '__main__':
+    unittest.main()
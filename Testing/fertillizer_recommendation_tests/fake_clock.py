@@ -0,0 +1,17 @@
+"""
+A settable stand-in for time.time and time.monotonic in tests of caches, rate limits and circuit breakers.
+"""
+
+
+class FakeClock:
+    """
+    A clock that only moves when a test sets or advances its now attribute.
+
+    Attributes:
+        now (float): The time the clock returns.
+    """
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
@@ -1,3 +1,4 @@
+import json
 import unittest
 from unittest.mock import patch, MagicMock
 import pandas as pd
@@ -5,9 +6,9 @@ import numpy as np
 import sys
 import os
 
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'backend', 'models')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'backend')))
 
-from fertilizer_recomm_oo import Geocoder, SoilDataFetcher, WeatherDataFetcher, DataPreparer, FertilizerCalculator, FertilizerPredictor
+from models.fertilizer_recomm_oo import Geocoder, SoilDataFetcher, WeatherDataFetcher, DataPreparer, FertilizerCalculator, FertilizerPredictor
 
 class TestGeocoder(unittest.TestCase):
     """
@@ -121,6 +122,36 @@ class TestSoilDataFetcher(unittest.TestCase):
 
         self.assertIsNone(result)
 
+    def test_parse_soil_features(self):
+        """Test that a targeted response parses into SOIL_PROPERTIES order with NaN for missing values."""
+        content = json.dumps({'properties': {'layers': [
+            {'name': 'soc', 'depths': [{'label': '0-5cm', 'values': {'mean': 2.1}}]},
+            {'name': 'phh2o', 'depths': [{'label': '0-5cm', 'values': {'mean': 5.6}},
+                                         {'label': '5-15cm', 'values': {'mean': 6.0}}]},
+            {'name': 'cec', 'depths': [{'label': '0-5cm', 'values': {'mean': None}}]},
+            {'name': 'clay', 'depths': [{'label': '0-5cm', 'values': {'mean': 30}}]}
+        ]}}).encode()
+
+        features = SoilDataFetcher.parse_soil_features(content)
+
+        np.testing.assert_array_equal(features, [5.6, 2.1, np.nan, np.nan])
+
+    @patch('requests.get')
+    def test_fetch_soil_features(self, mock_get):
+        """Test that a targeted fetch asks for the model's properties only and skips incomplete points."""
+        def response(values):
+            layers = [{'name': name, 'depths': [{'label': '0-5cm', 'values': {'mean': value}}]}
+                      for name, value in zip(['phh2o', 'soc', 'nitrogen', 'cec'], values)]
+            return MagicMock(status_code=200, content=json.dumps({'properties': {'layers': layers}}).encode())
+        mock_get.side_effect = [response([5.6, 2.1, None, 20.0]), response([5.6, 2.1, 0.15, 20.0])]
+
+        features = SoilDataFetcher(targeted=True).fetch_soil_features(1.2345, 2.3456)
+
+        np.testing.assert_array_equal(features, [5.6, 2.1, 0.15, 20.0])
+        self.assertEqual(mock_get.call_count, 2)
+        url = mock_get.call_args[0][0]
+        self.assertIn('property=phh2o&property=soc&property=nitrogen&property=cec&depth=0-5cm&value=mean', url)
+
 
 class TestWeatherDataFetcher(unittest.TestCase):
     """
@@ -183,11 +214,12 @@ class TestDataPreparer(unittest.TestCase):
     """
 
     def test_prepare_data_for_model_success(self):
+        # SoilGrids mapped units: pH*10, dg/kg, cg/kg and mmol(c)/kg
         soil_data = {
-            'phh2o_0-5cm_mean': [5.6],
-            'soc_0-5cm_mean': [2.1],
-            'nitrogen_0-5cm_mean': [0.15],
-            'cec_0-5cm_mean': [20.0]
+            'phh2o_0-5cm_mean': [56],
+            'soc_0-5cm_mean': [21],
+            'nitrogen_0-5cm_mean': [15],
+            'cec_0-5cm_mean': [200]
         }
         soil_df = pd.DataFrame(soil_data)
         weather_data = {
@@ -257,8 +289,8 @@ class TestFertilizerPredictor(unittest.TestCase):
     @patch.object(SoilDataFetcher, 'fetch_soil_data')
     @patch.object(WeatherDataFetcher, 'fetch_weather_data')
     @patch.object(DataPreparer, 'prepare_data_for_model')
-    @patch.object(FertilizerCalculator, 'predict_fertilizer_requirements')
-    def test_run(self, mock_predict_fertilizer_requirements, mock_prepare_data_for_model, mock_fetch_weather_data, mock_fetch_soil_data, mock_geocode_area_name):
+    @patch.object(FertilizerCalculator, 'predict_requirements_per_ha')
+    def test_run(self, mock_predict_requirements_per_ha, mock_prepare_data_for_model, mock_fetch_weather_data, mock_fetch_soil_data, mock_geocode_area_name):
         mock_geocode_area_name.return_value = (1.2345, 2.3456)
         mock_fetch_soil_data.return_value = pd.DataFrame({
             'phh2o_0-5cm_mean': [5.6],
@@ -281,11 +313,8 @@ class TestFertilizerPredictor(unittest.TestCase):
             'HUMI': [80],
             'SUNH': [6]
         })
-        mock_predict_fertilizer_requirements.return_value = {
-            'Urea (25kg bags)': 4,
-            'DAP (25kg bags)': 3,
-            'MOP (25kg bags)': 2
-        }
+        # kg/ha of N, P2O5 and K2O that round up to 4, 3 and 2 bags on 10 acres
+        mock_predict_requirements_per_ha.return_value = np.array([[10.0, 7.0, 5.0]])
 
         predictor = FertilizerPredictor(area_name="Test Area", api_key="fake_api_key", crop_type="maize", farm_size_acres=10)
         result = predictor.run()
@@ -298,6 +327,25 @@ class TestFertilizerPredictor(unittest.TestCase):
 
         self.assertEqual(result, expected_result)
 
+    @patch.object(Geocoder, 'geocode_area_name')
+    @patch.object(SoilDataFetcher, 'fetch_soil_features')
+    @patch.object(WeatherDataFetcher, 'fetch_weather_data')
+    @patch.object(FertilizerCalculator, 'predict_requirements_per_ha')
+    def test_run_targeted(self, mock_predict_requirements_per_ha, mock_fetch_weather_data, mock_fetch_soil_features, mock_geocode_area_name):
+        """Test that a targeted soil fetcher feeds the model without a soil DataFrame"""
+        mock_geocode_area_name.return_value = (1.2345, 2.3456)
+        mock_fetch_soil_features.return_value = np.array([56, 21, 15, 200])
+        mock_fetch_weather_data.return_value = {'TEMP': 25.0, 'HUMI': 80, 'RAIN': 5, 'SUNH': 6}
+        mock_predict_requirements_per_ha.return_value = np.array([[10.0, 7.0, 5.0]])
+
+        predictor = FertilizerPredictor(area_name="Test Area", api_key="fake_api_key", crop_type="maize",
+                                        farm_size_acres=10, soil_fetcher=SoilDataFetcher(targeted=True))
+        result = predictor.run()
+
+        prepared = mock_predict_requirements_per_ha.call_args[0][0]
+        self.assertEqual(prepared.iloc[0].tolist(), [5.6, 2.1, 0.15, 20.0, 25.0, 5, 80, 6])
+        self.assertEqual(result, {'Urea (25kg bags)': 4, 'DAP (25kg bags)': 3, 'MOP (25kg bags)': 2})
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,109 @@
+import unittest
+import tempfile
+import joblib
+import numpy as np
+import pandas as pd
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'backend')))
+from sklearn.ensemble import RandomForestRegressor
+from models.artifacts import ArtifactError, ArtifactRepository
+from models.credit_scoring_model import FEATURE_NAMES
+from models.model_store import ModelStore, CROP_MODEL_FILES
+from training.model_artifacts import main as artifacts_cli
+
+CROP_FEATURES = ['PHAQ', 'TOTC', 'TOTN', 'CECS', 'TEMP', 'RAIN', 'HUMI', 'SUNH']
+
+def write_models(directory, value):
+    """Write a credit model and crop models that all predict value."""
+    paths = {}
+    for name, columns in [('credit', FEATURE_NAMES)] + [(crop, CROP_FEATURES) for crop in CROP_MODEL_FILES]:
+        X = pd.DataFrame(np.zeros((4, len(columns))), columns=columns)
+        model = RandomForestRegressor(n_estimators=1).fit(X, np.full(4, value))
+        paths[name] = os.path.join(directory, f'{name}.joblib')
+        joblib.dump(model, paths[name])
+    return paths
+
+class TestArtifactRepository(unittest.TestCase):
+    """
+    Unit tests for versioned model artifacts and hot swapping.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmpdir.name, 'artifacts')
+        self.repository = ArtifactRepository(self.root)
+        os.makedirs(os.path.join(self.tmpdir.name, 'v1'))
+        os.makedirs(os.path.join(self.tmpdir.name, 'v2'))
+        self.v1 = self.repository.publish(write_models(os.path.join(self.tmpdir.name, 'v1'), 1.0), 'v1', activate=True)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_publish_and_rollback(self):
+        """Test that activating keeps history and rollback restores the previous version"""
+        self.repository.publish({'maize': write_models(os.path.join(self.tmpdir.name, 'v2'), 2.0)['maize']},
+                                'v2', base='v1', activate=True)
+        self.assertEqual(self.repository.current_version(), 'v2')
+        self.assertEqual(set(self.repository.manifest('v2')['models']), {'credit'} | set(CROP_MODEL_FILES))
+        self.assertEqual(self.repository.rollback(), 'v1')
+        self.assertEqual(self.repository.current_version(), 'v1')
+        with self.assertRaises(ArtifactError):
+            self.repository.rollback()
+
+    def test_publish_same_basename(self):
+        """Test that models whose sources share a file name are kept apart"""
+        v2 = write_models(os.path.join(self.tmpdir.name, 'v2'), 2.0)
+        os.makedirs(os.path.join(self.tmpdir.name, 'other'))
+        other = os.path.join(self.tmpdir.name, 'other', 'maize.joblib')
+        write_models(os.path.join(self.tmpdir.name, 'other'), 3.0)
+        self.repository.publish({'maize': v2['maize'], 'beans': other}, 'v2')
+
+        self.repository.verify('v2')
+        paths = self.repository.model_paths('v2')
+        self.assertNotEqual(paths['maize'], paths['beans'])
+        row = pd.DataFrame(np.zeros((1, len(CROP_FEATURES))), columns=CROP_FEATURES)
+        self.assertEqual(joblib.load(paths['maize']).predict(row)[0], 2.0)
+        self.assertEqual(joblib.load(paths['beans']).predict(row)[0], 3.0)
+
+    def test_checksum_mismatch(self):
+        """Test that a modified file fails verification and cannot be activated"""
+        with open(self.repository.model_paths('v1')['maize'], 'ab') as f:
+            f.write(b'corrupt')
+        with self.assertRaises(ArtifactError):
+            self.repository.verify('v1')
+        with self.assertRaises(ArtifactError):
+            self.repository.activate('v1')
+
+    def test_hot_swap(self):
+        """Test that reload swaps in a new version while fetched models stay usable"""
+        store = ModelStore(artifact_dir=self.root)
+        in_flight = store.get_crop_model('maize')
+        self.assertEqual(store.get_model_set().version, 'v1')
+        self.assertFalse(store.reload())
+
+        self.repository.publish(write_models(os.path.join(self.tmpdir.name, 'v2'), 2.0), 'v2', activate=True)
+        self.assertTrue(store.reload())
+        row = pd.DataFrame(np.zeros((1, len(CROP_FEATURES))), columns=CROP_FEATURES)
+        self.assertEqual(store.get_crop_model('maize').predict(row)[0], 2.0)
+        self.assertEqual(in_flight.predict(row)[0], 1.0)
+
+        # The single rollback command brings the previous version back
+        self.assertEqual(artifacts_cli(['--root', self.root, 'rollback']), 0)
+        self.assertTrue(store.reload())
+        self.assertEqual(store.get_crop_model('maize').predict(row)[0], 1.0)
+
+    def test_failed_version_is_not_swapped(self):
+        """Test that a version failing to load leaves the current models in place"""
+        store = ModelStore(artifact_dir=self.root)
+        store.get_model_set()
+        broken = os.path.join(self.tmpdir.name, 'broken.joblib')
+        with open(broken, 'wb') as f:
+            f.write(b'not a model')
+        self.repository.publish({'maize': broken}, 'v2', base='v1', activate=True)
+        self.assertFalse(store.reload())
+        self.assertEqual(store.get_model_set().version, 'v1')
+        self.assertFalse(store.reload())
+
+if __name__ == '__main__':
+    unittest.main()
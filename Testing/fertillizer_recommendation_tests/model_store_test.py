@@ -0,0 +1,35 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'backend')))
+from models.model_store import ModelStore, CROP_MODEL_FILES
+
+class TestModelStore(unittest.TestCase):
+    """
+    Unit tests for the ModelStore class.
+    """
+
+    def test_crop_model_loaded_once(self):
+        """Test that a crop model is loaded on first use and then reused"""
+        store = ModelStore()
+        with patch('joblib.load', return_value=object()) as mock_load:
+            first = store.get_crop_model('Maize')
+            second = store.get_crop_model('maize')
+        self.assertIs(first, second)
+        mock_load.assert_called_once()
+
+    def test_unknown_crop(self):
+        """Test that an unknown crop returns None"""
+        self.assertIsNone(ModelStore().get_crop_model('coffee'))
+
+    @patch('joblib.load', return_value=object())
+    def test_preload(self, mock_load):
+        """Test that preload loads every crop model and the credit model"""
+        store = ModelStore(credit_model_path='credit.pkl')
+        store.preload()
+        self.assertEqual(mock_load.call_count, len(CROP_MODEL_FILES) + 1)
+        self.assertIs(store.get_credit_model().model, mock_load.return_value)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'backend')))
+from models.cache import LocalCache, configure_caches, get_cache, cache_stats
+from models.fertilizer_recomm_oo import FertilizerPredictor, normalize_area_name, WEATHER_BUCKET_SECONDS
+from models.model_store import MODEL_STORE
+from fake_clock import FakeClock
+
+class TestLocalCache(unittest.TestCase):
+    """
+    Unit tests for the LocalCache class.
+    """
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = LocalCache('test', maxsize=2, ttl=10, clock=self.clock)
+
+    def test_get_and_set(self):
+        """Test that cached values are returned and hits and misses are counted"""
+        self.assertIsNone(self.cache.get('a'))
+        self.cache.set('a', 1)
+        self.assertEqual(self.cache.get('a'), 1)
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['size']), (1, 1, 1))
+        self.assertEqual(stats['hit_rate'], 0.5)
+
+    def test_ttl(self):
+        """Test that entries expire after their time to live"""
+        self.cache.set('a', 1)
+        self.cache.set('b', 2, ttl=30)
+        self.clock.now = 10
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.get('b'), 2)
+        self.assertEqual(self.cache.stats()['expirations'], 1)
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted beyond maxsize"""
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertEqual(self.cache.get('c'), 3)
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+
+
+class TestRecommendationCache(unittest.TestCase):
+    """
+    Unit tests for the recommendation cache of FertilizerPredictor.
+    """
+
+    def setUp(self):
+        configure_caches('local', namespaces={'recommendation': (60, 100)})
+
+    def tearDown(self):
+        configure_caches('none')
+
+    def test_normalize_area_name(self):
+        """Test that spellings differing in case, spacing or commas share a key"""
+        self.assertEqual(normalize_area_name('  Kampala,  Uganda '), 'kampala uganda')
+        self.assertEqual(normalize_area_name('KAMPALA uganda'), 'kampala uganda')
+
+    def test_key_ignores_farm_size(self):
+        """Test that the key depends on area, crop and weather bucket but not farm size"""
+        now = 1000 * WEATHER_BUCKET_SECONDS
+        small = FertilizerPredictor('Kampala', 'key', 'Maize', 1).recommendation_key(now)
+        large = FertilizerPredictor('kampala', 'key', 'maize', 50).recommendation_key(now)
+        self.assertEqual(small, large)
+        self.assertNotEqual(small, FertilizerPredictor('Kampala', 'key', 'beans', 1).recommendation_key(now))
+        self.assertNotEqual(small, FertilizerPredictor('Kampala', 'key', 'maize', 1)
+                            .recommendation_key(now + WEATHER_BUCKET_SECONDS))
+
+    @patch.object(FertilizerPredictor, 'requirements_per_ha', return_value=((100.0, 50.0, 20.0), True))
+    def test_repeat_requests_use_cache(self, mock_requirements_per_ha):
+        """Test that repeats for other farm sizes are computed from the cached vector"""
+        first = FertilizerPredictor('Kampala', 'key', 'maize', 10).run()
+        second = FertilizerPredictor('kampala', 'key', 'maize', 20).run()
+        self.assertEqual(first, {'Urea (25kg bags)': 36, 'DAP (25kg bags)': 18, 'MOP (25kg bags)': 6})
+        self.assertEqual(second, {'Urea (25kg bags)': 71, 'DAP (25kg bags)': 36, 'MOP (25kg bags)': 11})
+        mock_requirements_per_ha.assert_called_once()
+        self.assertEqual(cache_stats()['recommendation']['hits'], 1)
+
+    @patch.object(FertilizerPredictor, 'requirements_per_ha', return_value=((100.0, 50.0, 20.0), True))
+    def test_cached_request_skips_the_pipeline(self, mock_requirements_per_ha):
+        """Test that a cached recommendation makes no upstream calls and loads no model"""
+        FertilizerPredictor('Kampala', 'key', 'maize', 10).run()
+        with patch('models.fertilizer_recomm_oo.http_get') as mock_http_get, \
+                patch.object(MODEL_STORE, 'get_crop_model') as mock_get_crop_model, \
+                patch.object(MODEL_STORE, 'get_recommendation_grid') as mock_get_grid:
+            for _ in range(100):
+                FertilizerPredictor('Kampala', 'key', 'maize', 10).run()
+        mock_http_get.assert_not_called()
+        mock_get_crop_model.assert_not_called()
+        mock_get_grid.assert_not_called()
+        self.assertEqual(mock_requirements_per_ha.call_count, 1)
+
+    @patch.object(FertilizerPredictor, 'requirements_per_ha', return_value=((100.0, 50.0, 20.0), False))
+    def test_site_estimates_are_not_cached(self, mock_requirements_per_ha):
+        """Test that requirements from nearest-site estimates are recomputed"""
+        FertilizerPredictor('Kampala', 'key', 'maize', 10).run()
+        FertilizerPredictor('Kampala', 'key', 'maize', 10).run()
+        self.assertEqual(mock_requirements_per_ha.call_count, 2)
+        self.assertEqual(len(get_cache('recommendation')), 0)
+
+    @patch.object(FertilizerPredictor, 'requirements_per_ha', return_value=(None, False))
+    def test_failures_are_not_cached(self, mock_requirements_per_ha):
+        """Test that failed recommendations return None and are not cached"""
+        self.assertIsNone(FertilizerPredictor('Kampala', 'key', 'maize', 10).run())
+        self.assertEqual(len(get_cache('recommendation')), 0)
+
+if __name__ == '__main__':
+    unittest.main()
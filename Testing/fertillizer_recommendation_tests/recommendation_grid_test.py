@@ -0,0 +1,149 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import tempfile
+import numpy as np
+import pandas as pd
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'backend')))
+from models.recommendation_grid import KEEP_VERSIONS, RecommendationGrid, active_grid
+from models.model_store import MODEL_STORE, ModelStore
+from models.fertilizer_recomm_oo import Geocoder, SoilDataFetcher, FertilizerCalculator, FertilizerPredictor
+from training.build_recommendation_grid import build_grid
+
+class TestRecommendationGrid(unittest.TestCase):
+    """
+    Unit tests for the RecommendationGrid class.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'grid')
+        grid = RecommendationGrid.create(self.path, min_lat=0.0, min_lon=32.0, step=0.1, n_lat=3, n_lon=4,
+                                         crops=['maize', 'beans'])
+        grid.values[1, 2, 0] = [100.0, 50.0, 20.0]
+        grid.flush()
+        del grid
+        self.grid = RecommendationGrid.load(self.path)
+
+    def tearDown(self):
+        del self.grid
+        self.tmpdir.cleanup()
+
+    def test_load_is_memory_mapped(self):
+        """Test that a saved grid is opened as a read-only memory map"""
+        self.assertIsInstance(self.grid.values, np.memmap)
+        self.assertEqual(self.grid.values.shape, (3, 4, 2, 3))
+        self.assertEqual(self.grid.crops, ['maize', 'beans'])
+
+    def test_lookup_nearest_point(self):
+        """Test that a location is answered from its nearest grid point"""
+        np.testing.assert_allclose(self.grid.lookup(0.13, 32.17, 'Maize'), [100.0, 50.0, 20.0])
+
+    def test_lookup_not_covered(self):
+        """Test that uncovered locations, crops and empty cells return None"""
+        self.assertIsNone(self.grid.lookup(0.5, 32.2, 'maize'))
+        self.assertIsNone(self.grid.lookup(0.1, 32.2, 'cassava'))
+        self.assertIsNone(self.grid.lookup(0.1, 32.2, 'beans'))
+
+    def test_fertilizer_bags(self):
+        """Test that per-hectare requirements are scaled to the farm and converted to bags"""
+        bags = FertilizerCalculator.fertilizer_bags(np.array([100.0, 50.0, 20.0]), 10)
+        self.assertEqual(bags, {'Urea (25kg bags)': 36, 'DAP (25kg bags)': 18, 'MOP (25kg bags)': 6})
+
+    @patch.object(Geocoder, 'geocode_area_name', return_value=(0.1, 32.2))
+    @patch.object(SoilDataFetcher, 'fetch_soil_data')
+    def test_predictor_uses_grid(self, mock_fetch_soil_data, mock_geocode_area_name):
+        """Test that covered locations skip the live pipeline"""
+        with patch.object(MODEL_STORE, 'get_recommendation_grid', return_value=self.grid):
+            result = FertilizerPredictor('Test Area', 'fake_api_key', 'maize', 10).run()
+        self.assertEqual(result, {'Urea (25kg bags)': 36, 'DAP (25kg bags)': 18, 'MOP (25kg bags)': 6})
+        mock_fetch_soil_data.assert_not_called()
+
+    @patch.object(Geocoder, 'geocode_area_name', return_value=(5.0, 40.0))
+    @patch.object(SoilDataFetcher, 'fetch_soil_data', return_value=None)
+    def test_predictor_falls_back_outside_coverage(self, mock_fetch_soil_data, mock_geocode_area_name):
+        """Test that locations outside the grid run the live pipeline"""
+        with patch.object(MODEL_STORE, 'get_recommendation_grid', return_value=self.grid):
+            result = FertilizerPredictor('Test Area', 'fake_api_key', 'maize', 10).run()
+        self.assertIsNone(result)
+        mock_fetch_soil_data.assert_called_once()
+
+
+class TestBuildRecommendationGrid(unittest.TestCase):
+    """
+    Unit tests for the recommendation grid build job.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'grid')
+        self.model = MagicMock()
+        self.model.predict.side_effect = lambda X: np.full(len(X), 1000.0)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def build(self, yield_kg_ha=1000.0):
+        soil_df = pd.DataFrame({'phh2o_0-5cm_mean': [56], 'soc_0-5cm_mean': [210],
+                                'nitrogen_0-5cm_mean': [150], 'cec_0-5cm_mean': [200]})
+        soil_fetcher = MagicMock()
+        # The point at the origin has no soil data
+        soil_fetcher.fetch_soil_data.side_effect = lambda lat, lon, **kwargs: None if lat == lon == 0 else soil_df
+        weather_fetcher = MagicMock()
+        weather_fetcher.fetch_weather_data.return_value = {'TEMP': 25.0, 'HUMI': 80, 'RAIN': 1112, 'SUNH': 6}
+        self.model.predict.side_effect = lambda X: np.full(len(X), yield_kg_ha)
+        with patch.object(MODEL_STORE, 'get_crop_model', return_value=self.model):
+            return build_grid(self.path, 0.0, 0.0, 0.1, 0.2, 0.1, ['maize'], 'key',
+                              soil_fetcher=soil_fetcher, weather_fetcher=weather_fetcher)
+
+    def test_build_grid(self):
+        """Test that every point with data gets the batch-predicted requirements"""
+        summary = self.build()
+        grid = RecommendationGrid.load(active_grid(self.path)[0])
+        self.assertEqual(grid.shape, (2, 3))
+        self.assertIsNone(grid.lookup(0.0, 0.0, 'maize'))
+        np.testing.assert_allclose(grid.lookup(0.1, 0.2, 'maize'), [10.0, 5.0, 2.0])
+        self.assertEqual(os.listdir(os.path.join(self.path, 'versions')), [active_grid(self.path)[1]])
+        del grid
+
+        self.assertEqual(summary, {'points': 6, 'covered': {'maize': 5}})
+        self.model.predict.assert_called_once()
+
+    def test_rebuild_swaps_grid(self):
+        """Test that a rebuild is published as a whole and swapped in by servers holding the old grid"""
+        self.build()
+        store = ModelStore(recommendation_grid_path=self.path)
+        old_grid = store.get_recommendation_grid()
+        self.assertFalse(store.reload_recommendation_grid())
+
+        self.build(yield_kg_ha=2000.0)
+        self.assertTrue(store.reload_recommendation_grid())
+        np.testing.assert_allclose(store.get_recommendation_grid().lookup(0.1, 0.2, 'maize'), [20.0, 10.0, 4.0])
+        # Lookups still holding the old grid keep reading it
+        np.testing.assert_allclose(old_grid.lookup(0.1, 0.2, 'maize'), [10.0, 5.0, 2.0])
+
+        for _ in range(KEEP_VERSIONS):
+            self.build()
+        self.assertEqual(len(os.listdir(os.path.join(self.path, 'versions'))), KEEP_VERSIONS)
+        # The model watcher checks the grid along with the model versions
+        new_grid = store.get_recommendation_grid()
+        store.reload()
+        self.assertIsNot(store.get_recommendation_grid(), new_grid)
+        np.testing.assert_allclose(store.get_recommendation_grid().lookup(0.1, 0.2, 'maize'), [10.0, 5.0, 2.0])
+        del old_grid, new_grid
+
+    def test_failed_build_is_cleaned_up(self):
+        """Test that a build that fails part way leaves the active grid and no staging directory behind"""
+        self.build()
+        version = active_grid(self.path)[1]
+        soil_fetcher = MagicMock()
+        soil_fetcher.fetch_soil_data.side_effect = lambda lat, lon, **kwargs: None if lat == 0 else 1 / 0
+        with self.assertRaises(ZeroDivisionError):
+            build_grid(self.path, 0.0, 0.0, 0.1, 0.2, 0.1, ['maize'], 'key', soil_fetcher=soil_fetcher,
+                       weather_fetcher=MagicMock())
+        self.assertEqual(os.listdir(os.path.join(self.path, 'versions')), [version])
+        self.assertEqual(active_grid(self.path)[1], version)
+
+if __name__ == '__main__':
+    unittest.main()
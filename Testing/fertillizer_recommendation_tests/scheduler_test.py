@@ -0,0 +1,311 @@
+import unittest
+import asyncio
+from unittest.mock import patch, MagicMock
+import multiprocessing
+import shutil
+import tempfile
+import sqlite3
+import threading
+import time
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'backend')))
+from models.scheduler import (BATCH, INTERACTIVE, INTERACTIVE_HOLD_SECONDS, OutboundScheduler, SharedTokenBucket,
+                              configure_scheduler, get_scheduler, held, outbound_priority, parse_rate_limits,
+                              parse_retry_after)
+from models.fertilizer_recomm_oo import UpstreamThrottled, http_get
+from fake_clock import FakeClock
+
+def take_token(path, results):
+    results.put(SharedTokenBucket(path, 'nominatim', rate=0.001, burst=1).try_acquire())
+
+
+def take_batch_tokens(path, count, times):
+    scheduler = OutboundScheduler({'nominatim': (10.0, 1)}, path)
+    for _ in range(count):
+        scheduler.acquire('nominatim', priority=BATCH)
+        times.put(time.time())
+
+
+class TestParsing(unittest.TestCase):
+    """
+    Unit tests for parsing rate limits and Retry-After headers.
+    """
+
+    def test_parse_rate_limits(self):
+        """Test that RATE_LIMITS lists rates with an optional burst"""
+        self.assertEqual(parse_rate_limits('nominatim=1:1, soilgrids=0.5:5,openweather=2'),
+                         {'nominatim': (1.0, 1), 'soilgrids': (0.5, 5), 'openweather': (2.0, 1)})
+        self.assertEqual(parse_rate_limits('off'), {})
+
+    def test_parse_retry_after(self):
+        """Test that Retry-After is read as seconds or as an HTTP date"""
+        self.assertEqual(parse_retry_after('30'), 30.0)
+        self.assertEqual(parse_retry_after('Wed, 21 Oct 2015 07:28:30 GMT', now=1445412480), 30.0)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after('soon'))
+
+
+class TestSharedTokenBucket(unittest.TestCase):
+    """
+    Unit tests for the SharedTokenBucket class.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'ratelimit.sqlite3')
+        self.clock = FakeClock(1000.0)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_refill(self):
+        """Test that the burst is spent at once and then refilled at the rate"""
+        bucket = SharedTokenBucket(self.path, 'soilgrids', rate=0.5, burst=2, clock=self.clock)
+        self.assertEqual([bucket.try_acquire(), bucket.try_acquire()], [0.0, 0.0])
+        self.assertAlmostEqual(bucket.try_acquire(), 2.0)
+        self.clock.now += 2
+        self.assertEqual(bucket.try_acquire(), 0.0)
+
+    def test_block(self):
+        """Test that a blocked bucket withholds tokens for the given time"""
+        bucket = SharedTokenBucket(self.path, 'nominatim', rate=10, burst=5, clock=self.clock)
+        bucket.block(30)
+        self.assertAlmostEqual(bucket.try_acquire(), 30.0)
+        self.clock.now += 30
+        self.assertAlmostEqual(bucket.try_acquire(), 0.1)
+
+    def test_batch_leaves_reserve(self):
+        """Test that batch callers leave the reserve to interactive ones and stay away while they wait"""
+        bucket = SharedTokenBucket(self.path, 'soilgrids', rate=1.0, burst=2, clock=self.clock)
+        self.assertEqual(bucket.try_acquire(BATCH), 0.0)
+        self.assertAlmostEqual(bucket.try_acquire(BATCH), 1.0)
+        self.assertEqual(bucket.try_acquire(INTERACTIVE), 0.0)
+        self.assertAlmostEqual(bucket.try_acquire(INTERACTIVE), 1.0)
+        # A token is back, but it is held for the waiting interactive caller until its turn has passed
+        self.clock.now += 1
+        self.assertAlmostEqual(bucket.try_acquire(BATCH), INTERACTIVE_HOLD_SECONDS)
+        self.assertEqual(bucket.try_acquire(INTERACTIVE), 0.0)
+        self.clock.now += 2
+        self.assertEqual(bucket.try_acquire(BATCH), 0.0)
+
+    def test_abandoned_interactive_call_does_not_hold(self):
+        """Test that an interactive caller that will not wait for its token leaves batch callers alone"""
+        bucket = SharedTokenBucket(self.path, 'nominatim', rate=1.0, burst=1, clock=self.clock)
+        self.assertEqual(bucket.try_acquire(INTERACTIVE), 0.0)
+        self.assertAlmostEqual(bucket.try_acquire(INTERACTIVE, remaining=0.5), 1.0)
+        self.clock.now += 1
+        self.assertEqual(bucket.try_acquire(BATCH), 0.0)
+
+    def test_database_without_priorities(self):
+        """Test that a rate limit database created before priorities were shared is upgraded"""
+        connection = sqlite3.connect(self.path)
+        connection.execute('CREATE TABLE buckets (name TEXT PRIMARY KEY, tokens REAL NOT NULL, '
+                           'updated REAL NOT NULL, blocked_until REAL NOT NULL)')
+        connection.execute("INSERT INTO buckets VALUES ('nominatim', 0.0, ?, 0.0)", (self.clock.now,))
+        connection.commit()
+        connection.close()
+        bucket = SharedTokenBucket(self.path, 'nominatim', rate=1.0, burst=1, clock=self.clock)
+        self.assertAlmostEqual(bucket.try_acquire(BATCH), 1.0)
+
+    def test_shared_between_workers(self):
+        """Test that a token taken by another process is gone for this one"""
+        results = multiprocessing.get_context('fork').Queue()
+        process = multiprocessing.get_context('fork').Process(target=take_token, args=(self.path, results))
+        process.start()
+        process.join()
+        self.assertEqual(results.get(timeout=5), 0.0)
+        self.assertGreater(SharedTokenBucket(self.path, 'nominatim', rate=0.001, burst=1).try_acquire(), 0)
+
+
+class TestOutboundScheduler(unittest.TestCase):
+    """
+    Unit tests for the OutboundScheduler class.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'ratelimit.sqlite3')
+
+    def tearDown(self):
+        configure_scheduler({})
+        shutil.rmtree(self.tmpdir)
+
+    def test_paces_calls(self):
+        """Test that calls beyond the burst wait for the rate"""
+        scheduler = OutboundScheduler({'nominatim': (20.0, 1)}, self.path)
+        start = time.monotonic()
+        for _ in range(3):
+            self.assertTrue(scheduler.acquire('nominatim'))
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+        self.assertTrue(scheduler.acquire('openai'))
+
+    def test_deadline(self):
+        """Test that a call is abandoned when the rate limit would outlast its deadline"""
+        scheduler = OutboundScheduler({'soilgrids': (0.01, 1)}, self.path)
+        self.assertTrue(scheduler.acquire('soilgrids'))
+        start = time.monotonic()
+        self.assertFalse(scheduler.acquire('soilgrids', deadline=time.monotonic() + 1))
+        self.assertLess(time.monotonic() - start, 0.5)
+
+    def test_rejected_interactive_call_does_not_delay_batch(self):
+        """Test that interactive calls given up at their deadline do not keep batch calls waiting"""
+        scheduler = OutboundScheduler({'nominatim': (10.0, 1)}, self.path)
+        self.assertTrue(scheduler.acquire('nominatim'))
+        self.assertFalse(scheduler.acquire('nominatim', deadline=time.monotonic() + 0.01))
+        self.assertFalse(asyncio.run(scheduler.acquire_async('nominatim', deadline=time.monotonic() + 0.01)))
+        start = time.monotonic()
+        self.assertTrue(scheduler.acquire('nominatim', priority=BATCH))
+        # The next token is due in 0.1s; a hold would add INTERACTIVE_HOLD_SECONDS
+        self.assertLess(time.monotonic() - start, 0.1 + INTERACTIVE_HOLD_SECONDS / 2)
+
+    def test_acquire_async(self):
+        """Test that async callers are paced, queue by priority and respect their deadline"""
+        scheduler = OutboundScheduler({'nominatim': (20.0, 1)}, self.path)
+        order = []
+
+        async def call(priority, label, deadline=None):
+            allowed = await scheduler.acquire_async('nominatim', priority=priority, deadline=deadline)
+            order.append((label, allowed))
+
+        async def main():
+            await call(INTERACTIVE, 'first')
+            batch = [asyncio.ensure_future(call(BATCH, f'batch{i}')) for i in range(2)]
+            await asyncio.sleep(0.01)
+            await asyncio.gather(call(INTERACTIVE, 'interactive'), call(INTERACTIVE, 'hurried', time.monotonic()),
+                                 *batch)
+
+        start = time.monotonic()
+        asyncio.run(main())
+        self.assertGreaterEqual(time.monotonic() - start, 0.14)
+        self.assertEqual(order[0], ('first', True))
+        self.assertEqual(order[1], ('hurried', False))
+        self.assertEqual([label for label, _ in order[2:]], ['interactive', 'batch0', 'batch1'])
+
+    def test_acquire_async_keeps_loop_free(self):
+        """Test that the event loop keeps running while a thread holds the queue lock and the bucket is slow"""
+        scheduler = OutboundScheduler({'nominatim': (20.0, 1)}, self.path)
+        bucket = scheduler.buckets['nominatim']
+        try_acquire = bucket.try_acquire
+
+        def slow_try_acquire(*args):
+            time.sleep(0.1)
+            return try_acquire(*args)
+
+        async def main():
+            ticks = 0
+
+            async def tick():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            ticker = asyncio.ensure_future(tick())
+            self.assertTrue(await scheduler.acquire_async('nominatim'))
+            ticker.cancel()
+            return ticks
+
+        condition, held = scheduler._conditions['nominatim'], threading.Event()
+
+        def hold_queue_lock():
+            with condition:
+                held.set()
+                time.sleep(0.1)
+
+        holder = threading.Thread(target=hold_queue_lock)
+        holder.start()
+        held.wait()
+
+        with patch.object(bucket, 'try_acquire', side_effect=slow_try_acquire):
+            self.assertGreater(asyncio.run(main()), 10)
+        holder.join()
+
+    def test_cancelled_wait_for_queue_lock(self):
+        """Test that a coroutine cancelled while waiting for the queue lock does not leave it taken"""
+        lock = threading.Lock()
+        lock.acquire()
+
+        async def main():
+            waiter = asyncio.ensure_future(held(lock).__aenter__())
+            await asyncio.sleep(0.05)
+            waiter.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter
+            lock.release()
+            await asyncio.sleep(0.05)
+
+        asyncio.run(main())
+        self.assertTrue(lock.acquire(timeout=1))
+
+    def test_interactive_calls_go_first(self):
+        """Test that queued interactive calls are served before batch calls"""
+        scheduler = OutboundScheduler({'nominatim': (20.0, 1)}, self.path)
+        scheduler.acquire('nominatim')
+        order = []
+
+        def call(priority, label):
+            scheduler.acquire('nominatim', priority=priority)
+            order.append(label)
+
+        batch = [threading.Thread(target=call, args=(BATCH, f'batch{i}')) for i in range(3)]
+        for thread in batch:
+            thread.start()
+        time.sleep(0.01)
+        interactive = threading.Thread(target=call, args=(INTERACTIVE, 'interactive'))
+        interactive.start()
+        for thread in batch + [interactive]:
+            thread.join()
+        self.assertLess(order.index('interactive'), 2)
+
+    def test_interactive_calls_go_first_across_processes(self):
+        """Test that a batch job in another process leaves the shared bucket to a waiting interactive call"""
+        context = multiprocessing.get_context('fork')
+        times = context.Queue()
+        process = context.Process(target=take_batch_tokens, args=(self.path, 15, times))
+        process.start()
+        # Wait until the batch job is draining the bucket
+        batch = [times.get(timeout=5)]
+        bucket = SharedTokenBucket(self.path, 'nominatim', rate=10.0, burst=1)
+        wait = bucket.try_acquire(INTERACTIVE)
+        self.assertGreater(wait, 0)
+        # Even waking late, the interactive call finds the next token untouched
+        start = time.time()
+        time.sleep(wait + INTERACTIVE_HOLD_SECONDS / 2)
+        self.assertEqual(bucket.try_acquire(INTERACTIVE), 0.0)
+        end = time.time()
+        process.join()
+        batch.extend(times.get(timeout=5) for _ in range(14))
+        self.assertEqual([t for t in batch if start < t < end], [])
+
+    def test_outbound_priority(self):
+        """Test that outbound_priority sets the priority of calls made in its block"""
+        scheduler = OutboundScheduler({'nominatim': (1000.0, 10)}, self.path)
+        with patch('heapq.heappush', wraps=__import__('heapq').heappush) as mock_push:
+            with outbound_priority(BATCH):
+                scheduler.acquire('nominatim')
+            scheduler.acquire('nominatim')
+        self.assertEqual([call.args[1][0] for call in mock_push.call_args_list], [BATCH, INTERACTIVE])
+
+    @patch('requests.get')
+    def test_http_get_honors_retry_after(self, mock_get):
+        """Test that a 429 with Retry-After pauses the upstream"""
+        configure_scheduler({'nominatim': (100.0, 5)}, self.path)
+        mock_get.return_value = MagicMock(status_code=429, headers={'Retry-After': '60'})
+        http_get('nominatim', 'http://nominatim/search')
+        with self.assertRaises(UpstreamThrottled):
+            http_get('nominatim', 'http://nominatim/search', deadline=time.monotonic() + 1)
+        mock_get.assert_called_once()
+        self.assertIsNotNone(get_scheduler())
+
+    @patch('requests.get')
+    def test_http_get_sets_timeout_after_waiting(self, mock_get):
+        """Test that the request timeout is what is left of the deadline after pacing"""
+        configure_scheduler({'openweather': (10.0, 1)}, self.path)
+        mock_get.return_value = MagicMock(status_code=200, headers={})
+        http_get('openweather', 'http://openweather/onecall', deadline=time.monotonic() + 5)
+        http_get('openweather', 'http://openweather/onecall', deadline=time.monotonic() + 5)
+        self.assertLess(mock_get.call_args.kwargs['timeout'], 4.95)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import unittest
+from unittest.mock import Mock, patch
+import asyncio
+import json
+import time
+import numpy as np
+import pandas as pd
+import requests
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'backend')))
+from models.site_index import SiteIndex, SITE_FEATURES, SOIL_FEATURES, DEFAULT_SITE_TABLE
+from models.model_store import MODEL_STORE, ModelStore
+from models.fertilizer_recomm_oo import (Geocoder, SoilDataFetcher, WeatherDataFetcher, FertilizerCalculator,
+                                         FertilizerPredictor, time_left)
+
+class TestSiteIndex(unittest.TestCase):
+    """
+    Unit tests for the SiteIndex class.
+    """
+
+    def setUp(self):
+        # Two sites 0.1 degrees (about 11 km) apart along the equator
+        features = np.array([[5.0, 1.0, 0.1, 10.0, 20.0, 1000.0, 70.0, 5.0],
+                             [7.0, 3.0, 0.3, 30.0, 30.0, 2000.0, 90.0, 7.0]])
+        self.index = SiteIndex([0.0, 0.0], [32.0, 32.1], features, max_distance_km=50)
+
+    def test_estimate_at_site(self):
+        """Test that a location on a site gets that site's values"""
+        estimate = self.index.estimate(0.0, 32.0, k=2)
+        self.assertAlmostEqual(estimate['PHAQ'], 5.0)
+        self.assertEqual(list(estimate), SITE_FEATURES)
+
+    def test_inverse_distance_weighting(self):
+        """Test that closer sites weigh more and equidistant sites equally"""
+        self.assertAlmostEqual(self.index.estimate(0.0, 32.05, k=2)['PHAQ'], 6.0, places=3)
+        self.assertLess(self.index.estimate(0.0, 32.02, k=2)['PHAQ'], 6.0)
+
+    def test_beyond_max_distance(self):
+        """Test that locations far from every site get no estimate"""
+        self.assertIsNone(self.index.estimate(5.0, 40.0))
+        estimates, nearest = self.index.estimate_batch([0.0, 5.0], [32.0, 40.0])
+        self.assertFalse(np.isnan(estimates[0]).any())
+        self.assertTrue(np.isnan(estimates[1]).all())
+        self.assertGreater(nearest[1], 50)
+
+    def test_from_csv(self):
+        """Test that repeated samples of a site in the training data become one site"""
+        index = SiteIndex.from_csv([DEFAULT_SITE_TABLE])
+        data = pd.read_csv(DEFAULT_SITE_TABLE)
+        self.assertEqual(len(index), len(data.groupby(['LATI', 'LNGI'])))
+        site = data[(data['LATI'] == data['LATI'][0]) & (data['LNGI'] == data['LNGI'][0])]
+        estimate = index.estimate(data['LATI'][0], data['LNGI'][0])
+        self.assertAlmostEqual(estimate['PHAQ'], site['PHAQ'].mean(), places=4)
+
+
+class TestDeadlineAndSiteFallback(unittest.TestCase):
+    """
+    Unit tests for the request deadline and the nearest-site fallback.
+    """
+
+    @patch('requests.get')
+    def test_soil_fetch_stops_at_deadline(self, mock_get):
+        """Test that no soil request is made once the deadline has passed"""
+        result = SoilDataFetcher().fetch_soil_data(0.0, 32.0, deadline=time.monotonic() - 1)
+        self.assertIsNone(result)
+        mock_get.assert_not_called()
+
+    def test_no_retry_wait_past_deadline(self):
+        """Test that an error response arriving at the deadline is not followed by a retry wait"""
+        def unavailable_until_deadline(upstream, url, deadline=None, **kwargs):
+            time.sleep(time_left(deadline))
+            return Mock(status_code=503)
+
+        async def unavailable_until_deadline_async(upstream, url, deadline=None, **kwargs):
+            return unavailable_until_deadline(upstream, url, deadline)
+
+        fetcher = SoilDataFetcher()
+        with patch('models.fertilizer_recomm_oo.http_get', side_effect=unavailable_until_deadline), \
+                patch('models.fertilizer_recomm_oo.http_get_async', side_effect=unavailable_until_deadline_async):
+            for fetch in (lambda deadline: fetcher.fetch_soil_data(0.0, 32.0, deadline=deadline),
+                          lambda deadline: fetcher.fetch_soil_features(0.0, 32.0, deadline=deadline),
+                          lambda deadline: asyncio.run(fetcher.fetch_soil_data_async(0.0, 32.0, deadline=deadline)),
+                          lambda deadline: asyncio.run(
+                              fetcher.fetch_soil_features_async(0.0, 32.0, deadline=deadline))):
+                start = time.monotonic()
+                self.assertIsNone(fetch(start + 0.2))
+                self.assertLess(time.monotonic() - start, 0.5)
+
+    @patch('requests.get', side_effect=requests.Timeout)
+    def test_weather_fetch_timeout(self, mock_get):
+        """Test that a timed out weather request returns None and is given the time left"""
+        result = WeatherDataFetcher().fetch_weather_data(0.0, 32.0, 'key', deadline=time.monotonic() + 5)
+        self.assertIsNone(result)
+        self.assertLessEqual(mock_get.call_args.kwargs['timeout'], 5)
+
+    @patch.object(Geocoder, 'geocode_area_name', return_value=(0.0, 32.05))
+    @patch.object(SoilDataFetcher, 'fetch_soil_data', return_value=None)
+    @patch.object(WeatherDataFetcher, 'fetch_weather_data', return_value=None)
+    @patch.object(FertilizerCalculator, 'predict_requirements_per_ha', return_value=np.array([[10.0, 7.0, 5.0]]))
+    def test_predictor_uses_site_estimates(self, mock_predict, mock_weather, mock_soil, mock_geocode):
+        """Test that failed soil and weather lookups fall back to nearest-site estimates"""
+        features = np.array([[5.0, 1.0, 0.1, 10.0, 20.0, 1000.0, 70.0, 5.0],
+                             [7.0, 3.0, 0.3, 30.0, 30.0, 2000.0, 90.0, 7.0]])
+        index = SiteIndex([0.0, 0.0], [32.0, 32.1], features)
+        with patch.object(MODEL_STORE, 'get_site_index', return_value=index), \
+                patch.object(MODEL_STORE, 'get_recommendation_grid', return_value=None):
+            result = FertilizerPredictor('Test Area', 'key', 'maize', 10, deadline_seconds=1).run()
+
+        self.assertEqual(result, {'Urea (25kg bags)': 4, 'DAP (25kg bags)': 3, 'MOP (25kg bags)': 2})
+        prepared_df = mock_predict.call_args[0][0]
+        self.assertEqual(list(prepared_df.columns), SITE_FEATURES)
+        np.testing.assert_allclose(prepared_df.iloc[0], features.mean(axis=0), rtol=1e-3)
+        self.assertIsNotNone(mock_soil.call_args.kwargs['deadline'])
+
+    @patch.object(Geocoder, 'geocode_area_name', return_value=(0.0, 32.0))
+    @patch.object(WeatherDataFetcher, 'fetch_weather_data', return_value={'TEMP': 25.0, 'HUMI': 80, 'RAIN': 1112, 'SUNH': 6})
+    @patch.object(FertilizerCalculator, 'predict_requirements_per_ha', return_value=np.array([[10.0, 7.0, 5.0]]))
+    def test_fallback_and_live_inputs_share_units(self, mock_predict, mock_weather, mock_geocode):
+        """Test that soil data from SoilGrids reaches the model on the scale of the site estimates"""
+        # SoilGrids serves phh2o in pH*10, soc in dg/kg, nitrogen in cg/kg and cec in mmol(c)/kg
+        mapped = {'phh2o': 58, 'soc': 210, 'nitrogen': 190, 'cec': 180}
+        layers = [{'name': name, 'depths': [{'label': '0-5cm', 'values': {'mean': value}}]}
+                  for name, value in mapped.items()]
+        response = Mock(status_code=200, content=json.dumps({'properties': {'layers': layers}}).encode())
+        response.json.return_value = json.loads(response.content)
+        sites = SiteIndex.from_csv([DEFAULT_SITE_TABLE])
+        site = sites.features[0]
+
+        def soil_inputs(soil_fetcher):
+            with patch.object(MODEL_STORE, 'get_site_index', return_value=SiteIndex([0.0], [32.0], [site])), \
+                    patch.object(MODEL_STORE, 'get_recommendation_grid', return_value=None):
+                FertilizerPredictor('Test Area', 'key', 'maize', 10, soil_fetcher=soil_fetcher).run()
+            return mock_predict.call_args[0][0][SOIL_FEATURES].iloc[0].to_numpy()
+
+        with patch('models.fertilizer_recomm_oo.http_get', return_value=response):
+            live = [soil_inputs(SoilDataFetcher()), soil_inputs(SoilDataFetcher(targeted=True))]
+        with patch('models.fertilizer_recomm_oo.http_get', side_effect=requests.ConnectionError):
+            fallback = soil_inputs(SoilDataFetcher())
+
+        np.testing.assert_allclose(fallback, site[:len(SOIL_FEATURES)])
+        np.testing.assert_allclose(live[0], [5.8, 21.0, 1.9, 18.0])
+        np.testing.assert_allclose(live[1], live[0])
+        # Values in mapped units would lie far outside the range of the measured sites
+        measured = pd.read_csv(DEFAULT_SITE_TABLE, usecols=SOIL_FEATURES)[SOIL_FEATURES]
+        self.assertTrue(((measured.min() <= live[0]) & (live[0] <= measured.max())).all())
+
+    def test_fallback_off_without_site_tables(self):
+        """Test that no site index is built unless site tables are configured"""
+        environ = {name: value for name, value in os.environ.items() if name != 'SITE_TABLES'}
+        with patch.dict(os.environ, environ, clear=True), patch.object(SiteIndex, 'from_csv') as mock_from_csv:
+            self.assertIsNone(ModelStore().get_site_index())
+        mock_from_csv.assert_not_called()
+        self.assertEqual(len(ModelStore(site_tables=[DEFAULT_SITE_TABLE]).get_site_index()), len(
+            pd.read_csv(DEFAULT_SITE_TABLE).groupby(['LATI', 'LNGI'])))
+
+if __name__ == '__main__':
+    unittest.main()
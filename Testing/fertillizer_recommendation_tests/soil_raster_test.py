@@ -0,0 +1,124 @@
+import unittest
+from unittest.mock import patch
+import tempfile
+import numpy as np
+import pandas as pd
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'backend')))
+from models.dataset import SOIL_YIELD_CSV
+from models.site_index import SOIL_FEATURES
+from models.soil_raster import D_FACTORS, RasterSoilDataFetcher, SOIL_PROPERTIES, to_model_units, write_raster
+from models.fertilizer_recomm_oo import Geocoder, SoilDataFetcher, WeatherDataFetcher, DataPreparer, FertilizerPredictor
+from training.ingest_soil_rasters import read_ascii_grid
+
+class TestRasterSoilDataFetcher(unittest.TestCase):
+    """
+    Unit tests for the RasterSoilDataFetcher class.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        # A 10x10 raster of 0.1 degree pixels covering lat 0..1 and lon 32..33, split
+        # into 4x4 tiles, where every pixel encodes its own row and column
+        rows, cols = np.indices((10, 10))
+        for offset, prop in enumerate(SOIL_PROPERTIES):
+            values = rows * 100 + cols + offset * 1000
+            values[0, 0] = -32768
+            write_raster(self.tmpdir.name, prop, values, west=32.0, north=1.0, cell_size=0.1,
+                         tile_size=4, nodata=-32768)
+        self.fetcher = RasterSoilDataFetcher(self.tmpdir.name)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_batch_query(self):
+        """Test that points across several tiles read their own pixels"""
+        values = self.fetcher.query([0.95, 0.45, 0.05, 2.0], [32.05, 32.55, 32.95, 32.5])
+        self.assertEqual(values.shape, (4, len(SOIL_PROPERTIES)))
+        self.assertTrue(np.isnan(values[0]).all())
+        np.testing.assert_array_equal(values[1], [505, 1505, 2505, 3505])
+        np.testing.assert_array_equal(values[2], [909, 1909, 2909, 3909])
+        self.assertTrue(np.isnan(values[3]).all())
+
+    def test_fetch_soil_data(self):
+        """Test that a point query returns the columns used by DataPreparer"""
+        soil_df = self.fetcher.fetch_soil_data(0.45, 32.55)
+        self.assertEqual(list(soil_df.columns), [f'{prop}_0-5cm_mean' for prop in SOIL_PROPERTIES])
+        self.assertEqual(soil_df['phh2o_0-5cm_mean'][0], 505)
+
+    def test_fetch_soil_data_nearest_valid(self):
+        """Test that a point without data falls back to the nearest point with data"""
+        soil_df = self.fetcher.fetch_soil_data(0.95, 32.05, radius=0.1, step=0.1)
+        self.assertIn(soil_df['phh2o_0-5cm_mean'][0], (1, 100))
+        self.assertIsNone(self.fetcher.fetch_soil_data(5.0, 5.0))
+
+    def test_missing_property(self):
+        """Test that a tile directory without every property is rejected"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            write_raster(tmpdir, 'phh2o', np.zeros((2, 2)), west=0, north=0, cell_size=1)
+            with self.assertRaises(ValueError):
+                RasterSoilDataFetcher(tmpdir)
+
+    @patch.object(Geocoder, 'geocode_area_name', return_value=(0.45, 32.55))
+    @patch.object(WeatherDataFetcher, 'fetch_weather_data', return_value={'TEMP': 25.0, 'HUMI': 80, 'RAIN': 1112, 'SUNH': 6})
+    @patch.object(DataPreparer, 'prepare_data_for_model', return_value=None)
+    @patch.object(SoilDataFetcher, 'fetch_soil_data')
+    def test_predictor_with_injected_fetcher(self, mock_fetch_soil_data, mock_prepare, mock_weather, mock_geocode):
+        """Test that an injected soil fetcher replaces the SoilGrids API"""
+        FertilizerPredictor('Test Area', 'fake_api_key', 'maize', 10, soil_fetcher=self.fetcher).run()
+        mock_fetch_soil_data.assert_not_called()
+        soil_df = mock_prepare.call_args[0][0]
+        self.assertEqual(soil_df['nitrogen_0-5cm_mean'][0], 2505)
+
+
+class TestModelUnits(unittest.TestCase):
+    """
+    Regression tests for converting SoilGrids mapped units into the units the crop models were trained on.
+    """
+
+    def setUp(self):
+        self.training = pd.read_csv(SOIL_YIELD_CSV, usecols=SOIL_FEATURES)[SOIL_FEATURES]
+
+    def test_to_model_units(self):
+        """Test that each property is divided by its SoilGrids d_factor"""
+        # pH*10, dg/kg, cg/kg and mmol(c)/kg into pH, g/kg, g/kg and cmol(c)/kg
+        np.testing.assert_allclose(to_model_units([[70, 55, 108, 353]]), [[7.0, 5.5, 1.08, 35.3]])
+        self.assertEqual([D_FACTORS[prop] for prop in SOIL_PROPERTIES], [10, 10, 100, 10])
+
+    def test_raster_inputs_match_training_table(self):
+        """Test that soil from the offline rasters reaches the model on the scale of the training table"""
+        median = self.training.median().to_numpy()
+        mapped = np.round(median * [D_FACTORS[prop] for prop in SOIL_PROPERTIES])
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for prop, value in zip(SOIL_PROPERTIES, mapped):
+                write_raster(tmpdir, prop, np.full((2, 2), value), west=32.0, north=1.0, cell_size=0.5)
+            soil_df = RasterSoilDataFetcher(tmpdir).fetch_soil_data(0.5, 32.5)
+        prepared_df = DataPreparer.prepare_data_for_model(soil_df, {'TEMP': 25.0, 'HUMI': 80, 'RAIN': 1112, 'SUNH': 6})
+
+        inputs = prepared_df[SOIL_FEATURES].iloc[0]
+        np.testing.assert_allclose(inputs, median, rtol=0.01)
+        self.assertTrue(((self.training.min() <= inputs) & (inputs <= self.training.max())).all())
+
+
+class TestIngestSoilRasters(unittest.TestCase):
+    """
+    Unit tests for the soil raster ingest tool.
+    """
+
+    def test_read_ascii_grid(self):
+        """Test that an ESRI ASCII grid is read with its georeferencing"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'phh2o.asc')
+            with open(path, 'w') as f:
+                f.write('ncols 3\nnrows 2\nxllcenter 32.05\nyllcenter 0.05\ncellsize 0.1\nNODATA_value -9999\n'
+                        '56 57 -9999\n60 61 62\n')
+            values, west, north, cell_size, nodata = read_ascii_grid(path)
+        np.testing.assert_array_equal(values, [[56, 57, -9999], [60, 61, 62]])
+        self.assertAlmostEqual(west, 32.0)
+        self.assertAlmostEqual(north, 0.2)
+        self.assertAlmostEqual(cell_size, 0.1)
+        self.assertEqual(nodata, -9999)
+
+if __name__ == '__main__':
+    unittest.main()
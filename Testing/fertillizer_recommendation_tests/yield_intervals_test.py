@@ -0,0 +1,121 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import LinearRegression
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'backend')))
+from models.cache import configure_caches
+from models.forest import CompiledForest, compiled_forest
+from models.fertilizer_recomm_oo import FertilizerCalculator, FertilizerPredictor
+
+FEATURES = ['PHAQ', 'TOTC', 'TOTN', 'CECS', 'TEMP', 'RAIN', 'HUMI', 'SUNH']
+
+
+def training_data(rows=300, seed=0):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.uniform(0, 10, size=(rows, len(FEATURES))), columns=FEATURES)
+    y = 300 * X['PHAQ'] + 50 * X['RAIN'] + rng.normal(0, 100, rows)
+    return X, y
+
+
+class TestCompiledForest(unittest.TestCase):
+    """
+    Unit tests for the CompiledForest class.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.X, y = training_data()
+        cls.model = RandomForestRegressor(n_estimators=20, max_depth=8, random_state=0).fit(cls.X, y)
+
+    def test_matches_the_forest(self):
+        """Test that the compiled trees reach the same leaves and predictions as sklearn"""
+        forest = CompiledForest(self.model)
+        X, _ = training_data(50, seed=1)
+        np.testing.assert_array_equal(forest.apply(X), self.model.apply(X))
+        np.testing.assert_allclose(forest.predict(X), self.model.predict(X))
+
+    def test_reorders_columns(self):
+        """Test that DataFrame columns are taken in the order the model was fitted on"""
+        forest = CompiledForest(self.model)
+        X = self.X.iloc[:5]
+        np.testing.assert_array_equal(forest.predict(X[FEATURES[::-1]]), forest.predict(X))
+
+    def test_quantiles(self):
+        """Test that quantiles are ordered and bracket the point prediction"""
+        prediction, quantiles = CompiledForest(self.model).predict_quantiles(self.X.iloc[:10], [0.0, 0.5, 1.0])
+        self.assertEqual(quantiles.shape, (10, 3))
+        self.assertTrue((np.diff(quantiles, axis=1) >= 0).all())
+        self.assertTrue(((quantiles[:, 0] <= prediction) & (prediction <= quantiles[:, 2])).all())
+
+    def test_compiled_once(self):
+        """Test that a model is compiled once, and models other than forests are not"""
+        self.assertIs(compiled_forest(self.model), compiled_forest(self.model))
+        self.assertIsNone(compiled_forest(LinearRegression().fit(self.X, self.X['PHAQ'])))
+
+
+class TestYieldIntervals(unittest.TestCase):
+    """
+    Unit tests for the yield intervals of fertilizer recommendations.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        X, y = training_data()
+        cls.model = RandomForestRegressor(n_estimators=20, random_state=0).fit(X, y)
+        cls.prepared = X.iloc[:1]
+
+    def setUp(self):
+        configure_caches('local', namespaces={'recommendation': (60, 100)})
+
+    def tearDown(self):
+        configure_caches('none')
+
+    def test_predict_with_intervals(self):
+        """Test that requirements match the point prediction and quantiles come along"""
+        calculator = FertilizerCalculator()
+        with patch('models.fertilizer_recomm_oo.MODEL_STORE.get_crop_model', return_value=self.model):
+            requirements, quantiles = calculator.predict_with_intervals(self.prepared, 'maize', (0.1, 0.9))
+            expected = calculator.predict_requirements_per_ha(self.prepared, 'maize')
+        np.testing.assert_allclose(requirements, expected)
+        self.assertEqual(quantiles.shape, (1, 2))
+        self.assertLessEqual(quantiles[0, 0], quantiles[0, 1])
+
+    def test_bag_ranges(self):
+        """Test that the lowest and highest quantiles give the fewest and most bags"""
+        ranges = FertilizerCalculator.bag_ranges(np.array([1000.0, 2000.0, 3000.0]), 10)
+        low = FertilizerCalculator.fertilizer_bags(np.array([10.0, 5.0, 2.0]), 10)
+        high = FertilizerCalculator.fertilizer_bags(np.array([30.0, 15.0, 6.0]), 10)
+        self.assertEqual(ranges, {product: {'min': low[product], 'max': high[product]} for product in low})
+
+    @patch.object(FertilizerPredictor, 'estimate_per_ha')
+    def test_run_with_intervals(self, mock_estimate):
+        """Test that intervals are reported, cached apart from plain requirements and scaled by farm size"""
+        mock_estimate.return_value = ((20.0, 10.0, 4.0), (1000.0, 2000.0, 3000.0), True)
+        predictor = FertilizerPredictor('Kampala', 'key', 'maize', 10)
+
+        result = predictor.run(intervals=True)
+        self.assertEqual(result['yield_quantiles'], {'p10': 1000.0, 'p50': 2000.0, 'p90': 3000.0})
+        self.assertEqual(result['bag_ranges']['Urea (25kg bags)'], {'min': 4, 'max': 11})
+        self.assertEqual(result['Urea (25kg bags)'], 8)
+
+        larger = FertilizerPredictor('Kampala', 'key', 'maize', 20).run(intervals=True)
+        self.assertEqual(mock_estimate.call_count, 1)
+        self.assertEqual(larger['bag_ranges']['Urea (25kg bags)'], {'min': 8, 'max': 22})
+
+        with patch.object(FertilizerPredictor, 'requirements_per_ha', return_value=((20.0, 10.0, 4.0), True)):
+            plain = predictor.run()
+        self.assertNotIn('yield_quantiles', plain)
+
+    @patch.object(FertilizerPredictor, 'estimate_per_ha', return_value=((20.0, 10.0, 4.0), None, True))
+    def test_run_without_quantiles(self, mock_estimate):
+        """Test that intervals are reported as None when the requirements come from the grid"""
+        result = FertilizerPredictor('Kampala', 'key', 'maize', 10).run(intervals=True)
+        self.assertIsNone(result['yield_quantiles'])
+        self.assertIsNone(result['bag_ranges'])
+
+if __name__ == '__main__':
+    unittest.main()
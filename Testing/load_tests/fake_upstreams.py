@@ -0,0 +1,320 @@
+"""
+Local stand-ins for Nominatim, SoilGrids, OpenWeather and the OpenAI Assistants API.
+
+Each fake runs its own HTTP server on a free local port and serves recorded payloads
+shaped like the real responses, with configurable latency and error rates.
+"""
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+PAYLOAD_DIR = os.path.join(os.path.dirname(__file__), 'payloads')
+
+
+def load_payload(name):
+    with open(os.path.join(PAYLOAD_DIR, name), 'rb') as f:
+        return f.read()
+
+
+class UpstreamBehaviour:
+    """
+    Latency and failure settings for one fake upstream.
+
+    Attributes:
+        latency (float): Mean added response time in seconds.
+        jitter (float): Half-width of the uniform noise added to latency.
+        error_rate (float): Fraction of requests answered with error_status.
+        error_status (int): HTTP status used for injected errors.
+    """
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+
+    def delay(self):
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+
+    def should_fail(self):
+        return random.random() < self.error_rate
+
+
+class UpstreamStats:
+    """
+    Thread-safe counters of what a fake upstream served.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.errors = 0
+            self.service_times = []
+
+    def record(self, elapsed, failed):
+        with self._lock:
+            self.requests += 1
+            self.errors += int(failed)
+            self.service_times.append(elapsed)
+
+    def snapshot(self):
+        with self._lock:
+            times = sorted(self.service_times)
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'mean_ms': sum(times) / len(times) * 1000 if times else 0.0,
+            'max_ms': times[-1] * 1000 if times else 0.0
+        }
+
+
+class FakeServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Room for hundreds of connections arriving at once, as from async clients
+    request_queue_size = 1024
+
+
+class FakeUpstream:
+    """
+    Base class for a fake upstream service served from a background thread.
+
+    Subclasses implement route(method, path, body) returning (status, payload bytes).
+    """
+    name = 'upstream'
+
+    def __init__(self, behaviour=None):
+        self.behaviour = behaviour or UpstreamBehaviour()
+        self.stats = UpstreamStats()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def route(self, method, path, body):
+        raise NotImplementedError
+
+    def _make_handler(self):
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _handle(self, method):
+                start = time.perf_counter()
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                time.sleep(upstream.behaviour.delay())
+                failed = upstream.behaviour.should_fail()
+                if failed:
+                    status, payload = upstream.behaviour.error_status, b'{"error": "injected failure"}'
+                else:
+                    status, payload = upstream.route(method, self.path, body)
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+                upstream.stats.record(time.perf_counter() - start, failed or status >= 400)
+
+            def do_GET(self):
+                self._handle('GET')
+
+            def do_POST(self):
+                self._handle('POST')
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._server = FakeServer(('127.0.0.1', 0), self._make_handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, name=f'fake-{self.name}', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class FakeNominatim(FakeUpstream):
+    name = 'nominatim'
+
+    def __init__(self, behaviour=None):
+        super().__init__(behaviour)
+        self.payload = load_payload('nominatim_search.json')
+
+    def route(self, method, path, body):
+        if urlparse(path).path == '/search':
+            return 200, self.payload
+        return 404, b'[]'
+
+
+class FakeSoilGrids(FakeUpstream):
+    name = 'soilgrids'
+
+    def __init__(self, behaviour=None):
+        super().__init__(behaviour)
+        self.payload = load_payload('soilgrids_query.json')
+        self._filtered = {}
+
+    def filtered_payload(self, query):
+        """The payload narrowed to the property, depth and value parameters, like the real API."""
+        properties, depths, values = (tuple(query.get(name, ())) for name in ('property', 'depth', 'value'))
+        key = (properties, depths, values)
+        if key not in self._filtered:
+            data = json.loads(self.payload)
+            layers = [layer for layer in data['properties']['layers'] if not properties or layer['name'] in properties]
+            for layer in layers:
+                layer['depths'] = [depth for depth in layer['depths'] if not depths or depth['label'] in depths]
+                for depth in layer['depths']:
+                    depth['values'] = {k: v for k, v in depth['values'].items() if not values or k in values}
+            data['properties']['layers'] = layers
+            self._filtered[key] = json.dumps(data).encode()
+        return self._filtered[key]
+
+    def route(self, method, path, body):
+        url = urlparse(path)
+        if url.path == '/soilgrids/v2.0/properties/query':
+            query = parse_qs(url.query)
+            if not any(name in query for name in ('property', 'depth', 'value')):
+                return 200, self.payload
+            return 200, self.filtered_payload(query)
+        return 404, b'{}'
+
+
+class FakeOpenWeather(FakeUpstream):
+    name = 'openweather'
+
+    def __init__(self, behaviour=None):
+        super().__init__(behaviour)
+        self.payload = load_payload('openweather_onecall.json')
+
+    def route(self, method, path, body):
+        if urlparse(path).path == '/data/3.0/onecall':
+            return 200, self.payload
+        return 404, b'{}'
+
+
+class FakeOpenAI(FakeUpstream):
+    """
+    Minimal Assistants API: threads, messages and runs that complete after run_time.
+    """
+    name = 'openai'
+
+    def __init__(self, behaviour=None, run_time=0.0, answer='Apply well-rotted manure before planting.'):
+        super().__init__(behaviour)
+        self.run_time = run_time
+        self.answer = answer
+        self._runs = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _object_id(prefix):
+        return f'{prefix}_{uuid.uuid4().hex[:24]}'
+
+    def _message(self, thread_id, role, text, run_id=None):
+        return {
+            'id': self._object_id('msg'), 'object': 'thread.message', 'created_at': int(time.time()),
+            'assistant_id': 'asst_fake' if role == 'assistant' else None, 'thread_id': thread_id,
+            'run_id': run_id, 'role': role, 'attachments': [], 'metadata': {}, 'status': 'completed',
+            'content': [{'type': 'text', 'text': {'value': text, 'annotations': []}}]
+        }
+
+    def _run(self, thread_id, run_id):
+        with self._lock:
+            started = self._runs.get(run_id, 0.0)
+            completed = time.monotonic() - started >= self.run_time
+            if completed:
+                # Forget finished runs so that long soak and load tests do not grow the fake
+                self._runs.pop(run_id, None)
+        status = 'completed' if completed else 'in_progress'
+        return {
+            'id': run_id, 'object': 'thread.run', 'created_at': int(time.time()), 'assistant_id': 'asst_fake',
+            'thread_id': thread_id, 'status': status, 'model': 'gpt-4o', 'instructions': '', 'tools': [],
+            'metadata': {}, 'parallel_tool_calls': True, 'truncation_strategy': {'type': 'auto'},
+            'response_format': 'auto', 'tool_choice': 'auto'
+        }
+
+    def route(self, method, path, body):
+        parts = urlparse(path).path.strip('/').split('/')
+        if parts[:2] != ['v1', 'threads']:
+            return 404, b'{}'
+        parts = parts[2:]
+        if not parts and method == 'POST':
+            thread_id = self._object_id('thread')
+            payload = {'id': thread_id, 'object': 'thread', 'created_at': int(time.time()), 'metadata': {}, 'tool_resources': {}}
+        elif len(parts) == 1:
+            payload = {'id': parts[0], 'object': 'thread', 'created_at': int(time.time()), 'metadata': {}, 'tool_resources': {}}
+        elif parts[1] == 'messages' and method == 'POST':
+            text = json.loads(body or b'{}').get('content', '')
+            payload = self._message(parts[0], 'user', text)
+        elif parts[1] == 'messages':
+            messages = [self._message(parts[0], 'assistant', self.answer)]
+            payload = {'object': 'list', 'data': messages, 'first_id': messages[0]['id'],
+                       'last_id': messages[-1]['id'], 'has_more': False}
+        elif parts[1] == 'runs' and len(parts) == 2:
+            run_id = self._object_id('run')
+            with self._lock:
+                self._runs[run_id] = time.monotonic()
+            payload = self._run(parts[0], run_id)
+        elif parts[1] == 'runs':
+            payload = self._run(parts[0], parts[2])
+        else:
+            return 404, b'{}'
+        return 200, json.dumps(payload).encode()
+
+
+class FakeUpstreams:
+    """
+    Starts and stops all four fakes together.
+
+    Parameters:
+        behaviours (dict): Optional UpstreamBehaviour per fake name.
+        openai_run_time (float): Seconds an assistant run stays in progress.
+    """
+    def __init__(self, behaviours=None, openai_run_time=0.0):
+        behaviours = behaviours or {}
+        self.nominatim = FakeNominatim(behaviours.get('nominatim'))
+        self.soilgrids = FakeSoilGrids(behaviours.get('soilgrids'))
+        self.openweather = FakeOpenWeather(behaviours.get('openweather'))
+        self.openai = FakeOpenAI(behaviours.get('openai'), run_time=openai_run_time)
+        self.all = [self.nominatim, self.soilgrids, self.openweather, self.openai]
+
+    def __enter__(self):
+        for upstream in self.all:
+            upstream.start()
+        return self
+
+    def __exit__(self, *exc):
+        for upstream in self.all:
+            upstream.stop()
+
+    def environment(self):
+        """Environment variables pointing the backend at the fakes."""
+        return {
+            'NOMINATIM_URL': self.nominatim.url,
+            'SOILGRIDS_URL': self.soilgrids.url,
+            'OPENWEATHER_URL': self.openweather.url,
+            'OPENAI_BASE_URL': f'{self.openai.url}/v1',
+            'OPENAI_API_KEY': 'fake-key',
+            'WEATHER_API_KEY': 'fake-key',
+            # The fakes have no quotas, so do not pace calls to them
+            'RATE_LIMITS': 'off'
+        }
+
+    def stats(self):
+        return {upstream.name: upstream.stats.snapshot() for upstream in self.all}
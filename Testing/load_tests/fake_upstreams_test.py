@@ -0,0 +1,72 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'backend')))
+import requests
+from fake_upstreams import FakeUpstreams, UpstreamBehaviour
+from models import fertilizer_recomm_oo as pipeline
+
+class TestFakeUpstreams(unittest.TestCase):
+    """
+    Checks that the recorded payloads parse through the real fetchers.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.fakes = FakeUpstreams().__enter__()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.fakes.__exit__(None, None, None)
+
+    def test_fetchers_against_fakes(self):
+        """Test geocoding, soil and weather fetches served by the fakes"""
+        with patch.multiple(pipeline, NOMINATIM_URL=self.fakes.nominatim.url,
+                            SOILGRIDS_URL=self.fakes.soilgrids.url, OPENWEATHER_URL=self.fakes.openweather.url):
+            latitude, longitude = pipeline.Geocoder.geocode_area_name('Kampala')
+            soil_df = pipeline.SoilDataFetcher().fetch_soil_data(latitude, longitude)
+            weather = pipeline.WeatherDataFetcher().fetch_weather_data(latitude, longitude, 'fake-key')
+            prepared = pipeline.DataPreparer.prepare_data_for_model(soil_df, weather)
+
+        self.assertAlmostEqual(latitude, 0.3177137)
+        self.assertEqual(list(prepared.columns), ['PHAQ', 'TOTC', 'TOTN', 'CECS', 'TEMP', 'RAIN', 'HUMI', 'SUNH'])
+        self.assertEqual(self.fakes.stats()['soilgrids']['requests'], 1)
+
+    def test_targeted_soil_query(self):
+        """Test that a targeted soil fetch gets the same features from a much smaller payload"""
+        with patch.multiple(pipeline, SOILGRIDS_URL=self.fakes.soilgrids.url):
+            soil_df = pipeline.SoilDataFetcher().fetch_soil_data(0.3177137, 32.5813539)
+            values = pipeline.SoilDataFetcher(targeted=True).fetch_soil_features(0.3177137, 32.5813539)
+        weather = {'TEMP': 25.0, 'RAIN': 0.0, 'HUMI': 60.0, 'SUNH': 12.0}
+        full = pipeline.DataPreparer.prepare_data_for_model(soil_df, weather)
+        targeted = pipeline.DataPreparer.prepare_from_features(
+            dict(pipeline.DataPreparer.soil_features(values), **weather))
+        self.assertEqual(full.values.tolist(), targeted.values.tolist())
+
+        query = {'property': list(pipeline.SOIL_PROPERTIES), 'depth': [pipeline.DEPTH], 'value': ['mean']}
+        self.assertLess(len(self.fakes.soilgrids.filtered_payload(query)) * 10, len(self.fakes.soilgrids.payload))
+
+    def test_openai_run_lifecycle(self):
+        """Test that a run reports completed once run_time has elapsed"""
+        base = f'{self.fakes.openai.url}/v1/threads'
+        thread = requests.post(base).json()
+        run = requests.post(f"{base}/{thread['id']}/runs", json={'assistant_id': 'asst_fake'}).json()
+        status = requests.get(f"{base}/{thread['id']}/runs/{run['id']}").json()['status']
+        messages = requests.get(f"{base}/{thread['id']}/messages").json()['data']
+        self.assertEqual(status, 'completed')
+        self.assertEqual(messages[0]['role'], 'assistant')
+
+    def test_injected_errors(self):
+        """Test that the error rate is applied"""
+        upstream = self.fakes.openweather
+        upstream.behaviour = UpstreamBehaviour(error_rate=1.0, error_status=429)
+        try:
+            response = requests.get(f'{upstream.url}/data/3.0/onecall')
+        finally:
+            upstream.behaviour = UpstreamBehaviour()
+        self.assertEqual(response.status_code, 429)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,293 @@
+"""
+End-to-end load test of the Flask backend against local fake upstreams.
+
+Starts the fakes from fake_upstreams.py, points the backend fetchers and OpenAI
+client at them, serves the app from a server with a fixed number of worker threads
+and drives concurrent /fertilizer_recommendation and /ask traffic. For every worker
+count it reports throughput, latency percentiles, per-stage timings of the fertilizer
+pipeline and what each upstream served.
+
+Usage:
+    python loadtest.py --workers 1 4 16 --concurrency 32 --requests 500 \\
+        --latency soilgrids=0.2 --error-rate openweather=0.05
+"""
+import argparse
+import functools
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from werkzeug.serving import BaseWSGIServer
+
+from fake_upstreams import FakeUpstreams, UpstreamBehaviour
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+backend_root = os.path.join(project_root, 'backend')
+sys.path.append(backend_root)
+sys.path.append(os.path.join(backend_root, 'training'))
+
+AREAS = ['Kampala', 'Gulu', 'Mbarara', 'Jinja', 'Mbale', 'Lira']
+CROPS = ['maize', 'cassava', 'beans']
+QUESTIONS = ['When should I plant maize?', 'How do I store cassava?', 'What pests attack beans?']
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """
+    WSGI server that handles requests on a fixed pool of worker threads.
+    """
+    def __init__(self, host, port, app, workers):
+        super().__init__(host, port, app)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='wsgi-worker')
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        self.executor.shutdown(wait=True)
+        super().server_close()
+
+
+class StageTimings:
+    """
+    Collects wall-clock durations of named pipeline stages across threads.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.durations = {}
+
+    def wrap(self, owner, attribute, stage):
+        original = getattr(owner, attribute)
+
+        @functools.wraps(original)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+
+        setattr(owner, attribute, staticmethod(timed) if isinstance(owner.__dict__[attribute], staticmethod) else timed)
+        return original
+
+    def record(self, stage, elapsed):
+        with self._lock:
+            self.durations.setdefault(stage, []).append(elapsed)
+
+    def reset(self):
+        with self._lock:
+            self.durations = {}
+
+    def summary(self):
+        with self._lock:
+            durations = {stage: np.array(values) for stage, values in self.durations.items()}
+        return {stage: summarize(values) for stage, values in durations.items()}
+
+
+def summarize(values):
+    if len(values) == 0:
+        return {'count': 0}
+    p50, p90, p99 = np.percentile(values, [50, 90, 99]) * 1000
+    return {'count': int(len(values)), 'mean_ms': float(values.mean() * 1000), 'p50_ms': float(p50),
+            'p90_ms': float(p90), 'p99_ms': float(p99), 'max_ms': float(values.max() * 1000)}
+
+
+def ensure_credit_model(workdir):
+    """Point CREDIT_MODEL_PATH at a usable model, training a throwaway one if needed."""
+    default = os.path.join(backend_root, 'models', 'credit_scoring_model.pkl')
+    if os.getenv('CREDIT_MODEL_PATH') or os.path.exists(default):
+        return
+    from models.credit_scoring_model import CreditScoringModel, FEATURE_NAMES
+    from train_credit_scoring_model import generate_synthetic_data
+    data = generate_synthetic_data(1000)
+    model = CreditScoringModel()
+    model.train_model(data[FEATURE_NAMES], model.calculate_credit_scores(data))
+    path = os.path.join(workdir, 'credit_scoring_model.pkl')
+    model.save_model(path)
+    os.environ['CREDIT_MODEL_PATH'] = path
+
+
+def load_backend(fakes, workdir):
+    """
+    Import the Flask app wired to the fakes and instrument the pipeline stages.
+
+    Returns:
+        tuple: The Flask app and the StageTimings collector.
+    """
+    os.environ.update(fakes.environment(), SESSION_FILE_DIR=workdir)
+    ensure_credit_model(workdir)
+
+    from models import fertilizer_recomm_oo as pipeline
+    pipeline.NOMINATIM_URL = fakes.nominatim.url
+    pipeline.SOILGRIDS_URL = fakes.soilgrids.url
+    pipeline.OPENWEATHER_URL = fakes.openweather.url
+    import app as backend
+
+    timings = StageTimings()
+    timings.wrap(pipeline.Geocoder, 'geocode_area_name', 'geocode')
+    timings.wrap(pipeline.SoilDataFetcher, 'fetch_soil_data', 'soil')
+    timings.wrap(pipeline.WeatherDataFetcher, 'fetch_weather_data', 'weather')
+    timings.wrap(pipeline.DataPreparer, 'prepare_data_for_model', 'prepare')
+    timings.wrap(pipeline.FertilizerCalculator, 'predict_requirements_per_ha', 'model_load_and_predict')
+    return backend.create_app(), timings
+
+
+def request_body(route, i, rng):
+    """Build the JSON body of the i-th request to a route."""
+    if route == '/ask':
+        return {'question': QUESTIONS[i % len(QUESTIONS)]}
+    if route == '/predict':
+        return [{
+            'income_stability': float(rng.uniform(0.1, 0.5)), 'income_mean': float(rng.uniform(500, 2000)),
+            'expense_stability': float(rng.uniform(0.1, 0.5)), 'expense_mean': float(rng.uniform(200, 800)),
+            'yield_consistency': float(rng.uniform(10, 50)), 'community_engagement': int(rng.integers(0, 10))}]
+    return {'area_name': AREAS[i % len(AREAS)], 'crop_type': CROPS[i % len(CROPS)],
+            'farm_size_acres': float(rng.integers(1, 20))}
+
+
+def drive(base_url, total, concurrency, mix, seed=0):
+    """
+    Send total requests from concurrency client threads.
+
+    Parameters:
+        base_url (str): Address of the server under test.
+        total (int): Number of requests to send.
+        concurrency (int): Number of client threads.
+        mix (dict): Relative weight of each route in the traffic.
+
+    Returns:
+        tuple: Per-request latencies by route, error count and elapsed seconds.
+    """
+    routes = list(mix)
+    weights = np.array([mix[route] for route in routes], dtype=float)
+    weights /= weights.sum()
+    latencies = {route: [] for route in routes}
+    errors = [0]
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def client(worker_id):
+        rng = np.random.default_rng(seed + worker_id)
+        session = requests.Session()
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            route = routes[rng.choice(len(routes), p=weights)]
+            body = request_body(route, i, rng)
+            start = time.perf_counter()
+            try:
+                ok = session.post(base_url + route, json=body, timeout=60).status_code == 200
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies[route].append(elapsed)
+                errors[0] += int(not ok)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(client, range(concurrency)))
+    return latencies, errors[0], time.perf_counter() - start
+
+
+def run_scenario(app, timings, fakes, workers, total, concurrency, ask_ratio):
+    """Serve the app with the given worker count and load it."""
+    server = PooledWSGIServer('127.0.0.1', 0, app, workers)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    timings.reset()
+    for upstream in fakes.all:
+        upstream.stats.reset()
+    try:
+        mix = {'/fertilizer_recommendation': 1 - ask_ratio, '/ask': ask_ratio}
+        latencies, errors, elapsed = drive(f'http://127.0.0.1:{server.server_port}', total, concurrency, mix)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    all_latencies = np.concatenate([np.array(values) for values in latencies.values()])
+    return {
+        'workers': workers,
+        'concurrency': concurrency,
+        'requests': total,
+        'errors': errors,
+        'elapsed_s': elapsed,
+        'throughput_rps': total / elapsed,
+        'latency': summarize(all_latencies),
+        'routes': {route: summarize(np.array(values)) for route, values in latencies.items()},
+        'stages': timings.summary(),
+        'upstreams': fakes.stats()
+    }
+
+
+def parse_overrides(pairs, cast=float):
+    overrides = {}
+    for pair in pairs or []:
+        name, value = pair.split('=')
+        overrides[name] = cast(value)
+    return overrides
+
+
+def print_report(result):
+    lat = result['latency']
+    print(f"\nworkers={result['workers']} concurrency={result['concurrency']} requests={result['requests']} "
+          f"errors={result['errors']} throughput={result['throughput_rps']:.1f} req/s")
+    print(f"  latency p50={lat['p50_ms']:.1f}ms p90={lat['p90_ms']:.1f}ms p99={lat['p99_ms']:.1f}ms max={lat['max_ms']:.1f}ms")
+    for stage, s in result['stages'].items():
+        print(f"  stage {stage:<24} n={s['count']:<6} mean={s['mean_ms']:.1f}ms p99={s['p99_ms']:.1f}ms")
+    for name, s in result['upstreams'].items():
+        print(f"  upstream {name:<12} requests={s['requests']:<6} errors={s['errors']:<4} mean={s['mean_ms']:.1f}ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load test the backend against fake upstreams.')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--ask-ratio', type=float, default=0.2, help='Fraction of traffic sent to /ask')
+    parser.add_argument('--latency', nargs='*', help='Per-upstream mean latency, e.g. soilgrids=0.2')
+    parser.add_argument('--jitter', nargs='*', help='Per-upstream latency jitter, e.g. soilgrids=0.05')
+    parser.add_argument('--error-rate', nargs='*', help='Per-upstream error rate, e.g. openweather=0.05')
+    parser.add_argument('--openai-run-time', type=float, default=0.5, help='Seconds an assistant run takes')
+    parser.add_argument('--backend-log-level', default='WARNING')
+    parser.add_argument('--output', help='Write the results as JSON to this path')
+    args = parser.parse_args(argv)
+
+    latency, jitter, error_rate = parse_overrides(args.latency), parse_overrides(args.jitter), parse_overrides(args.error_rate)
+    behaviours = {name: UpstreamBehaviour(latency.get(name, 0.0), jitter.get(name, 0.0), error_rate.get(name, 0.0))
+                  for name in ('nominatim', 'soilgrids', 'openweather', 'openai')}
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir, FakeUpstreams(behaviours, args.openai_run_time) as fakes:
+        app, timings = load_backend(fakes, workdir)
+        logging.getLogger().setLevel(args.backend_log_level)
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        for workers in args.workers:
+            result = run_scenario(app, timings, fakes, workers, args.requests, args.concurrency, args.ask_ratio)
+            print_report(result)
+            results.append(result)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
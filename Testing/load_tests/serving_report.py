@@ -0,0 +1,146 @@
+"""
+Compare the development server against the pre-forking production server.
+
+Launches `flask run` and `serve.py` with each requested worker count against the
+fake upstreams, drives the same /predict and /fertilizer_recommendation traffic at
+each, then reports aggregate throughput, latency and the RSS and PSS of every server
+process. PSS divides shared pages between the processes sharing them, so the PSS
+total shows how much of the preloaded model memory the workers actually share.
+
+Usage:
+    python serving_report.py --workers 2 4 --threads 4 --concurrency 16 --requests 400
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import requests
+
+from fake_upstreams import FakeUpstreams
+from loadtest import backend_root, drive, ensure_credit_model, summarize
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'Server exited with code {process.returncode}')
+        try:
+            requests.get(url + '/metrics', timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError('Server did not start in time')
+
+
+def process_tree(pid):
+    """Return pid and all its descendants."""
+    parents = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    parents[int(entry)] = int(f.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError):
+                continue
+    tree, frontier = [pid], [pid]
+    while frontier:
+        children = [child for child, parent in parents.items() if parent in frontier]
+        tree.extend(children)
+        frontier = children
+    return tree
+
+
+def memory_of(pid):
+    """Read RSS and PSS in KiB for one process."""
+    memory = {'pid': pid}
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                memory['rss_kib'] = int(line.split()[1])
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                if line.startswith('Pss:'):
+                    memory['pss_kib'] = int(line.split()[1])
+    except OSError:
+        pass
+    return memory
+
+
+def measure_setup(name, command, env, total, concurrency, mix):
+    port = free_port()
+    command = [part.replace('{port}', str(port)) for part in command]
+    process = subprocess.Popen(command, cwd=backend_root, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        url = f'http://127.0.0.1:{port}'
+        wait_until_ready(url, process)
+        drive(url, min(total, 50), concurrency, mix)  # warm up
+        latencies, errors, elapsed = drive(url, total, concurrency, mix)
+        processes = [memory_of(pid) for pid in process_tree(process.pid)]
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+    workers = [p for p in processes if p['pid'] != process.pid] or processes
+    return {
+        'setup': name,
+        'requests': total,
+        'errors': errors,
+        'throughput_rps': total / elapsed,
+        'latency': summarize(np.concatenate([np.array(v) for v in latencies.values()])),
+        'processes': processes,
+        'rss_per_worker_kib': float(np.mean([p['rss_kib'] for p in workers])),
+        'pss_total_kib': sum(p.get('pss_kib', 0) for p in processes)
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare flask run against the pre-fork server.')
+    parser.add_argument('--workers', type=int, nargs='+', default=[2, 4])
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--predict-ratio', type=float, default=0.5, help='Fraction of traffic sent to /predict')
+    parser.add_argument('--output', help='Write the report as JSON to this path')
+    args = parser.parse_args(argv)
+
+    mix = {'/predict': args.predict_ratio, '/fertilizer_recommendation': 1 - args.predict_ratio}
+    setups = [('flask run', [sys.executable, '-m', 'flask', '--app', 'app', 'run', '--port', '{port}'])]
+    for workers in args.workers:
+        setups.append((f'serve.py x{workers}', [sys.executable, 'serve.py', '--host', '127.0.0.1', '--port', '{port}',
+                                                '--workers', str(workers), '--threads', str(args.threads)]))
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir, FakeUpstreams() as fakes:
+        ensure_credit_model(workdir)
+        env = dict(os.environ, **fakes.environment(), SESSION_FILE_DIR=workdir)
+        for name, command in setups:
+            result = measure_setup(name, command, env, args.requests, args.concurrency, mix)
+            results.append(result)
+            lat = result['latency']
+            print(f"{name:<14} throughput={result['throughput_rps']:7.1f} req/s p50={lat['p50_ms']:7.1f}ms "
+                  f"p99={lat['p99_ms']:7.1f}ms errors={result['errors']:<4} processes={len(result['processes'])} "
+                  f"rss/worker={result['rss_per_worker_kib'] / 1024:6.1f}MiB pss total={result['pss_total_kib'] / 1024:6.1f}MiB")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,70 @@
+import unittest
+import io
+import logging
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'backend')))
+from models.structured_logging import (KeyValueFormatter, PayloadSampler, configure_logging, log_payload,
+                                       request_id_var, set_request_id, shutdown_logging)
+
+def make_record(name='models.test', msg='hello', **extra):
+    record = logging.LogRecord(name, logging.INFO, __file__, 1, msg, (), None)
+    record.__dict__.update(extra)
+    return record
+
+class TestKeyValueFormatter(unittest.TestCase):
+    """
+    Unit tests for the KeyValueFormatter class.
+    """
+
+    def test_format_fields_and_payload(self):
+        """Test standard fields, extra fields and the truncated payload"""
+        record = make_record(msg='Received data', request_id='abc', route='/predict',
+                             payload={'area_name': 'Kampala' * 10}, payload_max_bytes=20)
+        line = KeyValueFormatter().format(record)
+        self.assertIn('level=INFO logger=models.test request_id=abc msg="Received data" route=/predict', line)
+        self.assertIn('payload="{\\"area_name\\":\\"Kampal...<', line)
+
+class TestPayloadSampler(unittest.TestCase):
+    """
+    Unit tests for the PayloadSampler class.
+    """
+
+    def test_rates_by_logger_prefix(self):
+        """Test that the longest matching prefix decides the sampling rate"""
+        sampler = PayloadSampler(rates={'models': 0.0, 'models.keep': 1.0}, max_bytes={'models.keep': 10})
+        self.assertFalse(sampler.filter(make_record('models.drop', payload={})))
+        kept = make_record('models.keep.sub', payload={})
+        self.assertTrue(sampler.filter(kept))
+        self.assertEqual(kept.payload_max_bytes, 10)
+        self.assertTrue(sampler.filter(make_record('models.drop')))
+
+class TestConfigureLogging(unittest.TestCase):
+    """
+    Checks records flow through the queue with their correlation id.
+    """
+
+    def tearDown(self):
+        shutdown_logging()
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+
+    def test_queue_logging_with_request_id(self):
+        """Test that the listener writes records stamped on the calling thread"""
+        stream = io.StringIO()
+        configure_logging(level='INFO', stream=stream, sample_rates={'sampled': 0.0})
+        token = set_request_id('req-1')
+        try:
+            logging.getLogger('models.test').info('Predicted yield: %s kg/ha', 1200)
+            log_payload(logging.getLogger('sampled'), 'Dropped payload', {'a': 1})
+        finally:
+            request_id_var.reset(token)
+        shutdown_logging()
+
+        output = stream.getvalue()
+        self.assertIn('request_id=req-1 msg="Predicted yield: 1200 kg/ha"', output)
+        self.assertNotIn('Dropped payload', output)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'backend')))
+from models.metrics import MetricsRegistry, STAGE_SECONDS, STAGE_FAILURES, UPSTREAM_REQUESTS
+from models.fertilizer_recomm_oo import Geocoder, SoilDataFetcher, FertilizerPredictor, http_get
+
+class TestMetricsRegistry(unittest.TestCase):
+    """
+    Unit tests for the metric types and their exposition format.
+    """
+
+    def test_histogram_render(self):
+        """Test cumulative buckets, sum and count of a histogram"""
+        registry = MetricsRegistry()
+        histogram = registry.histogram('test_seconds', 'Test histogram.', ['stage'], buckets=(0.1, 1.0))
+        histogram.observe(0.05, stage='a')
+        histogram.observe(0.1, stage='a')
+        histogram.observe(5, stage='a')
+
+        output = registry.render()
+        self.assertIn('# TYPE test_seconds histogram', output)
+        self.assertIn('test_seconds_bucket{stage="a",le="0.1"} 2', output)
+        self.assertIn('test_seconds_bucket{stage="a",le="1.0"} 2', output)
+        self.assertIn('test_seconds_bucket{stage="a",le="+Inf"} 3', output)
+        self.assertIn('test_seconds_count{stage="a"} 3', output)
+
+    def test_counter_render(self):
+        """Test counter increments and label escaping"""
+        registry = MetricsRegistry()
+        counter = registry.counter('test_total', 'Test counter.', ['route'])
+        counter.inc(route='/a"b')
+        counter.inc(2, route='/a"b')
+        self.assertIn('test_total{route="/a\\"b"} 3', registry.render())
+
+    def test_duplicate_metric(self):
+        """Test that a metric name can only be registered once"""
+        registry = MetricsRegistry()
+        registry.counter('test_total', 'Test counter.')
+        with self.assertRaises(ValueError):
+            registry.counter('test_total', 'Test counter.')
+
+
+class TestPipelineInstrumentation(unittest.TestCase):
+    """
+    Checks that the fertilizer pipeline records stage and upstream metrics.
+    """
+
+    @patch('requests.get')
+    def test_http_get_counts_status(self, mock_get):
+        """Test that outbound calls are counted by upstream and status"""
+        mock_get.return_value = MagicMock(status_code=429)
+        before = UPSTREAM_REQUESTS.value(upstream='soilgrids', status='429')
+        http_get('soilgrids', 'http://example.invalid')
+        self.assertEqual(UPSTREAM_REQUESTS.value(upstream='soilgrids', status='429'), before + 1)
+
+    @patch.object(SoilDataFetcher, 'fetch_soil_data', return_value=None)
+    @patch.object(Geocoder, 'geocode_area_name', return_value=(1.0, 2.0))
+    def test_run_records_stages(self, mock_geocode, mock_soil):
+        """Test that run times each stage and counts the failing one"""
+        geocodes = STAGE_SECONDS.count(stage='geocode')
+        soil_failures = STAGE_FAILURES.value(stage='soil')
+
+        result = FertilizerPredictor('Test Area', 'fake_api_key', 'maize', 10).run()
+
+        self.assertIsNone(result)
+        self.assertEqual(STAGE_SECONDS.count(stage='geocode'), geocodes + 1)
+        self.assertEqual(STAGE_FAILURES.value(stage='soil'), soil_failures + 1)
+
+if __name__ == '__main__':
+    unittest.main()
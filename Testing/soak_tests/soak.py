@@ -0,0 +1,357 @@
+"""
+Soak test of the Flask backend for memory and resource leaks.
+
+Drives the app in-process through Flask's test client with a long run of mixed
+/predict, /fertilizer_recommendation and /ask calls. The upstreams are the fakes
+from load_tests/fake_upstreams.py answered in-process: requests and the OpenAI
+client are given transports that call the fakes directly, so the real client
+code runs on every call without opening sockets. Every --sample-every calls the
+run records RSS, open file descriptors, threads, live objects by type and the
+size of the session store. It fails if any of them has grown past its threshold
+since the end of the warm-up, or if any call failed.
+
+Usage:
+    python soak.py --requests 2000000 --sample-every 20000
+    python soak.py --requests 20000 --max-rss-growth-mib 32 --report soak.json
+"""
+import argparse
+import contextlib
+import gc
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from unittest.mock import patch
+from urllib.parse import urlsplit
+
+import numpy as np
+import requests
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.append(os.path.join(project_root, 'Testing', 'load_tests'))
+
+from fake_upstreams import FakeNominatim, FakeOpenAI, FakeOpenWeather, FakeSoilGrids
+from loadtest import ensure_credit_model, parse_overrides, request_body
+from serving_report import memory_of
+
+DEFAULT_MIX = {'/predict': 0.4, '/fertilizer_recommendation': 0.4, '/ask': 0.2}
+# Allowed growth of each measurement between the end of the warm-up and the end of the run
+DEFAULT_THRESHOLDS = {
+    'rss_kib': 64 * 1024,
+    'fds': 16,
+    'threads': 4,
+    # Flask-Session prunes the store once it holds SESSION_FILE_THRESHOLD (500) files
+    'session_files': 600,
+    'session_bytes': 1024 * 1024,
+    'objects': 2000
+}
+
+
+class InProcessAdapter(requests.adapters.BaseAdapter):
+    """
+    requests transport adapter that answers every request from the fake upstreams.
+    """
+    def __init__(self, upstreams):
+        super().__init__()
+        self.upstreams = upstreams
+
+    def send(self, request, **kwargs):
+        status, payload = self.upstreams.answer(request.method, request.url, request.body)
+        response = requests.Response()
+        response.status_code = status
+        response.headers['Content-Type'] = 'application/json'
+        response._content = payload
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class InProcessUpstreams:
+    """
+    The fake upstreams, each reachable at http://<name>.soak without a server.
+
+    Attributes:
+        fakes (dict): Fake upstream by host name.
+        calls (Counter): Requests answered per fake.
+    """
+    def __init__(self):
+        fakes = [FakeNominatim(), FakeSoilGrids(), FakeOpenWeather(), FakeOpenAI()]
+        self.fakes = {f'{fake.name}.soak': fake for fake in fakes}
+        self.calls = Counter()
+
+    @staticmethod
+    def url(name):
+        return f'http://{name}.soak'
+
+    def answer(self, method, url, body):
+        """Returns the status and payload the fake at url's host gives the request."""
+        parts = urlsplit(url)
+        fake = self.fakes.get(parts.netloc)
+        if fake is None:
+            return 404, b'{}'
+        self.calls[fake.name] += 1
+        path = parts.path + (f'?{parts.query}' if parts.query else '')
+        return fake.route(method, path, body or b'')
+
+    def openai_client(self):
+        """An OpenAI client whose HTTP transport calls the fake Assistants API."""
+        from openai import OpenAI
+        try:
+            import httpx
+        except ImportError:  # SDK releases built on httpx2
+            import httpx2 as httpx
+
+        def handle(request):
+            status, payload = self.answer(request.method, str(request.url), request.content)
+            return httpx.Response(status, content=payload, headers={'Content-Type': 'application/json'})
+
+        return OpenAI(api_key='fake-key', base_url=f"{self.url('openai')}/v1",
+                      http_client=httpx.Client(transport=httpx.MockTransport(handle)))
+
+    @contextlib.contextmanager
+    def installed(self, pipeline, backend):
+        """
+        Points the fertilizer pipeline and the /ask route of an imported backend at the fakes.
+
+        Parameters:
+            pipeline (module): models.fertilizer_recomm_oo.
+            backend (module): The app module.
+        """
+        adapter = InProcessAdapter(self)
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(patch.multiple(pipeline, NOMINATIM_URL=self.url('nominatim'),
+                                               SOILGRIDS_URL=self.url('soilgrids'),
+                                               OPENWEATHER_URL=self.url('openweather')))
+            stack.enter_context(patch.object(requests.Session, 'get_adapter', lambda session, url: adapter))
+            stack.enter_context(patch.object(backend, '_openai_client', self.openai_client()))
+            yield self
+
+
+def object_counts():
+    """Counts the objects tracked by the garbage collector, by module-qualified type name."""
+    gc.collect()
+    counts = Counter()
+    for obj in gc.get_objects():
+        kind = type(obj)
+        counts[f'{kind.__module__}.{kind.__qualname__}'] += 1
+    return counts
+
+
+def session_store(directory):
+    """Returns the number of files in the session store and their total size in bytes."""
+    files = size = 0
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_file():
+                files += 1
+                size += entry.stat().st_size
+    return files, size
+
+
+def take_sample(requests_done, elapsed, session_dir):
+    """
+    Measures the resources the process holds.
+
+    Returns:
+        dict: Requests done, elapsed seconds, RSS in KiB, open file descriptors,
+            threads, session store files and bytes, live objects, and a Counter of
+            them by type.
+    """
+    files, size = session_store(session_dir)
+    objects = object_counts()
+    return {
+        'requests': requests_done,
+        'elapsed_s': elapsed,
+        'rss_kib': memory_of(os.getpid())['rss_kib'],
+        'fds': len(os.listdir('/proc/self/fd')),
+        'threads': threading.active_count(),
+        'session_files': files,
+        'session_bytes': size,
+        'live_objects': sum(objects.values()),
+        'objects': objects
+    }
+
+
+def soak(app, total, sample_every, session_dir, mix=None, users=50, new_user_ratio=0.1, warmup_requests=0, seed=0,
+         on_sample=None):
+    """
+    Sends mixed requests to the app through its test client, sampling resources as it goes.
+
+    Parameters:
+        app (Flask): The application under test.
+        total (int): Number of requests to send.
+        sample_every (int): Requests between samples.
+        session_dir (str): Directory of the filesystem session store.
+        mix (dict): Relative weight of each route in the traffic.
+        users (int): Returning users, each keeping its session cookie.
+        new_user_ratio (float): Fraction of requests from first-time users without a cookie.
+        warmup_requests (int): Requests after which resources should stop growing.
+        on_sample (callable): Called with every sample as it is taken.
+
+    Returns:
+        tuple: The samples, the first taken before any request, and a Counter of
+            (route, status code) pairs. Only the baseline sample, the first taken
+            after the warm-up, and the last keep their objects by type; counters
+            kept for every sample would themselves grow the object counts.
+    """
+    mix = mix or DEFAULT_MIX
+    routes = list(mix)
+    weights = np.array([mix[route] for route in routes], dtype=float)
+    weights /= weights.sum()
+    rng = np.random.default_rng(seed)
+    returning = [app.test_client() for _ in range(users)]
+    newcomer = app.test_client(use_cookies=False)
+    statuses = Counter()
+
+    start = time.perf_counter()
+    samples = [take_sample(0, 0.0, session_dir)]
+    baseline = samples[0]
+    for first in range(0, total, sample_every):
+        batch = min(sample_every, total - first)
+        for i, choice in enumerate(rng.choice(len(routes), size=batch, p=weights), start=first):
+            route = routes[choice]
+            client = newcomer if rng.random() < new_user_ratio else returning[i % users]
+            response = client.post(route, json=request_body(route, i, rng))
+            statuses[(route, response.status_code)] += 1
+            response.close()
+        previous = samples[-1]
+        samples.append(take_sample(first + batch, time.perf_counter() - start, session_dir))
+        if baseline['requests'] < warmup_requests:
+            baseline = samples[-1]
+        if previous is not baseline:
+            del previous['objects']
+        if on_sample:
+            on_sample(samples[-1])
+    return samples, statuses
+
+
+def baseline_sample(samples, warmup_requests):
+    """Returns the first sample taken once warmup_requests have been sent."""
+    return next(sample for sample in samples if sample['requests'] >= min(warmup_requests, samples[-1]['requests']))
+
+
+def object_growth(before, after, top=20):
+    """Returns the types whose live object count grew most, as (type, growth) pairs."""
+    growth = Counter({kind: count - before.get(kind, 0) for kind, count in after.items()})
+    return [(kind, count) for kind, count in growth.most_common(top) if count > 0]
+
+
+def find_leaks(samples, warmup_requests, thresholds=None):
+    """
+    Compares the last sample with the one taken at the end of the warm-up.
+
+    Parameters:
+        samples (list): Samples from soak().
+        warmup_requests (int): Requests after which resources should stop growing.
+        thresholds (dict): Allowed growth per measurement, as DEFAULT_THRESHOLDS;
+            'objects' applies to each type separately.
+
+    Returns:
+        list: (measurement, value at the baseline, final value, allowed growth)
+            for every measurement that grew too much.
+    """
+    thresholds = dict(DEFAULT_THRESHOLDS, **(thresholds or {}))
+    before, after = baseline_sample(samples, warmup_requests), samples[-1]
+    leaks = []
+    for name, limit in thresholds.items():
+        if name == 'objects':
+            for kind, growth in object_growth(before['objects'], after['objects'], top=None):
+                if growth > limit:
+                    leaks.append((f'objects[{kind}]', before['objects'].get(kind, 0), after['objects'][kind], limit))
+        elif after[name] - before[name] > limit:
+            leaks.append((name, before[name], after[name], limit))
+    return leaks
+
+
+def print_sample(sample):
+    print(f"{sample['requests']:>10} {sample['elapsed_s']:>9.0f}s {sample['rss_kib'] / 1024:>9.1f} MiB "
+          f"{sample['fds']:>5} fds {sample['threads']:>4} threads {sample['session_files']:>6} sessions "
+          f"{sample['live_objects']:>9} objects", flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Soak test the backend in-process and fail on resource growth.')
+    parser.add_argument('--requests', type=int, default=1000000)
+    parser.add_argument('--sample-every', type=int, default=10000, help='Requests between samples')
+    parser.add_argument('--warmup', type=float, default=0.1,
+                        help='Fraction of the requests after which resources should stop growing')
+    parser.add_argument('--mix', nargs='*', metavar='ROUTE=WEIGHT',
+                        help='Route weights, e.g. /predict=0.5 /ask=0.5')
+    parser.add_argument('--users', type=int, default=50, help='Returning users keeping their session')
+    parser.add_argument('--new-user-ratio', type=float, default=0.1,
+                        help='Fraction of requests from first-time users, each starting a session')
+    parser.add_argument('--cache-backend', default='none',
+                        help="CACHE_BACKEND to run with; 'none' runs the whole pipeline on every call")
+    parser.add_argument('--max-rss-growth-mib', type=float, default=DEFAULT_THRESHOLDS['rss_kib'] / 1024)
+    parser.add_argument('--max-fd-growth', type=int, default=DEFAULT_THRESHOLDS['fds'])
+    parser.add_argument('--max-thread-growth', type=int, default=DEFAULT_THRESHOLDS['threads'])
+    parser.add_argument('--max-object-growth', type=int, default=DEFAULT_THRESHOLDS['objects'],
+                        help='Allowed growth in live objects of any one type')
+    parser.add_argument('--max-session-growth', type=int, default=DEFAULT_THRESHOLDS['session_files'],
+                        help='Allowed growth in session store files')
+    parser.add_argument('--max-session-growth-mib', type=float, default=DEFAULT_THRESHOLDS['session_bytes'] / 2**20)
+    parser.add_argument('--report', help='Write samples and findings to this JSON file')
+    args = parser.parse_args(argv)
+
+    thresholds = {
+        'rss_kib': args.max_rss_growth_mib * 1024,
+        'fds': args.max_fd_growth,
+        'threads': args.max_thread_growth,
+        'session_files': args.max_session_growth,
+        'session_bytes': args.max_session_growth_mib * 2**20,
+        'objects': args.max_object_growth
+    }
+    mix = parse_overrides(args.mix) or DEFAULT_MIX
+    warmup_requests = int(args.requests * args.warmup)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        session_dir = os.path.join(workdir, 'sessions')
+        os.makedirs(session_dir)
+        os.environ.update(SESSION_FILE_DIR=session_dir, CACHE_BACKEND=args.cache_backend, RATE_LIMITS='off',
+                          WEATHER_API_KEY='fake-key', OPENAI_API_KEY='fake-key')
+        # Millions of request log lines would only slow the run down
+        os.environ.setdefault('LOG_LEVEL', 'WARNING')
+        ensure_credit_model(workdir)
+
+        from models import fertilizer_recomm_oo as pipeline
+        import app as backend
+        upstreams = InProcessUpstreams()
+        with upstreams.installed(pipeline, backend):
+            app = backend.create_app(watch_models=False)
+            samples, statuses = soak(app, args.requests, args.sample_every, session_dir, mix, args.users,
+                                     args.new_user_ratio, warmup_requests, on_sample=print_sample)
+
+    leaks = find_leaks(samples, warmup_requests, thresholds)
+    errors = {f'{route} {status}': count for (route, status), count in statuses.items() if status != 200}
+    growth = object_growth(baseline_sample(samples, warmup_requests)['objects'], samples[-1]['objects'])
+
+    print('\nObject types that grew most since the warm-up:')
+    for kind, count in growth:
+        print(f'  {kind:<70}{count:>+9}')
+    for name, before, after, limit in leaks:
+        print(f'LEAK {name}: {before} -> {after} (allowed growth {limit:g})')
+    for key, count in errors.items():
+        print(f'ERRORS {key}: {count}')
+    print(f"Upstream calls: {dict(upstreams.calls)}")
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({
+                'samples': [{k: v for k, v in sample.items() if k != 'objects'} for sample in samples],
+                'object_growth': growth,
+                'leaks': leaks,
+                'errors': errors,
+                'upstream_calls': dict(upstreams.calls)
+            }, f, indent=2)
+    return 1 if leaks or errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+import unittest
+from unittest.mock import patch
+from collections import Counter
+import shutil
+import tempfile
+import pandas as pd
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'backend')))
+from soak import DEFAULT_MIX, InProcessUpstreams, find_leaks, object_growth, soak
+from models.cache import configure_caches
+from models.circuit_breaker import configure_breakers
+from models.scheduler import configure_scheduler
+from models.credit_scoring_model import CreditScoringModel, FEATURE_NAMES
+
+
+def sample(requests, rss_kib=100000, fds=10, objects=None, session_files=0):
+    return {'requests': requests, 'rss_kib': rss_kib, 'fds': fds, 'threads': 2, 'session_files': session_files,
+            'session_bytes': session_files * 100, 'objects': Counter(objects or {'builtins.dict': 1000})}
+
+
+class TestFindLeaks(unittest.TestCase):
+    """
+    Unit tests for the growth checks of the soak test.
+    """
+
+    def test_growth_during_warmup_is_ignored(self):
+        """Test that growth before the warm-up ends does not count"""
+        samples = [sample(0, rss_kib=10000), sample(100), sample(200, rss_kib=100100, session_files=50)]
+        self.assertEqual(find_leaks(samples, warmup_requests=100), [])
+
+    def test_growth_past_thresholds(self):
+        """Test that measurements and object types growing past their thresholds are reported"""
+        samples = [sample(0), sample(100),
+                   sample(200, rss_kib=200000, fds=11, objects={'builtins.dict': 1000, 'app.Leak': 5000})]
+        leaks = find_leaks(samples, warmup_requests=100, thresholds={'fds': 0})
+        self.assertEqual(sorted(leak[0] for leak in leaks), ['fds', 'objects[app.Leak]', 'rss_kib'])
+        self.assertIn(('objects[app.Leak]', 0, 5000, 2000), leaks)
+
+    def test_object_growth(self):
+        """Test that the types that grew most come first and shrinking types are left out"""
+        growth = object_growth(Counter(a=5, b=5, c=5), Counter(a=6, b=9, c=1, d=2))
+        self.assertEqual(growth, [('b', 4), ('d', 2), ('a', 1)])
+
+
+class TestSoak(unittest.TestCase):
+    """
+    Unit tests for a short in-process soak of the backend.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.env = patch.dict(os.environ, {'SESSION_FILE_DIR': self.tmpdir, 'RATE_LIMITS': 'off',
+                                           'CACHE_BACKEND': 'none', 'WEATHER_API_KEY': 'fake-key',
+                                           'OPENAI_API_KEY': 'fake-key'})
+        self.env.start()
+        from models import fertilizer_recomm_oo as pipeline
+        import app as backend
+        credit_model = CreditScoringModel()
+        data = pd.DataFrame({name: [float(i % 7) for i in range(50)] for name in FEATURE_NAMES})
+        credit_model.train_model(data, credit_model.calculate_credit_scores(data))
+        self.store = patch.object(backend.MODEL_STORE, 'get_credit_model', return_value=credit_model)
+        self.store.start()
+        self.upstreams = InProcessUpstreams()
+        self.installed = self.upstreams.installed(pipeline, backend)
+        self.installed.__enter__()
+        self.app = backend.create_app(watch_models=False)
+
+    def tearDown(self):
+        self.installed.__exit__(None, None, None)
+        self.store.stop()
+        self.env.stop()
+        configure_breakers([])
+        configure_scheduler({})
+        configure_caches('none')
+        shutil.rmtree(self.tmpdir)
+
+    def test_soak(self):
+        """Test that every route is served from the in-process fakes while resources are sampled"""
+        samples, statuses = soak(self.app, 90, 30, self.tmpdir, users=5, new_user_ratio=0.5, warmup_requests=30)
+
+        self.assertEqual(sum(statuses.values()), 90)
+        self.assertEqual({route for route, _ in statuses}, set(DEFAULT_MIX))
+        self.assertEqual({status for _, status in statuses}, {200})
+        self.assertEqual(self.upstreams.calls['nominatim'], statuses[('/fertilizer_recommendation', 200)])
+        self.assertGreater(self.upstreams.calls['openai'], 0)
+
+        self.assertEqual([s['requests'] for s in samples], [0, 30, 60, 90])
+        self.assertEqual(['objects' in s for s in samples], [False, True, False, True])
+        self.assertGreater(samples[-1]['session_files'], 0)
+        self.assertEqual(find_leaks(samples, warmup_requests=30), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+from unittest.mock import patch
+import tempfile
+import numpy as np
+import pandas as pd
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'backend')))
+from training import train_driver
+from training.train_driver import FEATURES, TARGETS, pareto_front, select_candidate, train_all
+
+def synthetic_data(n=80, seed=0):
+    rng = np.random.default_rng(seed)
+    data = pd.DataFrame(rng.uniform(0, 10, size=(n, len(FEATURES))), columns=FEATURES)
+    for i, column in enumerate(TARGETS.values()):
+        data[column] = data['PHAQ'] * (i + 1) + data['RAIN']
+    return data
+
+class TestTrainDriver(unittest.TestCase):
+    """
+    Unit tests for the parallel training driver.
+    """
+
+    def test_select_candidate(self):
+        """Test that the fastest candidate within the RMSE tolerance is chosen"""
+        candidates = [
+            {'params': 'big', 'rmse': 100.0, 'predict_latency_ms': 20.0},
+            {'params': 'small', 'rmse': 101.0, 'predict_latency_ms': 5.0},
+            {'params': 'tiny', 'rmse': 150.0, 'predict_latency_ms': 1.0}
+        ]
+        self.assertEqual(select_candidate(candidates, tolerance=0.02)['params'], 'small')
+        self.assertEqual(select_candidate(candidates, tolerance=0.0)['params'], 'big')
+        self.assertEqual([c['params'] for c in pareto_front(candidates)], ['big', 'small', 'tiny'])
+        self.assertEqual(pareto_front(candidates + [{'params': 'worse', 'rmse': 120.0, 'predict_latency_ms': 30.0}]),
+                         candidates)
+
+    def test_train_all_shares_split(self):
+        """Test that every crop is fitted on the same rows and saved"""
+        fitted_rows = []
+        fit_model = train_driver.fit_model
+
+        def record(crop, params, X_train, *args, **kwargs):
+            fitted_rows.append(list(X_train.index))
+            return fit_model(crop, params, X_train, *args, latency_repeats=2)
+
+        with tempfile.TemporaryDirectory() as tmpdir, patch.object(train_driver, 'fit_model', side_effect=record):
+            report = train_all(synthetic_data(), params={'n_estimators': 5, 'max_depth': None}, n_jobs=1,
+                               output_dir=tmpdir)
+            self.assertEqual(sorted(os.listdir(tmpdir)), ['model_beans.joblib', 'model_cassava.joblib', 'model_maize.joblib'])
+
+        self.assertEqual(len(fitted_rows), 3)
+        self.assertTrue(all(rows == fitted_rows[0] for rows in fitted_rows))
+        self.assertEqual(set(report['crops']), set(TARGETS))
+        for result in report['crops'].values():
+            for key in ('fit_seconds', 'model_bytes', 'predict_latency_ms', 'rmse', 'r2'):
+                self.assertIn(key, result)
+
+    def test_search(self):
+        """Test that the search reports a choice and its Pareto front for every crop"""
+        grid = [{'n_estimators': 2, 'max_depth': 2}, {'n_estimators': 5, 'max_depth': None}]
+        report = train_all(synthetic_data(), crops=['maize', 'beans'], param_grid=grid, n_jobs=2)
+        self.assertIn('search_seconds', report)
+        for result in report['crops'].values():
+            self.assertIn(result['params'], grid)
+            self.assertTrue(result['pareto_front'])
+
+if __name__ == '__main__':
+    unittest.main()
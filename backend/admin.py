@@ -0,0 +1,74 @@
+import functools
+import hmac
+import os
+
+from flask import Blueprint, abort, current_app, jsonify, request
+
+from models.circuit_breaker import breaker_states, get_breaker
+from models.profiling import ProfilerBusy, profile_app
+
+# Operational endpoints, enabled by setting ADMIN_TOKEN and called with
+# "Authorization: Bearer <ADMIN_TOKEN>"
+admin = Blueprint('admin', __name__, url_prefix='/admin')
+
+def require_admin(view):
+    """
+    Restricts a view to callers presenting ADMIN_TOKEN. Without ADMIN_TOKEN the
+    view does not exist.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        token = os.getenv('ADMIN_TOKEN')
+        if not token:
+            abort(404)
+        scheme, _, presented = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not hmac.compare_digest(presented.encode(), token.encode()):
+            return jsonify({"error": "Unauthorized"}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
+@admin.route('/breakers', methods=['GET'])
+@require_admin
+def breakers():
+    """Returns the state of the circuit breakers of this worker."""
+    return jsonify({'pid': os.getpid(), 'breakers': breaker_states()})
+
+@admin.route('/breakers/<upstream>/reset', methods=['POST'])
+@require_admin
+def reset_breaker(upstream):
+    """Closes the circuit breaker of an upstream in this worker."""
+    breaker = get_breaker(upstream)
+    if breaker is None:
+        return jsonify({"error": f"No circuit breaker for {upstream}"}), 404
+    breaker.reset()
+    return jsonify({'pid': os.getpid(), upstream: breaker.snapshot()})
+
+@admin.route('/profile', methods=['POST'])
+@require_admin
+def profile():
+    """
+    Profiles this worker and returns the report once the session ends.
+
+    The JSON body may set mode ('sampling' or 'cprofile'), duration in seconds,
+    requests (cprofile mode: stop after this many), interval_ms (sampling mode, at least 1),
+    tracemalloc (report allocation growth), sort and top. With ?format=text the
+    collapsed stacks or the pstats report are returned as plain text.
+    """
+    options = request.get_json(silent=True) or {}
+    try:
+        report = profile_app(
+            current_app._get_current_object(),
+            mode=options.get('mode', 'sampling'),
+            duration=float(options.get('duration', 10)),
+            max_requests=int(options['requests']) if options.get('requests') else None,
+            interval=float(options.get('interval_ms', 5)) / 1000,
+            trace_memory=bool(options.get('tracemalloc', False)),
+            sort=options.get('sort', 'cumulative'),
+            top=int(options.get('top', 30)))
+    except ProfilerBusy as e:
+        return jsonify({"error": str(e)}), 409
+    except (TypeError, ValueError, KeyError) as e:
+        return jsonify({"error": f"Invalid profiling options: {e}"}), 400
+    if request.args.get('format') == 'text':
+        return report.get('collapsed', report.get('pstats', '')), 200, {'Content-Type': 'text/plain; charset=utf-8'}
+    return jsonify(report)
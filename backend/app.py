@@ -1,109 +1,266 @@
-from flask import Flask, request, jsonify, session
+from flask import Flask, Blueprint, current_app, request, jsonify, session, g
 from flask_cors import CORS
-from flask_session import Session
-import pandas as pd
+import logging
 import os
+import threading
+import time
+import uuid
 from dotenv import load_dotenv
-from openai import OpenAI
 from models.fertilizer_recomm_oo import FertilizerPredictor
-from models.credit_scoring_model import CreditScoringModel
+from models.model_store import MODEL_STORE, CROP_MODEL_FILES
+from models.credit_scoring_model import FEATURE_NAMES, ExplanationUnavailable
+from models.sensitivity import SensitivityAnalyzer
+from models.metrics import REGISTRY, REQUEST_SECONDS, REQUESTS, track_upstream
+from models.structured_logging import configure_logging, log_payload, request_id_var, set_request_id
+from models.cache import configure_caches
+from models.scheduler import configure_scheduler
+from models.circuit_breaker import configure_breakers
+from admin import admin
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Initialize Flask application
-app = Flask(__name__)
-CORS(app) # Enable CORS
+# The OpenAI client is built on first use so that workers which never serve /ask
+# do not pay for importing the SDK
+_openai_client = None
+_openai_client_lock = threading.Lock()
 
-# Configure OpenAI client with API key from environment variables
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+logger = logging.getLogger(__name__)
 
-# Configure session type and secret key for Flask session management
-app.config['SESSION_TYPE'] = 'filesystem'
-app.config['SECRET_KEY'] = os.getenv('FLASK_APP_SECRET_KEY')
-Session(app)
+# Routes are registered on a blueprint so that create_app can build the application
+api = Blueprint('api', __name__)
 
-# Load the credit scoring model from the filesystem
+def get_openai_client():
+    """
+    Returns the OpenAI client, configured with the API key from the environment.
+    """
+    global _openai_client
+    if _openai_client is None:
+        with _openai_client_lock:
+            if _openai_client is None:
+                from openai import OpenAI
+                _openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+    return _openai_client
 
-model_path = os.path.join(os.path.dirname(__file__), 'models', 'credit_scoring_model.pkl')
-credit_model = CreditScoringModel()
-credit_model.load_model(model_path)
+def warm_up():
+    """
+    Loads the models and the heavy dependencies of every route ahead of the first request.
+    """
+    import pandas as pd
+    from sklearn.impute import SimpleImputer  # noqa: F401 used by DataPreparer
 
-@app.before_request
+    MODEL_STORE.preload()
+    # One prediction per model pulls in scikit-learn's lazily imported prediction code
+    for crop in CROP_MODEL_FILES:
+        model = MODEL_STORE.get_crop_model(crop)
+        model.predict(pd.DataFrame([[0.0] * len(model.feature_names_in_)], columns=model.feature_names_in_))
+    MODEL_STORE.get_credit_model().predict(pd.DataFrame([[0.0] * len(FEATURE_NAMES)], columns=FEATURE_NAMES))
+
+    if os.getenv('OPENAI_API_KEY'):
+        get_openai_client()
+
+def create_app(preload_models=False, watch_models=True):
+    """
+    Builds the Flask application.
+
+    Parameters:
+        preload_models (bool): Run warm_up() now instead of loading models and
+            dependencies on first use.
+        watch_models (bool): Start the thread that hot-swaps newly activated model
+            versions when MODEL_ARTIFACT_DIR is set. A pre-forking server starts it
+            in each worker instead, since threads do not survive a fork.
+
+    Returns:
+        Flask: The configured application.
+    """
+    configure_logging()
+    configure_caches()
+    configure_scheduler()
+    configure_breakers()
+    app = Flask(__name__)
+    CORS(app) # Enable CORS
+
+    # Configure session type and secret key for Flask session management; flask_session
+    # is imported here so that importing the module stays cheap
+    from flask_session import Session
+    app.config['SESSION_TYPE'] = 'filesystem'
+    app.config['SECRET_KEY'] = os.getenv('FLASK_APP_SECRET_KEY')
+    app.config['SESSION_FILE_DIR'] = os.getenv('SESSION_FILE_DIR', os.path.join(os.getcwd(), 'flask_session'))
+    Session(app)
+
+    app.register_blueprint(api)
+    app.register_blueprint(admin)
+    if preload_models:
+        warm_up()
+    if watch_models:
+        MODEL_STORE.start_watcher()
+    return app
+
+def openai_call(fn, *args, **kwargs):
+    """Call an OpenAI client method, recording its latency and outcome."""
+    with track_upstream('openai') as outcome:
+        result = fn(*args, **kwargs)
+        outcome['status'] = 200
+    return result
+
+def is_true(value):
+    """
+    Reads a flag from a query string or JSON body: JSON true, or '1', 'true' or
+    'yes' in any case. Anything else, such as "false" or 0, is false.
+    """
+    if isinstance(value, bool):
+        return value
+    return isinstance(value, str) and value.lower() in ('1', 'true', 'yes')
+
+@api.before_app_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+    g.request_id_token = set_request_id(g.request_id)
+
+@api.after_app_request
+def record_request_metrics(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_SECONDS.observe(time.perf_counter() - start, route=route, method=request.method)
+        REQUESTS.inc(route=route, method=request.method, status=str(response.status_code))
+    if 'request_id' in g:
+        response.headers['X-Request-ID'] = g.request_id
+    return response
+
+@api.teardown_app_request
+def reset_request_id(exc):
+    token = g.pop('request_id_token', None)
+    if token is not None:
+        request_id_var.reset(token)
+
+@api.before_app_request
 def handle_options_request():
     if request.method == 'OPTIONS':
-        response = app.make_response('')
+        response = current_app.make_response('')
         response.headers['Access-Control-Allow-Origin'] = '*'
         response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
         response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
         return response
 
-@app.route('/predict', methods=['POST'])
+@api.route('/metrics', methods=['GET'])
+def metrics():
+    return REGISTRY.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+@api.route('/predict', methods=['POST'])
 def predict():
     data = request.json
-    print("Received data:", data)
+    log_payload(logger, "Received data", data, route='/predict')
+    import pandas as pd
     df = pd.DataFrame(data)
-    predictions = credit_model.predict(df)
-    return jsonify(predictions.tolist())
+    explain = is_true(request.args.get('explain'))
+    try:
+        # A missing feature column raises KeyError when the columns are reordered
+        if not explain:
+            return jsonify(MODEL_STORE.get_credit_model().predict(df).tolist())
+        scores, bias, contributions = MODEL_STORE.get_credit_model().explain(df)
+    except KeyError as e:
+        return jsonify({"error": f"Missing feature column: {e}"}), 400
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except ExplanationUnavailable as e:
+        # The deployed model cannot explain its scores; the request itself is fine
+        return jsonify({"error": str(e)}), 501
+    return jsonify({
+        "scores": scores.tolist(),
+        "explanations": [{"bias": row_bias, "contributions": dict(zip(FEATURE_NAMES, row))}
+                         for row_bias, row in zip(bias.tolist(), contributions.tolist())]
+    })
 
-@app.route('/fertilizer_recommendation', methods=['POST'])
-def fertilizer_recommendation_route():
-    data = request.json
-    print("Received data:", data)  
+@api.route('/what_if', methods=['POST'])
+def what_if():
+    data = request.json or {}
+    farmer = data.get('farmer')
+    grid = data.get('grid')
+    if not farmer or not grid:
+        return jsonify({"error": "Missing required parameters"}), 400
+    if not isinstance(farmer, dict) or not isinstance(grid, dict):
+        return jsonify({"error": "farmer and grid must be objects"}), 400
+
+    try:
+        result = SensitivityAnalyzer(MODEL_STORE.get_credit_model()).what_if(farmer, grid)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result)
+
+def fertilizer_predictor(data):
+    """
+    Builds the FertilizerPredictor for the body of a /fertilizer_recommendation request.
+
+    Returns:
+        FertilizerPredictor: The predictor, or None if a required parameter is missing.
+    """
     area_name = data.get('area_name')
     crop_type = data.get('crop_type')
-    farm_size_acres = float( data.get('farm_size_acres'))
+    farm_size_acres = float(data.get('farm_size_acres') or 0)
     weather_api_key = os.getenv('WEATHER_API_KEY')
 
     if not all([area_name, crop_type, farm_size_acres, weather_api_key]):
+        return None
+    return FertilizerPredictor(area_name, weather_api_key, crop_type, farm_size_acres)
+
+@api.route('/fertilizer_recommendation', methods=['POST'])
+def fertilizer_recommendation_route():
+    data = request.json
+    log_payload(logger, "Received data", data, route='/fertilizer_recommendation')
+    predictor = fertilizer_predictor(data)
+    if predictor is None:
         return jsonify({"error": "Missing required parameters"}), 400
 
-    predictor = FertilizerPredictor(area_name, weather_api_key, crop_type, farm_size_acres)
-    fertilizer_requirement = predictor.run()
+    fertilizer_requirement = predictor.run(intervals=is_true(data.get('intervals')))
     
     if fertilizer_requirement is not None:
         return jsonify(fertilizer_requirement)
     else:
         return jsonify({"error": "Failed to get fertilizer recommendation"}), 400
 
-@app.route('/ask', methods=['POST'])
+@api.route('/ask', methods=['POST'])
 def ask():
     try:
         data = request.json
         question = data.get('question')
         if not question:
             return jsonify({"error": "Question parameter is missing"}), 400
+        client = get_openai_client()
 
         # Check if a thread exists in the session
         thread_id = session.get('thread_id', None)
         if thread_id is None:
             # Create a new thread if one doesn't exist
-            thread = client.beta.threads.create()
+            thread = openai_call(client.beta.threads.create)
             session['thread_id'] = thread.id  
         else:
             # Load existing thread
-            thread = client.beta.threads.retrieve(thread_id)
+            thread = openai_call(client.beta.threads.retrieve, thread_id)
 
         # Create a message in the thread
-        message = client.beta.threads.messages.create(
+        message = openai_call(
+            client.beta.threads.messages.create,
             thread_id=thread.id,
             role="user",
             content=question
         )
 
         # Run the thread with the assistant
-        run = client.beta.threads.runs.create(
+        run = openai_call(
+            client.beta.threads.runs.create,
             thread_id=thread.id,
             assistant_id="asst_oOrSqSp5jAGLs4N7g1cQ7J7X"
         )
 
         # Wait for the run to complete
-        run_status = client.beta.threads.runs.retrieve(thread_id=thread.id, run_id=run.id)
+        run_status = openai_call(client.beta.threads.runs.retrieve, thread_id=thread.id, run_id=run.id)
         while run_status.status != 'completed':
-            run_status = client.beta.threads.runs.retrieve(thread_id=thread.id, run_id=run.id)
+            run_status = openai_call(client.beta.threads.runs.retrieve, thread_id=thread.id, run_id=run.id)
 
         # Fetch messages from the thread
-        messages = client.beta.threads.messages.list(thread.id)
+        messages = openai_call(client.beta.threads.messages.list, thread.id)
         
         # Filter and get the assistant's last message
         assistant_messages = [msg for msg in messages if msg.role == 'assistant']
@@ -115,9 +272,9 @@ def ask():
             answer = "No response from assistant."
 
         return jsonify({"answer": answer})
-    except Exception as e:
-        print(f"Exception occurred: {e}")
+    except Exception:
+        logger.exception("Failed to get response from AI")
         return jsonify({"error": "Failed to get response from AI"}), 500
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
\ No newline at end of file
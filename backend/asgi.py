@@ -0,0 +1,141 @@
+"""
+ASGI entry point for the FarmAI backend.
+
+/fertilizer_recommendation is served on the event loop: its upstream calls are
+awaited rather than holding a thread each, so one worker keeps many
+recommendations in flight, and only the model prediction runs in a thread.
+Every other route is passed to the Flask application through asgiref's
+WsgiToAsgi, each request in a thread of its own.
+
+Usage, from the backend folder with the asgi extra installed:
+    uvicorn --factory asgi:create_asgi_app --host 0.0.0.0 --port 5000 --workers 4
+
+uvicorn's --limit-concurrency bounds the requests, and so the WSGI threads, of
+each worker.
+"""
+import json
+import logging
+import time
+import uuid
+
+from asgiref.sync import ThreadSensitiveContext
+from asgiref.wsgi import WsgiToAsgi
+
+from app import create_app, fertilizer_predictor, is_true
+from models.metrics import REQUEST_SECONDS, REQUESTS
+from models.structured_logging import log_payload, request_id_var, set_request_id
+
+logger = logging.getLogger(__name__)
+
+
+async def read_body(receive):
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        body.extend(message.get('body', b''))
+        if not message.get('more_body', False):
+            break
+    return bytes(body)
+
+
+def json_response(status, payload, request_id):
+    headers = [(b'content-type', b'application/json'), (b'access-control-allow-origin', b'*'),
+               (b'x-request-id', request_id.encode('latin-1'))]
+    # Keys are sorted, as by Flask's jsonify
+    return status, headers, json.dumps(payload, sort_keys=True).encode('utf-8')
+
+
+class AsgiApp:
+    """
+    ASGI application serving the async routes natively and the rest through Flask.
+
+    Attributes:
+        flask_app (Flask): Application serving the routes without an async handler.
+        wsgi (WsgiToAsgi): The Flask application as an ASGI application.
+        routes (dict): (method, path) to the coroutine function handling it.
+    """
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        # Calling the Flask object picks up middleware installed on its
+        # wsgi_app, such as the profiler's
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.routes = {('POST', '/fertilizer_recommendation'): self.fertilizer_recommendation}
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+        handler = self.routes.get((scope['method'], scope['path']))
+        if handler is None:
+            # WsgiToAsgi runs every request on one shared thread unless given a
+            # context, so give each request its own for Flask requests to overlap
+            async with ThreadSensitiveContext():
+                await self.wsgi(scope, receive, send)
+            return
+        body = await read_body(receive)
+        status, headers, content = await self.handle(handler, scope, body)
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': content})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def handle(self, handler, scope, body):
+        """
+        Runs an async handler with the request id, metrics and error handling the
+        Flask application applies to its routes.
+        """
+        headers = dict(scope.get('headers', []))
+        request_id = headers.get(b'x-request-id', b'').decode('latin-1') or uuid.uuid4().hex
+        token = set_request_id(request_id)
+        start = time.perf_counter()
+        status = 500
+        try:
+            status, payload = await handler(body)
+        except Exception:
+            logger.exception("Unhandled error in %s", scope['path'])
+            payload = {"error": "Internal server error"}
+        finally:
+            REQUEST_SECONDS.observe(time.perf_counter() - start, route=scope['path'], method=scope['method'])
+            REQUESTS.inc(route=scope['path'], method=scope['method'], status=str(status))
+            request_id_var.reset(token)
+        return json_response(status, payload, request_id)
+
+    async def fertilizer_recommendation(self, body):
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return 400, {"error": "Invalid JSON"}
+        log_payload(logger, "Received data", data, route='/fertilizer_recommendation')
+        predictor = fertilizer_predictor(data) if isinstance(data, dict) else None
+        if predictor is None:
+            return 400, {"error": "Missing required parameters"}
+
+        fertilizer_requirement = await predictor.run_async(intervals=is_true(data.get('intervals')))
+        if fertilizer_requirement is None:
+            return 400, {"error": "Failed to get fertilizer recommendation"}
+        return 200, fertilizer_requirement
+
+
+def create_asgi_app(flask_app=None):
+    """
+    Builds the ASGI application.
+
+    Parameters:
+        flask_app (Flask): Application for the routes without an async handler;
+            by default one from create_app, with the models loaded up front.
+
+    Returns:
+        AsgiApp: The application.
+    """
+    return AsgiApp(flask_app or create_app(preload_models=True))
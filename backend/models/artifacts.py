@@ -0,0 +1,214 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+POINTER_FILE = 'current.json'
+MANIFEST_FILE = 'manifest.json'
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_json_atomic(path, data):
+    """
+    Writes JSON so that readers see either the old or the new file, never a partial one.
+    """
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class ArtifactError(Exception):
+    """
+    Raised when a model version is missing, incomplete or fails its checksums.
+    """
+
+
+class ArtifactRepository:
+    """
+    Versioned model artifacts with checksums and an active-version pointer.
+
+    Every version is an immutable directory under versions/ holding the model files
+    and a manifest of their SHA-256 checksums. Versions are assembled under a
+    temporary name and renamed into place, so a version is either complete or absent.
+    The active version is named by current.json, which is replaced atomically and
+    keeps the previously active versions for rollback.
+
+    Attributes:
+        root (str): Directory holding the versions and the pointer.
+    """
+    def __init__(self, root):
+        self.root = root
+        self.versions_dir = os.path.join(root, 'versions')
+
+    @property
+    def pointer_path(self):
+        return os.path.join(self.root, POINTER_FILE)
+
+    def version_dir(self, version):
+        return os.path.join(self.versions_dir, version)
+
+    def list_versions(self):
+        if not os.path.isdir(self.versions_dir):
+            return []
+        return sorted(name for name in os.listdir(self.versions_dir) if not name.startswith('.'))
+
+    def read_pointer(self):
+        try:
+            with open(self.pointer_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'version': None, 'history': []}
+
+    def current_version(self):
+        return self.read_pointer()['version']
+
+    def manifest(self, version):
+        try:
+            with open(os.path.join(self.version_dir(version), MANIFEST_FILE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise ArtifactError(f"Model version {version} does not exist")
+
+    def model_paths(self, version):
+        """
+        Returns the path of every model of a version, keyed by model name.
+        """
+        directory = self.version_dir(version)
+        return {name: os.path.join(directory, filename) for name, filename in self.manifest(version)['models'].items()}
+
+    def verify(self, version):
+        """
+        Checks every file of a version against its manifest.
+
+        Raises:
+            ArtifactError: If a file is missing or its checksum does not match.
+        """
+        manifest = self.manifest(version)
+        for filename, expected in manifest['files'].items():
+            path = os.path.join(self.version_dir(version), filename)
+            if not os.path.exists(path):
+                raise ArtifactError(f"Model version {version} is missing {filename}")
+            if file_sha256(path) != expected['sha256']:
+                raise ArtifactError(f"Checksum mismatch for {filename} in model version {version}")
+        return manifest
+
+    def publish(self, models, version=None, base=None, activate=False):
+        """
+        Copies model files into a new immutable version.
+
+        Parameters:
+            models (dict): Model name, such as 'credit' or 'maize', to the file to copy.
+            version (str): Name of the version; a UTC timestamp if None.
+            base (str): Version whose models are carried over when not given in models.
+            activate (bool): Make the new version the active one.
+
+        Returns:
+            str: The name of the new version.
+        """
+        version = version or time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())
+        if os.path.exists(self.version_dir(version)):
+            raise ArtifactError(f"Model version {version} already exists")
+        sources = dict(self.model_paths(base)) if base else {}
+        sources.update(models)
+
+        os.makedirs(self.versions_dir, exist_ok=True)
+        staging = os.path.join(self.versions_dir, f'.{version}.tmp')
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        manifest = {'version': version, 'created': time.time(), 'base': base, 'models': {}, 'files': {}}
+        for name, source in sources.items():
+            # Named after the model, since sources from different directories may share a basename
+            filename = f'{name}{os.path.splitext(source)[1]}'
+            destination = os.path.join(staging, filename)
+            shutil.copyfile(source, destination)
+            manifest['models'][name] = filename
+            manifest['files'][filename] = {'sha256': file_sha256(destination), 'bytes': os.path.getsize(destination)}
+        write_json_atomic(os.path.join(staging, MANIFEST_FILE), manifest)
+        os.rename(staging, self.version_dir(version))
+        logger.info("Published model version %s with %s", version, sorted(manifest['models']))
+
+        if activate:
+            self.activate(version)
+        return version
+
+    def activate(self, version):
+        """
+        Makes a verified version the active one, remembering the one it replaces.
+        """
+        self.verify(version)
+        pointer = self.read_pointer()
+        history = pointer['history'] + ([pointer['version']] if pointer['version'] else [])
+        write_json_atomic(self.pointer_path, {'version': version, 'history': history, 'activated': time.time()})
+        logger.info("Activated model version %s", version)
+
+    def rollback(self):
+        """
+        Reactivates the version that was active before the current one.
+
+        Returns:
+            str: The version now active.
+        """
+        pointer = self.read_pointer()
+        if not pointer['history']:
+            raise ArtifactError("No earlier model version to roll back to")
+        version = pointer['history'][-1]
+        self.verify(version)
+        write_json_atomic(self.pointer_path, {'version': version, 'history': pointer['history'][:-1],
+                                              'activated': time.time()})
+        logger.info("Rolled back model version %s to %s", pointer['version'], version)
+        return version
+
+
+class ModelWatcher:
+    """
+    Background thread that hot-swaps the models when the active version changes.
+
+    It polls the pointer of the store's artifact repository and calls
+    ModelStore.reload(), which loads, verifies and warms up the new version before
+    swapping it in, and likewise swaps in newly published recommendation grids.
+    Forked children restart the thread, since it does not survive the fork.
+
+    Attributes:
+        store (ModelStore): The store whose models are swapped.
+        interval (float): Seconds between checks of the pointer.
+    """
+    def __init__(self, store, interval=5.0):
+        self.store = store
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='model-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.store.reload()
+            except Exception:
+                logger.exception("Model reload check failed")
@@ -0,0 +1,55 @@
+import asyncio
+import functools
+import ssl
+
+import requests
+from requests.utils import requote_uri
+
+USER_AGENT = 'farmai-async/1.0'
+
+
+@functools.lru_cache(maxsize=None)
+def ssl_context():
+    # Loading the CA bundle takes tens of milliseconds, so clients share one context
+    return ssl.create_default_context()
+
+
+async def get(url, headers=None, timeout=None):
+    """
+    Issues a GET request on the running event loop with httpx.
+
+    Every call uses its own client, so there is no pool to size or share
+    between event loops; the clients share one SSL context. Failures raise the
+    requests exceptions the synchronous callers already handle.
+
+    Parameters:
+        url (str): The URL to request; unsafe characters are quoted like requests does.
+        headers (dict): Extra request headers.
+        timeout (float): Seconds the whole call may take, or None for no limit.
+
+    Returns:
+        httpx.Response: The response.
+
+    Raises:
+        requests.Timeout: If the call takes longer than timeout.
+        requests.ConnectionError: If the connection fails or the response is malformed.
+    """
+    # httpx and its anyio dependency are only needed by the ASGI entry point and come with the asgi extra
+    import anyio
+    import httpx
+
+    url = requote_uri(url)
+    try:
+        async with httpx.AsyncClient(headers={'User-Agent': USER_AGENT}, timeout=None,
+                                     verify=ssl_context()) as client:
+            # httpx times each read separately, so the whole call is bounded here. An anyio
+            # deadline rather than asyncio.wait_for, since anyio can swallow a cancellation
+            # from outside its cancel scopes and leave the call waiting for the server.
+            with anyio.fail_after(timeout):
+                return await client.get(url, headers=headers)
+    except (TimeoutError, asyncio.TimeoutError, httpx.TimeoutException) as e:
+        raise requests.Timeout(f"GET {url} timed out after {timeout}s") from e
+    except (httpx.InvalidURL, httpx.UnsupportedProtocol) as e:
+        raise requests.exceptions.InvalidURL(f"Invalid URL {url!r}") from e
+    except httpx.HTTPError as e:
+        raise requests.ConnectionError(f"GET {url} failed: {e}") from e
@@ -0,0 +1,416 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from .metrics import CACHE_REQUESTS, CACHE_EVICTIONS
+
+logger = logging.getLogger(__name__)
+
+# Bumped when the format of cached values changes, so old entries are ignored
+KEY_VERSION = 'v1'
+
+# Default time to live in seconds and maximum entries of every cache namespace,
+# overridable with <NAMESPACE>_CACHE_TTL and <NAMESPACE>_CACHE_SIZE
+CACHE_NAMESPACES = {
+    'geocode': (30 * 24 * 3600, 10000),
+    'soil': (30 * 24 * 3600, 10000),
+    'weather': (3 * 3600, 10000),
+    'recommendation': (3 * 3600, 10000),
+}
+DEFAULT_DB_PATH = os.path.join(tempfile.gettempdir(), 'farmai-cache.sqlite3')
+COMPRESS_MIN_BYTES = 256
+
+
+def cache_key(namespace, *parts):
+    """
+    Builds the key of a cache entry, such as 'soil:v1:0.3476|32.5825'.
+
+    Parameters:
+        namespace (str): The cache the entry belongs to.
+        parts: Values identifying the entry, already normalized or rounded.
+
+    Returns:
+        str: The key.
+    """
+    return f"{namespace}:{KEY_VERSION}:" + '|'.join(str(part) for part in parts)
+
+
+def dumps(value):
+    """
+    Serializes a JSON-compatible value compactly, compressing larger ones.
+    Tuples come back as lists.
+    """
+    data = json.dumps(value, separators=(',', ':')).encode()
+    if len(data) >= COMPRESS_MIN_BYTES:
+        return b'z' + zlib.compress(data)
+    return b'j' + data
+
+
+def loads(blob):
+    blob = bytes(blob)
+    data = zlib.decompress(blob[1:]) if blob[:1] == b'z' else blob[1:]
+    return json.loads(data)
+
+
+class NullCache:
+    """
+    Cache that stores nothing, used for namespaces without a configured cache.
+    """
+    name = 'null'
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    async def get_async(self, key):
+        return None
+
+    async def set_async(self, key, value, ttl=None):
+        pass
+
+    def clear(self):
+        pass
+
+    def stats(self):
+        return {}
+
+
+class LocalCache:
+    """
+    Thread-safe in-process LRU cache whose entries expire after a time to live.
+
+    Attributes:
+        name (str): Label of the cache in metrics.
+        maxsize (int): Entries kept before the least recently used is evicted.
+        ttl (float): Default seconds an entry stays valid.
+    """
+    def __init__(self, name, maxsize=10000, ttl=3600.0, clock=time.monotonic):
+        """
+        Initializes the LocalCache.
+
+        Parameters:
+            name (str): Label of the cache in metrics.
+            maxsize (int): Entries kept before the least recently used is evicted.
+            ttl (float): Default seconds an entry stays valid.
+            clock (callable): Source of the current time in seconds.
+        """
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+
+    def get(self, key):
+        """
+        Returns the value cached under key, or None if it is absent or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= self.clock():
+                del self._entries[key]
+                self._stats['expirations'] += 1
+                entry = None
+            if entry is None:
+                self._stats['misses'] += 1
+            else:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+        CACHE_REQUESTS.inc(cache=self.name, result='miss' if entry is None else 'hit')
+        return None if entry is None else entry[1]
+
+    def set(self, key, value, ttl=None):
+        """
+        Caches value under key for ttl seconds, or the cache's default TTL.
+        """
+        evicted = 0
+        with self._lock:
+            self._entries[key] = (self.clock() + (self.ttl if ttl is None else ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                evicted += 1
+            self._stats['evictions'] += evicted
+        if evicted:
+            CACHE_EVICTIONS.inc(evicted, cache=self.name)
+
+    # The lock is only held for dictionary operations, so the async variants
+    # run in place on the event loop
+    async def get_async(self, key):
+        return self.get(key)
+
+    async def set_async(self, key, value, ttl=None):
+        self.set(key, value, ttl)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """
+        Returns the hit, miss, eviction and expiration counts, size and hit rate.
+        """
+        with self._lock:
+            stats = dict(self._stats, size=len(self._entries), maxsize=self.maxsize)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+
+class SQLiteCache:
+    """
+    Cache in a SQLite database in WAL mode, shared by every worker process on the host.
+
+    Values are stored serialized with dumps(), so they must be JSON-compatible.
+    Every thread of every process opens its own connection. Expired entries are
+    skipped on read and deleted, together with the entries closest to expiry
+    beyond maxsize, every prune_every writes. Database errors are logged and
+    treated as misses, so the cache never fails a request.
+
+    Attributes:
+        name (str): Label of the cache in metrics; entries are stored under it.
+        path (str): Path of the database file.
+        ttl (float): Default seconds an entry stays valid.
+        maxsize (int): Entries of this cache kept in the database.
+    """
+    def __init__(self, name, path, ttl=3600.0, maxsize=100000, prune_every=1000, clock=time.time):
+        self.name = name
+        self.path = path
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.prune_every = prune_every
+        self.clock = clock
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._stats = {'hits': 0, 'misses': 0, 'errors': 0}
+
+    def _connection(self):
+        # Connections are not carried across a fork, so reconnect in a new process
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, namespace TEXT NOT NULL, '
+                               'expires REAL NOT NULL, value BLOB NOT NULL) WITHOUT ROWID')
+            connection.execute('CREATE INDEX IF NOT EXISTS cache_expires ON cache (namespace, expires)')
+            local.connection, local.pid = connection, os.getpid()
+        return local.connection
+
+    def _count(self, result):
+        with self._lock:
+            self._stats[{'hit': 'hits', 'miss': 'misses', 'error': 'errors'}[result]] += 1
+        CACHE_REQUESTS.inc(cache=self.name, result=result)
+
+    def get_entry(self, key):
+        """
+        Returns the value cached under key and the time.time() it expires, or None.
+        """
+        try:
+            row = self._connection().execute(
+                'SELECT value, expires FROM cache WHERE key = ? AND expires > ?', (key, self.clock())).fetchone()
+            entry = None if row is None else (loads(row[0]), row[1])
+        except (sqlite3.Error, ValueError, zlib.error) as e:
+            logger.warning("Reading %s from the shared cache failed: %s", key, e)
+            self._count('error')
+            return None
+        self._count('miss' if entry is None else 'hit')
+        return entry
+
+    def get(self, key):
+        entry = self.get_entry(key)
+        return None if entry is None else entry[0]
+
+    def set(self, key, value, ttl=None):
+        expires = self.clock() + (self.ttl if ttl is None else ttl)
+        try:
+            self._connection().execute('INSERT OR REPLACE INTO cache (key, namespace, expires, value) VALUES (?, ?, ?, ?)',
+                                       (key, self.name, expires, dumps(value)))
+        except sqlite3.Error as e:
+            logger.warning("Writing %s to the shared cache failed: %s", key, e)
+            return
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % self.prune_every == 0
+        if prune:
+            self.prune()
+
+    # Queries may wait on the database lock held by another worker, so the
+    # async variants run them in a worker thread to keep the event loop free
+    async def get_async(self, key):
+        return await asyncio.to_thread(self.get, key)
+
+    async def set_async(self, key, value, ttl=None):
+        await asyncio.to_thread(self.set, key, value, ttl)
+
+    def prune(self):
+        """
+        Deletes expired entries and, beyond maxsize, the entries closest to expiry.
+        """
+        try:
+            connection = self._connection()
+            connection.execute('DELETE FROM cache WHERE namespace = ? AND expires <= ?', (self.name, self.clock()))
+            excess = connection.execute('SELECT COUNT(*) FROM cache WHERE namespace = ?',
+                                        (self.name,)).fetchone()[0] - self.maxsize
+            if excess > 0:
+                connection.execute('DELETE FROM cache WHERE key IN (SELECT key FROM cache WHERE namespace = ? '
+                                   'ORDER BY expires LIMIT ?)', (self.name, excess))
+                CACHE_EVICTIONS.inc(excess, cache=self.name)
+        except sqlite3.Error as e:
+            logger.warning("Pruning the shared cache failed: %s", e)
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache WHERE namespace = ?', (self.name,))
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM cache WHERE namespace = ? AND expires > ?',
+                                          (self.name, self.clock())).fetchone()[0]
+
+    def stats(self):
+        """
+        Returns this process's hit, miss and error counts, the shared size and hit rate.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        try:
+            stats['size'] = len(self)
+        except sqlite3.Error:
+            stats['size'] = None
+        stats['maxsize'] = self.maxsize
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+
+class TieredCache:
+    """
+    Process-local front tier over a shared tier.
+
+    Reads try the front tier first; a value found only in the shared tier is
+    copied into the front tier until it expires there. Writes go to both tiers.
+
+    Attributes:
+        front (LocalCache): The process-local tier.
+        shared (SQLiteCache): The tier shared by the workers on the host.
+    """
+    def __init__(self, front, shared):
+        self.front = front
+        self.shared = shared
+
+    @property
+    def name(self):
+        return self.front.name
+
+    def get(self, key):
+        value = self.front.get(key)
+        if value is not None:
+            return value
+        return self._promote(key, self.shared.get_entry(key))
+
+    def _promote(self, key, entry):
+        if entry is None:
+            return None
+        value, expires = entry
+        self.front.set(key, value, ttl=expires - self.shared.clock())
+        return value
+
+    def set(self, key, value, ttl=None):
+        self.front.set(key, value, ttl)
+        self.shared.set(key, value, ttl)
+
+    async def get_async(self, key):
+        """
+        Like get(), reading the shared tier in a worker thread on a front tier miss.
+        """
+        value = self.front.get(key)
+        if value is not None:
+            return value
+        return self._promote(key, await asyncio.to_thread(self.shared.get_entry, key))
+
+    async def set_async(self, key, value, ttl=None):
+        self.front.set(key, value, ttl)
+        await self.shared.set_async(key, value, ttl)
+
+    def clear(self):
+        self.front.clear()
+        self.shared.clear()
+
+    def __len__(self):
+        return len(self.front)
+
+    def stats(self):
+        return {'front': self.front.stats(), 'shared': self.shared.stats()}
+
+
+_caches = {}
+_null_cache = NullCache()
+
+
+def get_cache(namespace):
+    """
+    Returns the cache configured for a namespace, or a NullCache.
+    """
+    return _caches.get(namespace, _null_cache)
+
+
+def configure_caches(backend=None, db_path=None, namespaces=None):
+    """
+    Creates the caches of the external data used by the fertilizer pipeline,
+    replacing any existing ones.
+
+    Parameters:
+        backend (str): 'local' for a process-local LRU cache per namespace,
+            'shared' to back each of them with a SQLite database shared by the
+            workers on the host, or 'none'. Defaults to CACHE_BACKEND, else 'local'.
+        db_path (str): Database of the shared tier; defaults to CACHE_DB_PATH,
+            else farmai-cache.sqlite3 in the temporary directory.
+        namespaces (dict): Namespace to its (ttl, maxsize). Defaults to
+            CACHE_NAMESPACES with <NAMESPACE>_CACHE_TTL and <NAMESPACE>_CACHE_SIZE
+            applied; a size of 0 disables the namespace.
+
+    Returns:
+        dict: Namespace to its cache.
+    """
+    backend = backend or os.getenv('CACHE_BACKEND', 'local')
+    if backend not in ('none', 'local', 'shared'):
+        raise ValueError(f"Unknown cache backend {backend!r}")
+    db_path = db_path or os.getenv('CACHE_DB_PATH', DEFAULT_DB_PATH)
+    if namespaces is None:
+        namespaces = {
+            name: (float(os.getenv(f'{name.upper()}_CACHE_TTL', ttl)), int(os.getenv(f'{name.upper()}_CACHE_SIZE', maxsize)))
+            for name, (ttl, maxsize) in CACHE_NAMESPACES.items()
+        }
+
+    _caches.clear()
+    if backend == 'none':
+        return {}
+    for name, (ttl, maxsize) in namespaces.items():
+        if maxsize <= 0:
+            continue
+        cache = LocalCache(name, maxsize, ttl)
+        if backend == 'shared':
+            cache = TieredCache(cache, SQLiteCache(f'{name}_shared', db_path, ttl, maxsize))
+        _caches[name] = cache
+    logger.info("Configured %s caches for %s", backend, sorted(_caches))
+    return dict(_caches)
+
+
+def cache_stats():
+    """
+    Returns the stats of every configured cache, keyed by namespace.
+    """
+    return {namespace: cache.stats() for namespace, cache in _caches.items()}
@@ -0,0 +1,158 @@
+import logging
+import os
+import threading
+import time
+
+from .metrics import BREAKER_TRANSITIONS, BREAKER_REJECTIONS
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Upstreams the fertilizer pipeline calls
+UPSTREAMS = ['nominatim', 'soilgrids', 'openweather']
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for one upstream service.
+
+    Closed, it lets calls through and counts consecutive failures, where a call
+    slower than slow_call_seconds counts as a failure too. After
+    failure_threshold of them it opens and rejects calls, so they fail fast.
+    Once reset_seconds have passed it turns half-open and lets probe calls
+    through one at a time: probe_successes successes close it again, a failure
+    reopens it.
+
+    Attributes:
+        name (str): The upstream the breaker protects.
+        failure_threshold (int): Consecutive failures that open the breaker.
+        slow_call_seconds (float): Duration beyond which a call counts as failed.
+        reset_seconds (float): Time the breaker stays open before probing.
+        probe_successes (int): Successful probes that close the breaker.
+    """
+    def __init__(self, name, failure_threshold=5, slow_call_seconds=5.0, reset_seconds=30.0, probe_successes=2,
+                 clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.reset_seconds = reset_seconds
+        self.probe_successes = probe_successes
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.successes = 0
+        self.opened_at = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    def _transition(self, state):
+        logger.warning("Circuit breaker for %s is now %s", self.name, state)
+        BREAKER_TRANSITIONS.inc(upstream=self.name, state=state)
+        self.state = state
+        self.failures = self.successes = 0
+        self.probing = False
+        self.opened_at = self.clock() if state == OPEN else None
+
+    def allow(self):
+        """
+        Returns whether a call may be made now. In the half-open state, a True
+        return makes the caller the probe, which must then call record().
+        """
+        with self._lock:
+            if self.state == OPEN and self.clock() - self.opened_at >= self.reset_seconds:
+                self._transition(HALF_OPEN)
+            if self.state == CLOSED or (self.state == HALF_OPEN and not self.probing):
+                self.probing = self.state == HALF_OPEN
+                return True
+        BREAKER_REJECTIONS.inc(upstream=self.name)
+        return False
+
+    def record(self, success, duration=0.0):
+        """
+        Records the outcome of a call that allow() let through.
+
+        Parameters:
+            success (bool): Whether the upstream answered without a server error.
+            duration (float): Seconds the call took.
+        """
+        success = success and duration <= self.slow_call_seconds
+        with self._lock:
+            self.probing = False
+            if self.state == HALF_OPEN:
+                if not success:
+                    self._transition(OPEN)
+                else:
+                    self.successes += 1
+                    if self.successes >= self.probe_successes:
+                        self._transition(CLOSED)
+            elif self.state == CLOSED:
+                self.failures = 0 if success else self.failures + 1
+                if self.failures >= self.failure_threshold:
+                    self._transition(OPEN)
+
+    def cancel(self):
+        """
+        Gives up a call that allow() let through without it being made.
+        """
+        with self._lock:
+            self.probing = False
+
+    def reset(self):
+        with self._lock:
+            self._transition(CLOSED)
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = {
+                'state': self.state,
+                'failures': self.failures,
+                'failure_threshold': self.failure_threshold,
+                'slow_call_seconds': self.slow_call_seconds,
+                'reset_seconds': self.reset_seconds,
+            }
+            if self.state == OPEN:
+                snapshot['retry_in_seconds'] = max(self.reset_seconds - (self.clock() - self.opened_at), 0.0)
+            return snapshot
+
+
+_breakers = {}
+
+
+def get_breaker(upstream):
+    """
+    Returns the CircuitBreaker of an upstream, or None if it has none.
+    """
+    return _breakers.get(upstream)
+
+
+def breaker_states():
+    """
+    Returns a snapshot of every breaker, keyed by upstream.
+    """
+    return {name: breaker.snapshot() for name, breaker in _breakers.items()}
+
+
+def configure_breakers(upstreams=UPSTREAMS, failure_threshold=None, slow_call_seconds=None, reset_seconds=None):
+    """
+    Creates a circuit breaker for each upstream, replacing any existing ones.
+
+    Settings not passed in are read from BREAKER_FAILURE_THRESHOLD (default 5),
+    BREAKER_SLOW_CALL_SECONDS (default 5) and BREAKER_RESET_SECONDS (default 30).
+    An empty list of upstreams removes the breakers.
+
+    Returns:
+        dict: Upstream to its breaker.
+    """
+    if failure_threshold is None:
+        failure_threshold = int(os.getenv('BREAKER_FAILURE_THRESHOLD', 5))
+    if slow_call_seconds is None:
+        slow_call_seconds = float(os.getenv('BREAKER_SLOW_CALL_SECONDS', 5))
+    if reset_seconds is None:
+        reset_seconds = float(os.getenv('BREAKER_RESET_SECONDS', 30))
+    _breakers.clear()
+    for upstream in upstreams:
+        _breakers[upstream] = CircuitBreaker(upstream, failure_threshold, slow_call_seconds, reset_seconds)
+    return dict(_breakers)
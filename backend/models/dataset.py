@@ -0,0 +1,219 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from .artifacts import file_sha256, write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data'))
+SOIL_YIELD_CSV = os.path.join(DATA_DIR, 'soil_climate_yield_data.csv')
+MANIFEST_FILE = 'manifest.json'
+
+
+def parquet_available():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def downcast(df, rtol=1e-6):
+    """
+    Narrows numeric columns where it loses (almost) nothing.
+
+    float64 columns become float32 when every value survives the round trip within
+    rtol, which rules out values beyond float32's range. The forests trained on
+    these tables convert their input to float32 anyway. Integer columns become the
+    smallest integer type holding their range.
+
+    Returns:
+        DataFrame: The narrowed data.
+    """
+    import pandas as pd
+    df = df.copy()
+    for name in df.columns:
+        column = df[name]
+        if pd.api.types.is_float_dtype(column) and column.dtype != np.float32:
+            values = column.to_numpy()
+            # Values beyond float32's range overflow to inf, which fails the check below
+            with np.errstate(over='ignore'):
+                narrowed = values.astype(np.float32)
+            if np.allclose(narrowed, values, rtol=rtol, atol=0, equal_nan=True):
+                df[name] = narrowed
+        elif pd.api.types.is_integer_dtype(column):
+            df[name] = pd.to_numeric(column, downcast='integer')
+    return df
+
+
+class ColumnarDataset:
+    """
+    A CSV table converted once into a columnar cache that loads only the columns asked for.
+
+    The cache is Parquet when pyarrow is installed and otherwise one .npy file per
+    column, which is opened memory-mapped. It records the SHA-256 of the CSV it
+    was built from and is rebuilt when the CSV changes; the hash is only recomputed
+    when the CSV's size or modification time differ from the recorded ones.
+
+    Attributes:
+        source (str): Path of the CSV file.
+        cache_dir (str): Directory holding the cache of this CSV.
+        downcast (bool): Narrow numeric columns when building the cache.
+        use_parquet (bool): Store the cache as Parquet rather than .npy columns.
+    """
+    def __init__(self, source, cache_dir=None, downcast=True, use_parquet=None):
+        """
+        Initializes the ColumnarDataset.
+
+        Parameters:
+            source (str): Path of the CSV file.
+            cache_dir (str): Directory holding the cache; defaults to a .cache
+                directory next to the CSV, or DATASET_CACHE_DIR if set.
+            downcast (bool): Narrow numeric columns when building the cache.
+            use_parquet (bool): Force or disable Parquet; defaults to whether
+                pyarrow is installed.
+        """
+        self.source = os.path.abspath(source)
+        name = os.path.splitext(os.path.basename(self.source))[0]
+        root = cache_dir or os.getenv('DATASET_CACHE_DIR') or os.path.join(os.path.dirname(self.source), '.cache')
+        self.cache_dir = os.path.join(root, name)
+        self.downcast = downcast
+        self.use_parquet = parquet_available() if use_parquet is None else use_parquet
+
+    def _read_manifest(self):
+        try:
+            with open(os.path.join(self.cache_dir, MANIFEST_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def is_fresh(self):
+        """
+        Returns whether the cache exists and was built from the current CSV.
+        """
+        manifest = self._read_manifest()
+        if manifest is None or manifest.get('format') != ('parquet' if self.use_parquet else 'npy'):
+            return False
+        stat = os.stat(self.source)
+        if manifest['size'] == stat.st_size and manifest['mtime_ns'] == stat.st_mtime_ns:
+            return True
+        if manifest['size'] != stat.st_size or manifest['sha256'] != file_sha256(self.source):
+            return False
+        # Touched but unchanged: remember the new modification time
+        manifest['mtime_ns'] = stat.st_mtime_ns
+        write_json_atomic(os.path.join(self.cache_dir, MANIFEST_FILE), manifest)
+        return True
+
+    def build(self):
+        """
+        Parses the CSV and writes the cache, replacing any previous one.
+
+        The cache is written to a directory of its own and renamed into place, so
+        concurrent builds never mix their files and readers never see a partial cache.
+
+        Returns:
+            dict: The manifest of the new cache.
+        """
+        import pandas as pd
+        stat = os.stat(self.source)
+        sha256 = file_sha256(self.source)
+        df = pd.read_csv(self.source)
+        if self.downcast:
+            df = downcast(df)
+        manifest = {
+            'source': self.source,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': sha256,
+            'format': 'parquet' if self.use_parquet else 'npy',
+            'rows': len(df),
+            'columns': list(df.columns),
+            'dtypes': [str(dtype) for dtype in df.dtypes]
+        }
+
+        parent, name = os.path.split(self.cache_dir)
+        os.makedirs(parent, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=f'.{name}.', suffix='.tmp', dir=parent)
+        try:
+            if self.use_parquet:
+                df.to_parquet(os.path.join(staging, 'data.parquet'), index=False)
+            else:
+                for i, column in enumerate(df.columns):
+                    values = df[column].to_numpy()
+                    if values.dtype == object:
+                        # Fixed-width strings can be memory-mapped, unlike object arrays
+                        values = values.astype(str)
+                    np.save(os.path.join(staging, f'{i}.npy'), values)
+            write_json_atomic(os.path.join(staging, MANIFEST_FILE), manifest)
+            self._swap_in(staging)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        logger.info("Cached %s rows of %s as %s", len(df), self.source, manifest['format'])
+        return manifest
+
+    def _swap_in(self, staging):
+        """
+        Renames a finished cache into place, moving the previous one aside first.
+
+        Directories cannot be replaced in one rename, so a reader may briefly find
+        no cache and build one itself. If another build lands first, its cache is
+        kept and staging is left for the caller to remove.
+        """
+        retired = f'{staging}.old'
+        try:
+            os.rename(self.cache_dir, retired)
+        except FileNotFoundError:
+            pass
+        try:
+            os.rename(staging, self.cache_dir)
+        except OSError:
+            if not os.path.isdir(self.cache_dir):
+                raise
+        # Memory-mapped columns of the old cache stay readable after their files are removed
+        shutil.rmtree(retired, ignore_errors=True)
+
+    def load(self, columns=None):
+        """
+        Loads columns from the cache, building or rebuilding it first if needed.
+
+        Parameters:
+            columns (list): Columns to load; all of them if None.
+
+        Returns:
+            DataFrame: The requested columns, in the requested order.
+        """
+        import pandas as pd
+        if not self.is_fresh():
+            self.build()
+        manifest = self._read_manifest()
+        columns = list(columns) if columns is not None else manifest['columns']
+        unknown = [name for name in columns if name not in manifest['columns']]
+        if unknown:
+            raise KeyError(f"Columns not in {self.source}: {unknown}")
+
+        if manifest['format'] == 'parquet':
+            return pd.read_parquet(os.path.join(self.cache_dir, 'data.parquet'), columns=columns)
+        return pd.DataFrame({
+            name: np.load(os.path.join(self.cache_dir, f"{manifest['columns'].index(name)}.npy"), mmap_mode='r')
+            for name in columns
+        }, copy=False)
+
+
+def load_dataset(source, columns=None, cache_dir=None):
+    """
+    Loads columns of a CSV table through its columnar cache.
+
+    Parameters:
+        source (str): Path of the CSV file.
+        columns (list): Columns to load; all of them if None.
+        cache_dir (str): See ColumnarDataset.
+
+    Returns:
+        DataFrame: The requested columns.
+    """
+    return ColumnarDataset(source, cache_dir).load(columns)
@@ -1,58 +1,395 @@
+import asyncio
+import json
 import requests
-import pandas as pd
 import numpy as np
 import logging
 from time import sleep
-import joblib
 import os
 import math
-from sklearn.impute import SimpleImputer
+import re
+import time
+from . import async_http
+from .cache import cache_key, get_cache
+from .circuit_breaker import get_breaker
+from .forest import compiled_forest
+from .metrics import STAGE_SECONDS, STAGE_FAILURES, GRID_LOOKUPS, SITE_FALLBACKS, track_upstream
+from .model_store import MODEL_STORE
+from .scheduler import get_scheduler, parse_retry_after
+from .recommendation_grid import NUTRIENTS
+from .site_index import SITE_FEATURES, SOIL_FEATURES, WEATHER_FEATURES
+from .soil_raster import SOIL_PROPERTIES, DEPTH, to_model_units
 
-#logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Upstream service base URLs, overridable to point the fetchers at local stand-ins
+NOMINATIM_URL = os.getenv('NOMINATIM_URL', 'https://nominatim.openstreetmap.org')
+SOILGRIDS_URL = os.getenv('SOILGRIDS_URL', 'https://rest.isric.org')
+OPENWEATHER_URL = os.getenv('OPENWEATHER_URL', 'http://api.openweathermap.org')
+
+# 'targeted' asks SoilGrids for only the properties, depth and statistic the model
+# uses; 'full' fetches every property at every depth
+SOILGRIDS_QUERY = os.getenv('SOILGRIDS_QUERY', 'full')
+
+# Time a fertilizer recommendation may spend on upstream calls before falling back
+# to nearest-site estimates
+DEADLINE_SECONDS = float(os.getenv('FERTILIZER_DEADLINE_SECONDS', 10))
+
+# Length of the weather time buckets in weather and recommendation cache keys; a
+# cached value is not reused once the weather it was computed with is stale
+WEATHER_BUCKET_SECONDS = float(os.getenv('WEATHER_BUCKET_SECONDS', 3 * 3600))
+
+# Yield quantiles reported when a recommendation asks for intervals
+YIELD_QUANTILES = tuple(float(q) for q in os.getenv('YIELD_QUANTILES', '0.1,0.5,0.9').split(','))
+
+
+def time_left(deadline):
+    """
+    Returns the seconds left until a time.monotonic() deadline, or None without one.
+    """
+    if deadline is None:
+        return None
+    return max(deadline - time.monotonic(), 0.0)
+
+
+def retry_delay(deadline):
+    """
+    Returns the seconds to wait before retrying after an error response: a second,
+    cut short by the deadline, and 0 once no time is left.
+    """
+    return 1.0 if deadline is None else min(1.0, time_left(deadline))
+
+
+def weather_bucket(now=None):
+    """
+    Returns the index of the weather time bucket a time.time() value falls in.
+    """
+    return int((time.time() if now is None else now) // WEATHER_BUCKET_SECONDS)
+
+
+def normalize_area_name(area_name):
+    """
+    Normalizes an area name so that spellings differing only in case, spacing or
+    commas share cache entries.
+    """
+    return re.sub(r'[\s,]+', ' ', area_name).strip().casefold()
+
+
+class UpstreamThrottled(requests.RequestException):
+    """
+    Raised when an upstream's rate limit would hold a call past its deadline.
+    """
+
+
+class UpstreamUnavailable(requests.RequestException):
+    """
+    Raised when an upstream's circuit breaker is open.
+    """
+
+
+def http_get(upstream, url, deadline=None, **kwargs):
+    """
+    Issues a GET request to an upstream service, recording its latency and status.
+
+    The call fails fast while the upstream's circuit breaker is open, and
+    otherwise first waits for the upstream's rate limit if an OutboundScheduler
+    is configured. Failed, slow and 5xx calls count towards opening the breaker.
+    A 429 or 503 response with a Retry-After header pauses the upstream for
+    every worker on the host.
+    
+    Parameters:
+        upstream (str): Name of the upstream service used as the metrics label.
+        url (str): The URL to request.
+        deadline (float): time.monotonic() value after which to give up; the
+            request timeout is set to the time left once the call may proceed.
+    
+    Returns:
+        Response: The response returned by requests.
+
+    Raises:
+        UpstreamUnavailable: If the circuit breaker is open.
+        UpstreamThrottled: If the rate limit would outlast the deadline.
+    """
+    breaker = get_breaker(upstream)
+    if breaker is not None and not breaker.allow():
+        raise UpstreamUnavailable(f"Circuit breaker for {upstream} is open")
+    scheduler = get_scheduler()
+    if scheduler is not None and not scheduler.acquire(upstream, deadline=deadline):
+        if breaker is not None:
+            breaker.cancel()
+        raise UpstreamThrottled(f"Rate limit of {upstream} would outlast the deadline")
+    if deadline is not None:
+        kwargs['timeout'] = time_left(deadline)
+    start = time.monotonic()
+    try:
+        with track_upstream(upstream) as outcome:
+            response = requests.get(url, **kwargs)
+            outcome['status'] = response.status_code
+    except BaseException:
+        if breaker is not None:
+            breaker.record(False)
+        raise
+    record_response(upstream, response, time.monotonic() - start, breaker, scheduler)
+    return response
+
+
+def record_response(upstream, response, duration, breaker, scheduler):
+    """
+    Records an upstream's response on its circuit breaker, and pauses the
+    upstream when a 429 or 503 response asks to retry later.
+    """
+    if breaker is not None:
+        breaker.record(response.status_code < 500, duration)
+    if scheduler is not None and response.status_code in (429, 503):
+        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        if retry_after is None and response.status_code == 429:
+            retry_after = 1.0
+        if retry_after is not None:
+            scheduler.back_off(upstream, retry_after)
+
+
+async def http_get_async(upstream, url, deadline=None, headers=None):
+    """
+    Issues a GET request to an upstream service like http_get, without blocking
+    the event loop.
+
+    Returns:
+        httpx.Response: The response.
+
+    Raises:
+        UpstreamUnavailable: If the circuit breaker is open.
+        UpstreamThrottled: If the rate limit would outlast the deadline.
+    """
+    breaker = get_breaker(upstream)
+    if breaker is not None and not breaker.allow():
+        raise UpstreamUnavailable(f"Circuit breaker for {upstream} is open")
+    scheduler = get_scheduler()
+    allowed = False
+    try:
+        allowed = scheduler is None or await scheduler.acquire_async(upstream, deadline=deadline)
+    finally:
+        if not allowed and breaker is not None:
+            breaker.cancel()
+    if not allowed:
+        raise UpstreamThrottled(f"Rate limit of {upstream} would outlast the deadline")
+    start = time.monotonic()
+    try:
+        with track_upstream(upstream) as outcome:
+            response = await async_http.get(url, headers=headers, timeout=time_left(deadline))
+            outcome['status'] = response.status_code
+    except asyncio.CancelledError:
+        if breaker is not None:
+            breaker.cancel()
+        raise
+    except BaseException:
+        if breaker is not None:
+            breaker.record(False)
+        raise
+    if scheduler is not None and response.status_code in (429, 503):
+        # Backing off writes to the shared rate-limit database
+        await asyncio.to_thread(record_response, upstream, response, time.monotonic() - start, breaker, scheduler)
+    else:
+        record_response(upstream, response, time.monotonic() - start, breaker, scheduler)
+    return response
 
 
 class Geocoder:
     """
     Class responsible for geocoding area names to coordinates using the Nominatim API.
     """
+    HEADERS = {
+        'User-Agent': 'Mozilla/5.0'
+    }
+
     @staticmethod
-    def geocode_area_name(area_name):
+    def geocode_area_name(area_name, deadline=None):
         """
         Converts an area name into geographic coordinates.
         
         Parameters:
             area_name (str): The name of the area to geocode.
+            deadline (float): time.monotonic() value after which to give up.
         
         Returns:
             tuple: A tuple containing the latitude and longitude of the area.
         """
-        api_url = f'https://nominatim.openstreetmap.org/search?q={area_name}&format=json'
-        headers = {
-            'User-Agent': 'Mozilla/5.0'
-        }
-        response = requests.get(api_url, headers=headers)
-        
-        if response.status_code == 200:
-            data = response.json()
-            if data:
-                location = data[0]
-                latitude = float(location['lat'])
-                longitude = float(location['lon'])
-                return latitude, longitude
-            else:
-                logging.error("No location found for the given area name.")
-                return None
-        else:
-            logging.error(f"Error: {response.status_code}")
+        cache = get_cache('geocode')
+        key = cache_key('geocode', normalize_area_name(area_name))
+        cached = cache.get(key)
+        if cached is not None:
+            return tuple(cached)
+        api_url = f'{NOMINATIM_URL}/search?q={area_name}&format=json'
+        if time_left(deadline) == 0:
+            logger.warning("Deadline reached before geocoding.")
             return None
+        try:
+            response = http_get('nominatim', api_url, deadline=deadline, headers=Geocoder.HEADERS)
+        except requests.RequestException as e:
+            logger.error("Geocoding request failed: %s", e)
+            return None
+        coordinates = Geocoder.coordinates_from(response)
+        if coordinates is not None:
+            cache.set(key, coordinates)
+        return coordinates
+
+    @staticmethod
+    async def geocode_area_name_async(area_name, deadline=None):
+        """
+        Converts an area name into geographic coordinates like geocode_area_name,
+        without blocking the event loop.
+        """
+        cache = get_cache('geocode')
+        key = cache_key('geocode', normalize_area_name(area_name))
+        cached = await cache.get_async(key)
+        if cached is not None:
+            return tuple(cached)
+        api_url = f'{NOMINATIM_URL}/search?q={area_name}&format=json'
+        if time_left(deadline) == 0:
+            logger.warning("Deadline reached before geocoding.")
+            return None
+        try:
+            response = await http_get_async('nominatim', api_url, deadline=deadline, headers=Geocoder.HEADERS)
+        except requests.RequestException as e:
+            logger.error("Geocoding request failed: %s", e)
+            return None
+        coordinates = Geocoder.coordinates_from(response)
+        if coordinates is not None:
+            await cache.set_async(key, coordinates)
+        return coordinates
+
+    @staticmethod
+    def coordinates_from(response):
+        """
+        Reads the coordinates of the first match from a Nominatim response.
+
+        Returns:
+            tuple: Latitude and longitude, or None if nothing matched.
+        """
+        if response.status_code != 200:
+            logger.error("Error: %s", response.status_code)
+            return None
+        data = response.json()
+        if not data:
+            logger.error("No location found for the given area name.")
+            return None
+        location = data[0]
+        latitude = float(location['lat'])
+        longitude = float(location['lon'])
+        return latitude, longitude
 
 
 class SoilDataFetcher:
     """
     Class responsible for fetching soil data from the SoilGrids API.
+
+    In targeted mode the pipeline calls fetch_soil_features, which requests only
+    the mean of the model's soil properties at 0-5 cm and parses the response
+    straight into an array, instead of fetch_soil_data.
+
+    Attributes:
+        targeted (bool): Whether the pipeline uses fetch_soil_features.
     """
-    def fetch_soil_data(self, latitude, longitude, radius=0.5, max_attempts=10, step=0.05):
+    STATISTIC = 'mean'
+
+    def __init__(self, targeted=None):
+        self.targeted = SOILGRIDS_QUERY == 'targeted' if targeted is None else targeted
+
+    @staticmethod
+    def soil_offsets(latitude, longitude, radius, max_attempts, step):
+        """
+        Yields the points tried around a location, in the order the fetchers try them.
+        """
+        shifts = np.arange(-radius, radius + step, step)
+        total_attempts = min(max_attempts, len(shifts) * len(shifts))
+        for attempt, (lat_shift, lon_shift) in enumerate((a, b) for a in shifts for b in shifts):
+            if attempt >= total_attempts:
+                return
+            yield latitude + lat_shift, longitude + lon_shift
+
+    @classmethod
+    def parse_soil_features(cls, content):
+        """
+        Parses a targeted SoilGrids response into the model's soil properties.
+
+        Parameters:
+            content (bytes): Body of the response.
+
+        Returns:
+            ndarray: Values in SOIL_PROPERTIES order and SoilGrids mapped units,
+                NaN where missing.
+        """
+        features = np.full(len(SOIL_PROPERTIES), np.nan)
+        for layer in json.loads(content).get('properties', {}).get('layers', []):
+            if layer.get('name') not in SOIL_PROPERTIES:
+                continue
+            for depth in layer.get('depths', []):
+                if depth.get('label') == DEPTH:
+                    value = depth.get('values', {}).get(cls.STATISTIC)
+                    if value is not None:
+                        features[SOIL_PROPERTIES.index(layer['name'])] = value
+        return features
+
+    def fetch_soil_features(self, latitude, longitude, radius=0.5, max_attempts=10, step=0.05, deadline=None):
+        """
+        Fetches the model's soil properties at the first point around the location
+        where SoilGrids has all of them, trying points like fetch_soil_data.
+
+        Returns:
+            ndarray: Values in SOIL_PROPERTIES order and SoilGrids mapped units, or
+                None if no point has them all.
+        """
+        cache = get_cache('soil')
+        key = cache_key('soil', 'features', f'{latitude:.4f}', f'{longitude:.4f}', radius, max_attempts, step)
+        cached = cache.get(key)
+        if cached is not None:
+            return np.array(cached, dtype=float)
+        features = self.fetch_first(self.features_url, self.complete_features, latitude, longitude, radius,
+                                    max_attempts, step, deadline)
+        if features is not None:
+            cache.set(key, features.tolist())
+        return features
+
+    async def fetch_soil_features_async(self, latitude, longitude, radius=0.5, max_attempts=10, step=0.05,
+                                        deadline=None):
+        """
+        Fetches the model's soil properties like fetch_soil_features, without
+        blocking the event loop.
+        """
+        cache = get_cache('soil')
+        key = cache_key('soil', 'features', f'{latitude:.4f}', f'{longitude:.4f}', radius, max_attempts, step)
+        cached = await cache.get_async(key)
+        if cached is not None:
+            return np.array(cached, dtype=float)
+        features = await self.fetch_first_async(self.features_url, self.complete_features, latitude, longitude,
+                                                radius, max_attempts, step, deadline)
+        if features is not None:
+            await cache.set_async(key, features.tolist())
+        return features
+
+    @classmethod
+    def features_url(cls, latitude, longitude):
+        """
+        Returns the URL of a targeted query for the model's soil properties at a point.
+        """
+        query = '&'.join([f'property={name}' for name in SOIL_PROPERTIES]
+                         + [f'depth={DEPTH}', f'value={cls.STATISTIC}'])
+        return f'{SOILGRIDS_URL}/soilgrids/v2.0/properties/query?lon={longitude}&lat={latitude}&{query}'
+
+    def complete_features(self, response, attempt, latitude, longitude):
+        """
+        Parses a targeted response, returning None unless it has all the model's soil properties.
+        """
+        try:
+            features = self.parse_soil_features(response.content)
+        except ValueError as e:
+            logger.error("Invalid soil data response: %s", e)
+            return None
+        if np.isnan(features).any():
+            logger.warning("Incomplete soil data at (%s, %s).", latitude, longitude)
+            return None
+        logger.info("Attempt %s: Coordinates (%s, %s)", attempt, latitude, longitude)
+        return features
+
+    def fetch_soil_data(self, latitude, longitude, radius=0.5, max_attempts=10, step=0.05, deadline=None):
         """
         Attempts to fetch soil data within a radius around specified coordinates.
         
@@ -62,61 +399,172 @@ class SoilDataFetcher:
             radius (float): Radius to vary the latitude and longitude for multiple fetch attempts.
             max_attempts (int): Maximum number of fetch attempts.
             step (float): Step size to increment latitude and longitude in each attempt.
+            deadline (float): time.monotonic() value after which no further attempt is made.
         
         Returns:
             DataFrame: Pandas DataFrame containing soil properties if data is found, else None.
         """
-        attempt = 0
-        
-        lat_shifts = np.arange(-radius, radius + step, step)
-        lon_shifts = np.arange(-radius, radius + step, step)
-        
-        total_attempts = min(max_attempts, len(lat_shifts) * len(lon_shifts))
-        
-        for lat_shift in lat_shifts:
-            for lon_shift in lon_shifts:
-                if attempt >= total_attempts:
-                    break
-                attempt += 1
-                lat_attempt = latitude + lat_shift
-                lon_attempt = longitude + lon_shift
-                
-                api_url = f'https://rest.isric.org/soilgrids/v2.0/properties/query?lon={lon_attempt}&lat={lat_attempt}'
-                response = requests.get(api_url)
-                
-                if response.status_code == 200:
-                    soil_data = response.json()
-                    logging.info(f"Attempt {attempt}: Coordinates ({lat_attempt}, {lon_attempt})")
-                    
-                    properties = soil_data.get('properties', {}).get('layers', [])
-                    if properties:
-                        soil_properties = {}
-                        for layer in properties:
-                            layer_name = layer.get('name', 'unknown')
-                            for depth in layer.get('depths', []):
-                                label = depth.get('label', 'unknown')
-                                values = depth.get('values', {})
-                                for key, value in values.items():
-                                    soil_properties[f"{layer_name}_{label}_{key}"] = value
-                        
-                        df = pd.DataFrame.from_dict(soil_properties, orient='index', columns=['value'])
-                        df = df.T  # Transpose to make sure the columns are as expected
-                        return df
-                    else:
-                        logging.warning("No properties found in the response.")
-                else:
-                    logging.error(f"Error: {response.status_code}")
-                    sleep(1)  # Wait a bit before the next attempt
-
-        logging.error("Max attempts reached, no valid data found.")
+        cache = get_cache('soil')
+        key = cache_key('soil', f'{latitude:.4f}', f'{longitude:.4f}', radius, max_attempts, step)
+        cached = cache.get(key)
+        if cached is not None:
+            return self.soil_frame(cached)
+        soil_properties = self.fetch_first(self.query_url, self.soil_properties_from, latitude, longitude, radius,
+                                           max_attempts, step, deadline)
+        if soil_properties is None:
+            return None
+        cache.set(key, soil_properties)
+        return self.soil_frame(soil_properties)
+
+    async def fetch_soil_data_async(self, latitude, longitude, radius=0.5, max_attempts=10, step=0.05, deadline=None):
+        """
+        Fetches soil data like fetch_soil_data, without blocking the event loop.
+        """
+        cache = get_cache('soil')
+        key = cache_key('soil', f'{latitude:.4f}', f'{longitude:.4f}', radius, max_attempts, step)
+        cached = await cache.get_async(key)
+        if cached is not None:
+            return self.soil_frame(cached)
+        soil_properties = await self.fetch_first_async(self.query_url, self.soil_properties_from, latitude,
+                                                       longitude, radius, max_attempts, step, deadline)
+        if soil_properties is None:
+            return None
+        await cache.set_async(key, soil_properties)
+        return self.soil_frame(soil_properties)
+
+    @staticmethod
+    def query_url(latitude, longitude):
+        """
+        Returns the URL of a query for every soil property at a point.
+        """
+        return f'{SOILGRIDS_URL}/soilgrids/v2.0/properties/query?lon={longitude}&lat={latitude}'
+
+    def soil_properties_from(self, response, attempt, latitude, longitude):
+        """
+        Flattens a full response, returning None if it has no properties.
+        """
+        logger.info("Attempt %s: Coordinates (%s, %s)", attempt, latitude, longitude)
+        soil_properties = self.flatten_soil_properties(response.json())
+        if not soil_properties:
+            logger.warning("No properties found in the response.")
+            return None
+        return soil_properties
+
+    def attempts(self, latitude, longitude, radius, max_attempts, step, deadline):
+        """
+        Yields the number and point of every attempt around a location, stopping
+        once the deadline has passed.
+        """
+        for attempt, (lat_attempt, lon_attempt) in enumerate(
+                self.soil_offsets(latitude, longitude, radius, max_attempts, step), 1):
+            if time_left(deadline) == 0:
+                logger.warning("Deadline reached after %s soil data attempts.", attempt - 1)
+                return
+            yield attempt, lat_attempt, lon_attempt
+        logger.error("Max attempts reached, no valid data found.")
+
+    @staticmethod
+    def read_response(response, parse, attempt, latitude, longitude, deadline):
+        """
+        Handles the response to one attempt, for the sync and async fetchers alike.
+
+        Parameters:
+            response (Response): The SoilGrids response.
+            parse (callable): Reads the soil data from a 200 response, given it, the
+                attempt number and the point; returns None if the data is lacking.
+            deadline (float): time.monotonic() value after which to give up.
+
+        Returns:
+            tuple: The soil data, or None, and the seconds to wait before the next
+                attempt, which are 0 unless an error response came back and no
+                scheduler paces the attempts.
+        """
+        if response.status_code == 200:
+            return parse(response, attempt, latitude, longitude), 0
+        logger.error("Error: %s", response.status_code)
+        return None, retry_delay(deadline) if get_scheduler() is None else 0
+
+    def fetch_first(self, url, parse, latitude, longitude, radius, max_attempts, step, deadline):
+        """
+        Queries SoilGrids at the points around a location in turn until a response
+        has the soil data.
+
+        Parameters:
+            url (callable): Returns the URL of the query at a point.
+            parse (callable): See read_response.
+
+        Returns:
+            The soil data read by parse, or None if no point tried has it.
+        """
+        for attempt, lat_attempt, lon_attempt in self.attempts(latitude, longitude, radius, max_attempts, step,
+                                                               deadline):
+            try:
+                response = http_get('soilgrids', url(lat_attempt, lon_attempt), deadline=deadline)
+            except UpstreamUnavailable as e:
+                logger.warning("Skipping soil data: %s", e)
+                return None
+            except requests.RequestException as e:
+                logger.error("Soil data request failed: %s", e)
+                continue
+            result, wait = self.read_response(response, parse, attempt, lat_attempt, lon_attempt, deadline)
+            if result is not None:
+                return result
+            if wait:
+                sleep(wait)
+        return None
+
+    async def fetch_first_async(self, url, parse, latitude, longitude, radius, max_attempts, step, deadline):
+        """
+        Queries SoilGrids like fetch_first, without blocking the event loop.
+        """
+        for attempt, lat_attempt, lon_attempt in self.attempts(latitude, longitude, radius, max_attempts, step,
+                                                               deadline):
+            try:
+                response = await http_get_async('soilgrids', url(lat_attempt, lon_attempt), deadline=deadline)
+            except UpstreamUnavailable as e:
+                logger.warning("Skipping soil data: %s", e)
+                return None
+            except requests.RequestException as e:
+                logger.error("Soil data request failed: %s", e)
+                continue
+            result, wait = self.read_response(response, parse, attempt, lat_attempt, lon_attempt, deadline)
+            if result is not None:
+                return result
+            if wait:
+                await asyncio.sleep(wait)
         return None
 
+    @staticmethod
+    def flatten_soil_properties(soil_data):
+        """
+        Flattens a SoilGrids response into values keyed by '<property>_<depth>_<statistic>'.
+        """
+        soil_properties = {}
+        for layer in soil_data.get('properties', {}).get('layers', []):
+            layer_name = layer.get('name', 'unknown')
+            for depth in layer.get('depths', []):
+                label = depth.get('label', 'unknown')
+                for name, value in depth.get('values', {}).items():
+                    soil_properties[f"{layer_name}_{label}_{name}"] = value
+        return soil_properties
+
+    @staticmethod
+    def soil_frame(soil_properties):
+        """
+        Converts soil properties keyed by '<property>_<depth>_<statistic>' into a
+        one-row DataFrame.
+        """
+        import pandas as pd
+        df = pd.DataFrame.from_dict(soil_properties, orient='index', columns=['value'])
+        df = df.T  # Transpose to make sure the columns are as expected
+        return df
+
 
 class WeatherDataFetcher:
     """
     Class responsible for fetching weather data from the OpenWeatherMap API.
     """
-    def fetch_weather_data(self, latitude, longitude, api_key):
+    def fetch_weather_data(self, latitude, longitude, api_key, deadline=None):
         """
         Fetches current weather data for specified coordinates.
         
@@ -124,17 +572,64 @@ class WeatherDataFetcher:
             latitude (float): Latitude of the location.
             longitude (float): Longitude of the location.
             api_key (str): API key for accessing OpenWeatherMap API.
+            deadline (float): time.monotonic() value after which to give up.
         
         Returns:
             dict: Dictionary containing weather conditions such as temperature and humidity.
         """
-        api_url = f'http://api.openweathermap.org/data/3.0/onecall?lat={latitude}&lon={longitude}&appid={api_key}&units=metric'
-        response = requests.get(api_url)
-        
+        cache = get_cache('weather')
+        key = cache_key('weather', f'{latitude:.2f}', f'{longitude:.2f}', weather_bucket())
+        cached = cache.get(key)
+        if cached is not None:
+            return dict(cached)
+        if time_left(deadline) == 0:
+            logger.warning("Deadline reached before fetching weather data.")
+            return None
+        api_url = f'{OPENWEATHER_URL}/data/3.0/onecall?lat={latitude}&lon={longitude}&appid={api_key}&units=metric'
+        try:
+            response = http_get('openweather', api_url, deadline=deadline)
+        except requests.RequestException as e:
+            logger.error("Weather data request failed: %s", e)
+            return None
+        weather = self.weather_from(response)
+        if weather is not None:
+            cache.set(key, dict(weather))
+        return weather
+
+    async def fetch_weather_data_async(self, latitude, longitude, api_key, deadline=None):
+        """
+        Fetches current weather data like fetch_weather_data, without blocking the event loop.
+        """
+        cache = get_cache('weather')
+        key = cache_key('weather', f'{latitude:.2f}', f'{longitude:.2f}', weather_bucket())
+        cached = await cache.get_async(key)
+        if cached is not None:
+            return dict(cached)
+        if time_left(deadline) == 0:
+            logger.warning("Deadline reached before fetching weather data.")
+            return None
+        api_url = f'{OPENWEATHER_URL}/data/3.0/onecall?lat={latitude}&lon={longitude}&appid={api_key}&units=metric'
+        try:
+            response = await http_get_async('openweather', api_url, deadline=deadline)
+        except requests.RequestException as e:
+            logger.error("Weather data request failed: %s", e)
+            return None
+        weather = self.weather_from(response)
+        if weather is not None:
+            await cache.set_async(key, dict(weather))
+        return weather
+
+    @staticmethod
+    def weather_from(response):
+        """
+        Reads the model's weather features from a One Call response.
+
+        Returns:
+            dict: Weather features, or None if the call failed.
+        """
         if response.status_code == 200:
             weather_data = response.json()
-            logging.info("API key works. Here is the data:")
-            logging.info(weather_data)
+            logger.debug("API key works. Here is the data: %s", weather_data)
             
             current = weather_data.get('current', {})
             temp = current.get('temp')
@@ -146,16 +641,17 @@ class WeatherDataFetcher:
             if rain < 10:
                 rain = 1112  # Use average value
 
-            return {
+            weather = {
                 'TEMP': temp,
                 'HUMI': humidity,
                 'RAIN': rain,
                 'SUNH': sunh
             }
+            return weather
         elif response.status_code == 401:
-            logging.error("Authentication error: Please check your API key.")
+            logger.error("Authentication error: Please check your API key.")
         else:
-            logging.error(f"Error: {response.status_code}")
+            logger.error("Error: %s", response.status_code)
         return None
 
 
@@ -167,20 +663,23 @@ class DataPreparer:
     def prepare_data_for_model(soil_df, weather_data):
         """
         Prepare and clean data to be used as input for the fertilizer recommendation model.
+
+        The soil properties, from the SoilGrids API or the offline soil rasters, are
+        in SoilGrids mapped units and are converted into model units.
         """
-        relevant_columns = {
-            'phh2o_0-5cm_mean': 'PHAQ',
-            'soc_0-5cm_mean': 'TOTC',
-            'nitrogen_0-5cm_mean': 'TOTN',
-            'cec_0-5cm_mean': 'CECS'
-        }
+        # pandas and scikit-learn are imported on first use to keep module import cheap
+        import pandas as pd
+        from sklearn.impute import SimpleImputer
+
+        relevant_columns = {f'{prop}_{DEPTH}_mean': name for prop, name in zip(SOIL_PROPERTIES, SOIL_FEATURES)}
         
         missing_columns = [col for col in relevant_columns.keys() if col not in soil_df.columns]
         if missing_columns:
-            logging.error(f"Missing columns in the fetched data: {missing_columns}")
+            logger.error("Missing columns in the fetched data: %s", missing_columns)
             return None
         
-        prepared_df = soil_df[relevant_columns.keys()].rename(columns=relevant_columns)
+        soil_values = soil_df[list(relevant_columns)].to_numpy(dtype=float)
+        prepared_df = pd.DataFrame(to_model_units(soil_values), columns=SOIL_FEATURES)
         
         for key, value in weather_data.items():
             prepared_df[key] = value
@@ -195,11 +694,52 @@ class DataPreparer:
         
         return prepared_df
 
+    @staticmethod
+    def soil_features(soil_values):
+        """
+        Converts soil properties from fetch_soil_features into model features.
+
+        Parameters:
+            soil_values (ndarray): Values in SOIL_PROPERTIES order and SoilGrids mapped units.
+
+        Returns:
+            dict: Value of every soil feature in model units.
+        """
+        return dict(zip(SOIL_FEATURES, to_model_units(soil_values).tolist()))
+
+    @staticmethod
+    def prepare_from_features(features):
+        """
+        Builds model input from feature values in model units, such as
+        nearest-site estimates or the output of soil_features.
+
+        Parameters:
+            features (dict): Value of every model feature.
+
+        Returns:
+            DataFrame: Single-row model input in training column order.
+        """
+        import pandas as pd
+        return pd.DataFrame([[float(features[name]) for name in SITE_FEATURES]], columns=SITE_FEATURES)
+
 
 class FertilizerCalculator:
     """
     Class responsible for calculating fertilizer requirements.
     """
+    # Coefficients for N, P2O5, and K2O per 100 kg of yield
+    NUTRIENT_COEFFICIENTS = np.array([1.0, 0.5, 0.2])
+
+    # Fertilizer products, the nutrient each one is sized for and its content of it
+    # (DAP also supplies 18% N, which is not credited against the Urea bags)
+    FERTILIZERS = {
+        'Urea (25kg bags)': ('N', 0.46),
+        'DAP (25kg bags)': ('P2O5', 0.46),
+        'MOP (25kg bags)': ('K2O', 0.60)
+    }
+    BAG_KG = 25
+    HECTARES_PER_ACRE = 0.404686
+
     @staticmethod
     def calculate_fertilizer_requirements(yield_prediction, nutrient_coefficients, farm_size_ha):
         """
@@ -207,101 +747,431 @@ class FertilizerCalculator:
         """
         nutrient_requirements_per_ha = yield_prediction * nutrient_coefficients / 100
         nutrient_requirements_total = nutrient_requirements_per_ha * farm_size_ha
-        logging.info(f"Nutrient requirements per ha: {nutrient_requirements_per_ha}")
-        logging.info(f"Total nutrient requirements: {nutrient_requirements_total}")
+        logger.debug("Nutrient requirements per ha: %s", nutrient_requirements_per_ha)
+        logger.debug("Total nutrient requirements: %s", nutrient_requirements_total)
         return nutrient_requirements_total
 
-    def predict_fertilizer_requirements(self, prepared_df, crop_type, farm_size_acres):
-        # Convert farm size from acres to hectares
-        farm_size_ha = farm_size_acres * 0.404686
-        
-        base_path = os.path.dirname(__file__)  
-        model_path = os.path.join(base_path, '..', 'training')
+    def predict_requirements_per_ha(self, prepared_df, crop_type):
+        """
+        Predicts the N, P2O5 and K2O requirements per hectare for every row of model input.
 
+        Parameters:
+            prepared_df (DataFrame): Model input as returned by DataPreparer.
+            crop_type (str): One of 'maize', 'cassava' or 'beans'.
 
-        if crop_type.lower() == 'maize':
-            model = joblib.load(os.path.join(model_path, 'model_maize.joblib'))
-        elif crop_type.lower() == 'cassava':
-            model = joblib.load(os.path.join(model_path, 'model_cassava.joblib'))
-        elif crop_type.lower() == 'beans':
-            model = joblib.load(os.path.join(model_path, 'model_beans.joblib'))
-        else:
-            logging.error("Invalid crop type. Please choose from 'maize', 'cassava', or 'beans'.")
+        Returns:
+            ndarray: Requirements in kg/ha of shape (rows, 3), or None for an unknown crop.
+        """
+        with STAGE_SECONDS.time(stage='model_load'):
+            model = MODEL_STORE.get_crop_model(crop_type)
+        if model is None:
+            logger.error("Invalid crop type. Please choose from 'maize', 'cassava', or 'beans'.")
             return None
-        
-        yield_prediction = model.predict(prepared_df)
-        logging.info(f"Predicted yield: {yield_prediction[0]} kg/ha")
-        
-        nutrient_coefficients = np.array([1.0, 0.5, 0.2])  # Coefficients for N, P2O5, and K2O per 100 kg of yield
 
-        # Calculate nutrient requirements based on predicted yield
-        nutrient_requirements = self.calculate_fertilizer_requirements(yield_prediction[0], nutrient_coefficients, farm_size_ha)
-        
-        # Fertilizer products and their nutrient contents
-        fertilizers = {
-            'Urea (25kg bags)': {'N': 0.46},
-            'DAP (25kg bags)': {'N': 0.18, 'P2O5': 0.46},
-            'MOP (25kg bags)': {'K2O': 0.60}
-        }
-        
-        fertilizer_bags = {
-            'Urea (25kg bags)': 0,
-            'DAP (25kg bags)': 0,
-            'MOP (25kg bags)': 0
-        }
-
-        # Calculate the number of bags required for each fertilizer
-        # Calculate nitrogen from Urea
-        fertilizer_bags['Urea (25kg bags)'] = math.ceil(nutrient_requirements[0] / fertilizers['Urea (25kg bags)']['N'] / 25)
-        # Calculate phosphorus from DAP
-        fertilizer_bags['DAP (25kg bags)'] = math.ceil(nutrient_requirements[1] / fertilizers['DAP (25kg bags)']['P2O5'] / 25)
-        # Calculate potassium from MOP
-        fertilizer_bags['MOP (25kg bags)'] = math.ceil(nutrient_requirements[2] / fertilizers['MOP (25kg bags)']['K2O'] / 25)
+        with STAGE_SECONDS.time(stage='predict'):
+            yield_prediction = model.predict(prepared_df)
+        logger.info("Predicted yield: %s kg/ha", yield_prediction[0] if len(yield_prediction) == 1 else yield_prediction)
+        return self.calculate_fertilizer_requirements(yield_prediction[:, None], self.NUTRIENT_COEFFICIENTS, 1.0)
+
+    def predict_with_intervals(self, prepared_df, crop_type, quantiles=YIELD_QUANTILES):
+        """
+        Predicts the N, P2O5 and K2O requirements per hectare together with
+        quantiles of the predicted yield over the trees of the crop model.
 
+        All trees are walked in one vectorized pass, which also gives the point
+        prediction, so the quantiles cost little beyond predict_requirements_per_ha.
+
+        Parameters:
+            prepared_df (DataFrame): Model input as returned by DataPreparer.
+            crop_type (str): One of 'maize', 'cassava' or 'beans'.
+            quantiles (sequence): Quantiles to compute, between 0 and 1.
+
+        Returns:
+            tuple: Requirements in kg/ha of shape (rows, 3) and yield quantiles in
+                kg/ha of shape (rows, quantiles), the latter None if the model is
+                not a forest; or None for an unknown crop.
+        """
+        with STAGE_SECONDS.time(stage='model_load'):
+            model = MODEL_STORE.get_crop_model(crop_type)
+        if model is None:
+            logger.error("Invalid crop type. Please choose from 'maize', 'cassava', or 'beans'.")
+            return None
+
+        forest = compiled_forest(model)
+        with STAGE_SECONDS.time(stage='predict'):
+            if forest is None:
+                yield_prediction, yield_quantiles = model.predict(prepared_df), None
+            else:
+                yield_prediction, yield_quantiles = forest.predict_quantiles(prepared_df, quantiles)
+        logger.info("Predicted yield: %s kg/ha", yield_prediction[0] if len(yield_prediction) == 1 else yield_prediction)
+        requirements_per_ha = self.calculate_fertilizer_requirements(yield_prediction[:, None], self.NUTRIENT_COEFFICIENTS, 1.0)
+        return requirements_per_ha, yield_quantiles
+
+    @classmethod
+    def bag_ranges(cls, yield_quantiles, farm_size_acres):
+        """
+        Converts the lowest and highest yield quantiles into the fewest and most
+        bags of each fertilizer product.
+
+        Parameters:
+            yield_quantiles (sequence): Yield quantiles in kg/ha, in increasing order.
+            farm_size_acres (float): Size of the farm in acres.
+
+        Returns:
+            dict: Product to {'min': bags, 'max': bags}.
+        """
+        low, high = (cls.fertilizer_bags(yield_quantiles[i] * cls.NUTRIENT_COEFFICIENTS / 100, farm_size_acres)
+                     for i in (0, -1))
+        return {product: {'min': low[product], 'max': high[product]} for product in cls.FERTILIZERS}
+
+    @classmethod
+    def fertilizer_bags(cls, requirements_per_ha, farm_size_acres):
+        """
+        Converts per-hectare nutrient requirements into bags of fertilizer for a farm.
+
+        Parameters:
+            requirements_per_ha (ndarray): N, P2O5 and K2O requirements in kg/ha.
+            farm_size_acres (float): Size of the farm in acres.
+
+        Returns:
+            dict: Number of bags of each fertilizer product.
+        """
+        farm_size_ha = farm_size_acres * cls.HECTARES_PER_ACRE
+        nutrient_requirements = np.asarray(requirements_per_ha) * farm_size_ha
+        fertilizer_bags = {}
+        for product, (nutrient, content) in cls.FERTILIZERS.items():
+            required = nutrient_requirements[NUTRIENTS.index(nutrient)]
+            fertilizer_bags[product] = math.ceil(required / content / cls.BAG_KG)
         return fertilizer_bags
 
+    def predict_fertilizer_requirements(self, prepared_df, crop_type, farm_size_acres):
+        requirements_per_ha = self.predict_requirements_per_ha(prepared_df, crop_type)
+        if requirements_per_ha is None:
+            return None
+        return self.fertilizer_bags(requirements_per_ha[0], farm_size_acres)
+
 
 class FertilizerPredictor:
     """
         Class to predict the fertilizer requirements for a specific 
-        crop type and farm size."""
-    def __init__(self, area_name, api_key, crop_type, farm_size_acres):
+        crop type and farm size.
+
+        Locations covered by the precomputed recommendation grid are answered
+        from its nearest grid point; everywhere else runs the live pipeline.
+        Soil data comes from the given soil_fetcher, else from the offline soil
+        rasters if SOIL_RASTER_DIR is set, else from the SoilGrids API. Soil or
+        weather data that cannot be fetched before the deadline is estimated
+        from the nearest measured sites."""
+    def __init__(self, area_name, api_key, crop_type, farm_size_acres, soil_fetcher=None, deadline_seconds=None):
         self.area_name = area_name
         self.api_key = api_key
         self.crop_type = crop_type
         self.farm_size_acres = farm_size_acres
+        self.soil_fetcher = soil_fetcher
+        self.deadline_seconds = DEADLINE_SECONDS if deadline_seconds is None else deadline_seconds
+
+    def lookup_recommendation_grid(self, latitude, longitude):
+        """
+        Looks up the precomputed per-hectare requirements for a location.
+
+        Returns:
+            ndarray: N, P2O5 and K2O requirements in kg/ha, or None if there is no
+                grid or it does not cover the location and crop.
+        """
+        grid = MODEL_STORE.get_recommendation_grid()
+        if grid is None:
+            return None
+        requirements_per_ha = grid.lookup(latitude, longitude, self.crop_type)
+        GRID_LOOKUPS.inc(result='miss' if requirements_per_ha is None else 'hit')
+        return requirements_per_ha
+
+    @staticmethod
+    def estimate_from_sites(latitude, longitude):
+        """
+        Estimates the model features at a location from the nearest measured sites.
+
+        Returns:
+            dict: Estimated value of every model feature, or None if no site is close enough.
+        """
+        site_index = MODEL_STORE.get_site_index()
+        if site_index is None:
+            return None
+        return site_index.estimate(latitude, longitude)
+
+    def recommendation_key(self, now=None, intervals=False):
+        """
+        Returns the recommendation cache key: the normalized area, the crop and the
+        current weather time bucket. The farm size is left out, since the cache
+        holds per-hectare requirements. Entries with yield quantiles have keys of their own.
+        """
+        parts = [normalize_area_name(self.area_name), self.crop_type.casefold(), weather_bucket(now)]
+        if intervals:
+            parts.append('intervals')
+        return cache_key('recommendation', *parts)
+
+    def run(self, intervals=False):
+        """
+        Recommends fertilizer bags for the farm, reusing the per-hectare
+        requirements cached for the same area, crop and weather time bucket.
+
+        Parameters:
+            intervals (bool): Also report the yield quantiles, under
+                'yield_quantiles' keyed like 'p10', and the fewest and most bags
+                of each product they imply, under 'bag_ranges'. Both are None when
+                the requirements come from the recommendation grid.
+
+        Returns:
+            dict: Number of bags of each fertilizer product, or None on failure.
+        """
+        cache = get_cache('recommendation')
+        key = self.recommendation_key(intervals=intervals)
+        cached = cache.get(key)
+        if cached is None:
+            if intervals:
+                requirements_per_ha, yield_quantiles, cacheable = self.estimate_per_ha(YIELD_QUANTILES)
+                cached = {'requirements': requirements_per_ha, 'yield_quantiles': yield_quantiles}
+            else:
+                requirements_per_ha, cacheable = self.requirements_per_ha()
+                cached = requirements_per_ha
+            if requirements_per_ha is None:
+                return None
+            if cacheable:
+                cache.set(key, cached)
+        else:
+            logger.info("Using cached per-hectare requirements for %s", key)
+        return self.recommendation(cached, intervals)
+
+    async def run_async(self, intervals=False):
+        """
+        Recommends fertilizer bags like run, awaiting the upstream calls on the
+        event loop and predicting in a worker thread.
+
+        Returns:
+            dict: Number of bags of each fertilizer product, or None on failure.
+        """
+        cache = get_cache('recommendation')
+        key = self.recommendation_key(intervals=intervals)
+        cached = await cache.get_async(key)
+        if cached is None:
+            requirements_per_ha, yield_quantiles, cacheable = await self.estimate_per_ha_async(
+                YIELD_QUANTILES if intervals else None)
+            if requirements_per_ha is None:
+                return None
+            if intervals:
+                cached = {'requirements': requirements_per_ha, 'yield_quantiles': yield_quantiles}
+            else:
+                cached = requirements_per_ha
+            if cacheable:
+                await cache.set_async(key, cached)
+        else:
+            logger.info("Using cached per-hectare requirements for %s", key)
+        return self.recommendation(cached, intervals)
+
+    def recommendation(self, cached, intervals):
+        """
+        Converts per-hectare requirements, as held by the recommendation cache,
+        into the recommendation for the farm.
+        """
+        requirements_per_ha = cached['requirements'] if intervals else cached
+        fertilizer_requirement = FertilizerCalculator.fertilizer_bags(requirements_per_ha, self.farm_size_acres)
+        logger.info("Fertilizer requirement for %s acres of %s: %s", self.farm_size_acres, self.crop_type, fertilizer_requirement)
+        if intervals:
+            yield_quantiles = cached['yield_quantiles']
+            if yield_quantiles is None:
+                fertilizer_requirement.update(yield_quantiles=None, bag_ranges=None)
+            else:
+                fertilizer_requirement['yield_quantiles'] = {
+                    f'p{q * 100:g}': round(value, 1) for q, value in zip(YIELD_QUANTILES, yield_quantiles)}
+                fertilizer_requirement['bag_ranges'] = FertilizerCalculator.bag_ranges(
+                    np.asarray(yield_quantiles), self.farm_size_acres)
+        return fertilizer_requirement
+
+    def requirements_per_ha(self):
+        """
+        Computes the per-hectare nutrient requirements from the recommendation grid
+        or the live pipeline.
+
+        Returns:
+            tuple: N, P2O5 and K2O requirements in kg/ha, or None on failure, and
+                whether they may be cached, which is not the case when soil or
+                weather data were estimated from the nearest sites.
+        """
+        requirements_per_ha, _, cacheable = self.estimate_per_ha()
+        return requirements_per_ha, cacheable
+
+    def estimate_per_ha(self, quantiles=None):
+        """
+        Computes the per-hectare nutrient requirements like requirements_per_ha,
+        and the requested quantiles of the predicted yield.
+
+        Parameters:
+            quantiles (sequence): Yield quantiles to compute, or None for none.
+
+        Returns:
+            tuple: N, P2O5 and K2O requirements in kg/ha, or None on failure; the
+                yield quantiles in kg/ha, or None if not requested or not
+                available; and whether the results may be cached.
+        """
+        soil_fetcher = self.soil_fetcher or MODEL_STORE.get_soil_rasters() or SoilDataFetcher()
+        deadline = time.monotonic() + self.deadline_seconds
+
+        with STAGE_SECONDS.time(stage='geocode'):
+            coordinates = Geocoder().geocode_area_name(self.area_name, deadline=deadline)
+        if not coordinates:
+            return self.failed('geocode', "Failed to fetch coordinates for the area.")
+        latitude, longitude = coordinates
+        grid_answer = self.grid_answer(latitude, longitude)
+        if grid_answer is not None:
+            return grid_answer, None, True
 
-    def run(self):
-        geocoder = Geocoder()
-        soil_fetcher = SoilDataFetcher()
-        weather_fetcher = WeatherDataFetcher()
+        soil_df = soil_features = None
+        with STAGE_SECONDS.time(stage='soil'):
+            if getattr(soil_fetcher, 'targeted', False):
+                soil_features = soil_fetcher.fetch_soil_features(latitude, longitude, deadline=deadline)
+            else:
+                soil_df = soil_fetcher.fetch_soil_data(latitude, longitude, deadline=deadline)
+        soil_df, soil_features, site_estimate = self.with_soil_fallback(soil_df, soil_features, latitude, longitude)
+        if soil_df is None and soil_features is None:
+            return self.failed(None, "Failed to fetch soil data.")
+
+        with STAGE_SECONDS.time(stage='weather'):
+            weather_data = WeatherDataFetcher().fetch_weather_data(latitude, longitude, self.api_key, deadline=deadline)
+        weather_data, site_estimate = self.with_weather_fallback(weather_data, site_estimate, latitude, longitude)
+        if weather_data is None:
+            return self.failed(None, "Failed to fetch weather data.")
+        return self.predict_per_ha(soil_df, soil_features, weather_data, site_estimate, quantiles)
+
+    async def estimate_per_ha_async(self, quantiles=None):
+        """
+        Computes the per-hectare nutrient requirements like estimate_per_ha,
+        without blocking the event loop. Soil fetchers without async methods,
+        such as the offline soil rasters, and the prediction run in worker threads.
+        """
+        soil_fetcher = self.soil_fetcher or MODEL_STORE.get_soil_rasters() or SoilDataFetcher()
+        deadline = time.monotonic() + self.deadline_seconds
+
+        with STAGE_SECONDS.time(stage='geocode'):
+            coordinates = await Geocoder().geocode_area_name_async(self.area_name, deadline=deadline)
+        if not coordinates:
+            return self.failed('geocode', "Failed to fetch coordinates for the area.")
+        latitude, longitude = coordinates
+        grid_answer = self.grid_answer(latitude, longitude)
+        if grid_answer is not None:
+            return grid_answer, None, True
+
+        soil_df = soil_features = None
+        with STAGE_SECONDS.time(stage='soil'):
+            if getattr(soil_fetcher, 'targeted', False):
+                soil_features = await soil_fetcher.fetch_soil_features_async(latitude, longitude, deadline=deadline)
+            elif hasattr(soil_fetcher, 'fetch_soil_data_async'):
+                soil_df = await soil_fetcher.fetch_soil_data_async(latitude, longitude, deadline=deadline)
+            else:
+                soil_df = await asyncio.to_thread(soil_fetcher.fetch_soil_data, latitude, longitude, deadline=deadline)
+        soil_df, soil_features, site_estimate = self.with_soil_fallback(soil_df, soil_features, latitude, longitude)
+        if soil_df is None and soil_features is None:
+            return self.failed(None, "Failed to fetch soil data.")
+
+        with STAGE_SECONDS.time(stage='weather'):
+            weather_data = await WeatherDataFetcher().fetch_weather_data_async(
+                latitude, longitude, self.api_key, deadline=deadline)
+        weather_data, site_estimate = self.with_weather_fallback(weather_data, site_estimate, latitude, longitude)
+        if weather_data is None:
+            return self.failed(None, "Failed to fetch weather data.")
+        return await asyncio.to_thread(self.predict_per_ha, soil_df, soil_features, weather_data, site_estimate,
+                                       quantiles)
+
+    @staticmethod
+    def failed(stage, message):
+        """
+        Counts a failed stage, logs why and returns the result of a failed estimate.
+        """
+        if stage is not None:
+            STAGE_FAILURES.inc(stage=stage)
+        if message is not None:
+            logger.error(message)
+        return None, None, False
+
+    def grid_answer(self, latitude, longitude):
+        """
+        Returns the per-hectare requirements from the recommendation grid, or None
+        if the grid does not cover the location.
+        """
+        logger.info("Coordinates for %s: Latitude = %s, Longitude = %s", self.area_name, latitude, longitude)
+        with STAGE_SECONDS.time(stage='grid'):
+            requirements_per_ha = self.lookup_recommendation_grid(latitude, longitude)
+        if requirements_per_ha is None:
+            return None
+        logger.info("Using the recommendation grid for %s", self.area_name)
+        return tuple(float(value) for value in requirements_per_ha)
+
+    def with_soil_fallback(self, soil_df, soil_values, latitude, longitude):
+        """
+        Falls back to nearest-site estimates when no soil data was fetched.
+
+        Parameters:
+            soil_df (DataFrame): Soil data from fetch_soil_data, or None.
+            soil_values (ndarray): Soil properties from fetch_soil_features, or None.
+
+        Returns:
+            tuple: The soil DataFrame, or None; the soil features by name in model
+                units, or None; and the site estimate used, or None. Both soil
+                values are None if there is no estimate either.
+        """
+        soil_features = None if soil_values is None else DataPreparer.soil_features(soil_values)
+        if soil_df is not None or soil_features is not None:
+            logger.debug("Fetched soil data:\n%s", soil_df if soil_df is not None else soil_features)
+            return soil_df, soil_features, None
+        STAGE_FAILURES.inc(stage='soil')
+        site_estimate = self.estimate_from_sites(latitude, longitude)
+        if site_estimate is None:
+            return None, None, None
+        SITE_FALLBACKS.inc(data='soil')
+        logger.warning("Failed to fetch soil data; using nearest-site estimates.")
+        return None, {name: site_estimate[name] for name in SOIL_FEATURES}, site_estimate
+
+    def with_weather_fallback(self, weather_data, site_estimate, latitude, longitude):
+        """
+        Falls back to nearest-site estimates when no weather data was fetched.
+
+        Returns:
+            tuple: The weather features, or None if there is no estimate either,
+                and the site estimate used, or None.
+        """
+        if weather_data:
+            return weather_data, site_estimate
+        STAGE_FAILURES.inc(stage='weather')
+        site_estimate = site_estimate or self.estimate_from_sites(latitude, longitude)
+        if site_estimate is None:
+            return None, None
+        SITE_FALLBACKS.inc(data='weather')
+        logger.warning("Failed to fetch weather data; using nearest-site estimates.")
+        return {name: site_estimate[name] for name in WEATHER_FEATURES}, site_estimate
+
+    def predict_per_ha(self, soil_df, soil_features, weather_data, site_estimate, quantiles=None):
+        """
+        Prepares the model input and predicts the per-hectare requirements.
+
+        Returns:
+            tuple: Like estimate_per_ha.
+        """
         data_preparer = DataPreparer()
         fertilizer_calculator = FertilizerCalculator()
-
-        coordinates = geocoder.geocode_area_name(self.area_name)
-        
-        if coordinates:
-            latitude, longitude = coordinates
-            logging.info(f"Coordinates for {self.area_name}: Latitude = {latitude}, Longitude = {longitude}")
-            soil_df = soil_fetcher.fetch_soil_data(latitude, longitude)
+        with STAGE_SECONDS.time(stage='prepare'):
             if soil_df is not None:
-                logging.info(f"Fetched soil data:\n{soil_df}")
-                weather_data = weather_fetcher.fetch_weather_data(latitude, longitude, self.api_key)
-                
-                if weather_data:
-                    prepared_df = data_preparer.prepare_data_for_model(soil_df, weather_data)
-                    
-                    if prepared_df is not None:
-                        fertilizer_requirement = fertilizer_calculator.predict_fertilizer_requirements(prepared_df, self.crop_type, self.farm_size_acres)
-                        if fertilizer_requirement is not None:
-                            logging.info(f"Fertilizer requirement for {self.farm_size_acres} acres of {self.crop_type}: {fertilizer_requirement}")
-                    else:
-                        logging.error("Failed to prepare data for the model.")
-                else:            
-                    logging.error("Failed to fetch weather data.")
+                prepared_df = data_preparer.prepare_data_for_model(soil_df, weather_data)
             else:
-                logging.error("Failed to fetch soil data.")
-        else:
-            logging.error("Failed to fetch coordinates for the area.")
+                prepared_df = data_preparer.prepare_from_features(dict(soil_features, **weather_data))
+        if prepared_df is None:
+            return self.failed('prepare', "Failed to prepare data for the model.")
 
-        return fertilizer_requirement
\ No newline at end of file
+        yield_quantiles = None
+        if quantiles is None:
+            requirements_per_ha = fertilizer_calculator.predict_requirements_per_ha(prepared_df, self.crop_type)
+        else:
+            prediction = fertilizer_calculator.predict_with_intervals(prepared_df, self.crop_type, quantiles)
+            requirements_per_ha, yield_quantiles = prediction if prediction is not None else (None, None)
+        if requirements_per_ha is None:
+            return self.failed('predict', None)
+        if yield_quantiles is not None:
+            yield_quantiles = tuple(float(value) for value in yield_quantiles[0])
+        return tuple(float(value) for value in requirements_per_ha[0]), yield_quantiles, site_estimate is None
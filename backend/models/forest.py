@@ -0,0 +1,198 @@
+import threading
+import weakref
+
+import numpy as np
+
+_compiled = weakref.WeakKeyDictionary()
+_compiled_lock = threading.Lock()
+
+
+class CompiledForest:
+    """
+    The trees of a fitted single-output tree ensemble, such as a
+    RandomForestRegressor, packed into padded (trees, nodes) arrays so that all
+    the trees are walked together with a few numpy operations per tree level.
+
+    Leaves point to themselves, which is how the walk tells them apart from splits.
+    Missing (NaN) inputs take the side sklearn sends them to at each split.
+
+    Attributes:
+        feature_names (list): Input columns in the order the model was fitted on, or None.
+        n_features (int): Number of input columns.
+        feature (ndarray): Feature split on at each node.
+        threshold (ndarray): Split threshold at each node; rows go left when at or below it.
+        left (ndarray): Left child of each node.
+        right (ndarray): Right child of each node.
+        missing_left (ndarray): Whether rows with the split feature missing go left at each node.
+        value (ndarray): Output of each node.
+    """
+    def __init__(self, model):
+        """
+        Initializes the CompiledForest.
+
+        Parameters:
+            model: Fitted ensemble whose estimators_ are sklearn trees with one output.
+        """
+        trees = [estimator.tree_ for estimator in model.estimators_]
+        size = max(tree.node_count for tree in trees)
+        shape = (len(trees), size)
+        self.feature_names = list(getattr(model, 'feature_names_in_', [])) or None
+        self.n_features = model.n_features_in_
+        self.feature = np.zeros(shape, dtype=np.intp)
+        self.threshold = np.zeros(shape)
+        self.left = np.tile(np.arange(size), (len(trees), 1))
+        self.right = self.left.copy()
+        self.missing_left = np.zeros(shape, dtype=bool)
+        self.value = np.zeros(shape)
+        for i, tree in enumerate(trees):
+            n = tree.node_count
+            split = tree.children_left >= 0
+            self.feature[i, :n] = np.where(split, tree.feature, 0)
+            self.threshold[i, :n] = tree.threshold
+            self.left[i, :n][split] = tree.children_left[split]
+            self.right[i, :n][split] = tree.children_right[split]
+            # Trees from scikit-learn before 1.3 have no missing value support, and predict rejects NaN
+            missing_left = getattr(tree, 'missing_go_to_left', None)
+            if missing_left is not None:
+                self.missing_left[i, :n] = missing_left.astype(bool)
+            self.value[i, :n] = tree.value[:, 0, 0]
+        self._trees = np.arange(len(trees))
+        self._node_contributions = None
+
+    @property
+    def n_trees(self):
+        return len(self._trees)
+
+    def _matrix(self, X):
+        if self.feature_names is not None and hasattr(X, 'columns'):
+            X = X[self.feature_names]
+        # The trees compare float32 inputs against their thresholds
+        return np.asarray(X, dtype=np.float32).astype(np.float64)
+
+    def apply(self, X):
+        """
+        Returns the leaf each row reaches in each tree, as an array of shape (rows, trees).
+        """
+        X = self._matrix(X)
+        size = self.feature.shape[1]
+        feature, threshold = self.feature.ravel(), self.threshold.ravel()
+        left, right, missing_left = self.left.ravel(), self.right.ravel(), self.missing_left.ravel()
+        has_missing = bool(np.isnan(X).any())
+        # One entry per (row, tree) pair still walking, at its node in the flat
+        # arrays. Paths end at very different depths, so pairs that reach a leaf
+        # are dropped rather than carried to the depth of the deepest tree.
+        pairs = np.arange(len(X) * self.n_trees)
+        rows = pairs // self.n_trees
+        nodes = pairs % self.n_trees * size
+        leaves = np.empty(len(pairs), dtype=np.intp)
+        while len(pairs):
+            values = X[rows, feature[nodes]]
+            go_left = values <= threshold[nodes]
+            if has_missing:
+                go_left |= np.isnan(values) & missing_left[nodes]
+            local = np.where(go_left, left[nodes], right[nodes])
+            nodes += local - nodes % size
+            done = left[nodes] == local
+            leaves[pairs[done]] = local[done]
+            walking = ~done
+            pairs, rows, nodes = pairs[walking], rows[walking], nodes[walking]
+        return leaves.reshape(len(X), self.n_trees)
+
+    def leaf_values(self, X, leaves=None):
+        """
+        Returns the output of every tree for every row, as an array of shape (rows, trees).
+
+        Parameters:
+            X (DataFrame or ndarray): Model input.
+            leaves (ndarray): The leaves X reaches, as from apply, if already known.
+        """
+        return self.value[self._trees, self.apply(X) if leaves is None else leaves]
+
+    def predict(self, X):
+        return self.leaf_values(X).mean(axis=1)
+
+    def predict_quantiles(self, X, quantiles):
+        """
+        Predicts the forest output and its quantiles over the trees.
+
+        Parameters:
+            X (DataFrame or ndarray): Model input.
+            quantiles (sequence): Quantiles to compute, between 0 and 1.
+
+        Returns:
+            tuple: Forest output of shape (rows,) and quantiles of shape (rows, quantiles).
+        """
+        values = self.leaf_values(X)
+        return values.mean(axis=1), np.quantile(values, quantiles, axis=1).T
+
+    def node_contributions(self):
+        """
+        Returns, for every node, how much each feature moved the tree's output on
+        the path from the root, as an array of shape (trees, nodes, features).
+
+        Computed level by level across all the trees on first use.
+        """
+        if self._node_contributions is None:
+            size = self.feature.shape[1]
+            feature, left, right, value = (self.feature.ravel(), self.left.ravel(), self.right.ravel(),
+                                           self.value.ravel())
+            contributions = np.zeros((self.n_trees * size, self.n_features))
+            nodes = self._trees * size
+            while len(nodes):
+                nodes = nodes[left[nodes] != nodes % size]
+                level = []
+                for child in (left, right):
+                    children = child[nodes] + nodes - nodes % size
+                    contributions[children] = contributions[nodes]
+                    contributions[children, feature[nodes]] += value[children] - value[nodes]
+                    level.append(children)
+                nodes = np.concatenate(level)
+            self._node_contributions = contributions.reshape(self.n_trees, size, self.n_features)
+        return self._node_contributions
+
+    def contributions(self, X, leaves=None):
+        """
+        Splits each prediction into a bias and per-feature contributions, Saabas-style.
+
+        Every step down a tree moves its output from the parent's value to the
+        child's, and the change is credited to the feature split on. The sums along
+        each root-to-leaf path are precomputed, so a row only needs its leaves. The
+        bias is the forest output at the roots; bias plus contributions gives the
+        prediction.
+
+        Parameters:
+            X (DataFrame or ndarray): Model input.
+            leaves (ndarray): The leaves X reaches, as from apply, if already known.
+
+        Returns:
+            tuple: Forest output and bias of shape (rows,), and contributions of
+                shape (rows, features) in the order the model was fitted on.
+        """
+        if leaves is None:
+            leaves = self.apply(X)
+        node_contributions = self.node_contributions()
+        totals = np.zeros((len(leaves), self.n_features))
+        for tree in self._trees:
+            totals += node_contributions[tree, leaves[:, tree]]
+        prediction = self.leaf_values(X, leaves).mean(axis=1)
+        bias = np.full(len(leaves), self.value[:, 0].mean())
+        return prediction, bias, totals / self.n_trees
+
+
+def compiled_forest(model):
+    """
+    Returns the CompiledForest of a model, compiling it on first use, or None if
+    the model is not a single-output ensemble of trees.
+    """
+    with _compiled_lock:
+        try:
+            compiled = _compiled.get(model)
+        except TypeError:
+            return None
+        if compiled is None:
+            estimators = getattr(model, 'estimators_', None)
+            if (estimators is None or len(estimators) == 0 or getattr(model, 'n_outputs_', 1) != 1
+                    or not all(hasattr(estimator, 'tree_') for estimator in estimators)):
+                return None
+            compiled = _compiled[model] = CompiledForest(model)
+        return compiled
@@ -0,0 +1,196 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from fast in-process stages to slow upstream calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    """
+    A monotonically increasing count, optionally split by labels.
+
+    Attributes:
+        name (str): Metric name.
+        help (str): Description shown in the exposition output.
+        labelnames (tuple): Names of the labels every sample carries.
+    """
+    type = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels[name] for name in self.labelnames), 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {value}' for key, value in items]
+
+
+class Histogram:
+    """
+    Cumulative bucketed observations, optionally split by labels.
+
+    Attributes:
+        name (str): Metric name.
+        help (str): Description shown in the exposition output.
+        labelnames (tuple): Names of the labels every sample carries.
+        buckets (tuple): Sorted upper bounds of the buckets.
+    """
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels):
+        series = self._series.get(tuple(labels[name] for name in self.labelnames))
+        return series[2] if series else 0
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall-clock duration of the enclosed block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        lines = []
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                labels = _format_labels(self.labelnames, key, 'le="%s"' % le)
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {total}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Holds metrics and renders them in the Prometheus text exposition format.
+    """
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+# Per process: under the pre-forking server every worker has its own series
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'farmai_stage_duration_seconds', 'Time spent in each fertilizer pipeline stage.', ['stage'])
+STAGE_FAILURES = REGISTRY.counter(
+    'farmai_stage_failures_total', 'Fertilizer pipeline stages that produced no result.', ['stage'])
+REQUEST_SECONDS = REGISTRY.histogram(
+    'farmai_http_request_duration_seconds', 'Time spent handling each route.', ['route', 'method'])
+REQUESTS = REGISTRY.counter(
+    'farmai_http_requests_total', 'Requests handled by route and response status.', ['route', 'method', 'status'])
+UPSTREAM_SECONDS = REGISTRY.histogram(
+    'farmai_upstream_request_duration_seconds', 'Time spent in outbound calls to each upstream.', ['upstream'])
+UPSTREAM_REQUESTS = REGISTRY.counter(
+    'farmai_upstream_requests_total', 'Outbound calls by upstream and response status.', ['upstream', 'status'])
+GRID_LOOKUPS = REGISTRY.counter(
+    'farmai_recommendation_grid_lookups_total', 'Recommendation grid lookups by result.', ['result'])
+MODEL_RELOADS = REGISTRY.counter(
+    'farmai_model_reloads_total', 'Attempts to swap in a newly activated model version by result.', ['result'])
+SITE_FALLBACKS = REGISTRY.counter(
+    'farmai_site_fallbacks_total', 'Soil or weather data estimated from the nearest sites.', ['data'])
+OUTBOUND_WAIT_SECONDS = REGISTRY.histogram(
+    'farmai_outbound_wait_seconds', 'Time outbound calls waited for their upstream rate limit.',
+    ['upstream', 'priority'], DEFAULT_BUCKETS + (60.0, 120.0))
+OUTBOUND_REJECTIONS = REGISTRY.counter(
+    'farmai_outbound_rejections_total', 'Outbound calls abandoned because the rate limit would outlast the deadline.',
+    ['upstream'])
+UPSTREAM_BACKOFFS = REGISTRY.counter(
+    'farmai_upstream_backoffs_total', 'Retry-After responses that paused calls to an upstream.', ['upstream'])
+BREAKER_TRANSITIONS = REGISTRY.counter(
+    'farmai_circuit_breaker_transitions_total', 'Circuit breaker state changes by upstream and new state.',
+    ['upstream', 'state'])
+BREAKER_REJECTIONS = REGISTRY.counter(
+    'farmai_circuit_breaker_rejections_total', 'Outbound calls failed fast by an open circuit breaker.', ['upstream'])
+CACHE_REQUESTS = REGISTRY.counter(
+    'farmai_cache_requests_total', 'Cache lookups by cache and result.', ['cache', 'result'])
+CACHE_EVICTIONS = REGISTRY.counter(
+    'farmai_cache_evictions_total', 'Entries evicted to keep a cache within its size bound.', ['cache'])
+
+
+@contextmanager
+def track_upstream(upstream):
+    """
+    Time an outbound call and count it, labelling raised exceptions as 'error'.
+
+    Yields:
+        dict: Set its 'status' key to record the response status of the call.
+    """
+    outcome = {'status': 'error'}
+    start = time.perf_counter()
+    try:
+        yield outcome
+    finally:
+        UPSTREAM_SECONDS.observe(time.perf_counter() - start, upstream=upstream)
+        UPSTREAM_REQUESTS.inc(upstream=upstream, status=str(outcome['status']))
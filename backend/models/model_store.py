@@ -0,0 +1,341 @@
+import logging
+import os
+import threading
+import time
+
+from .artifacts import ArtifactError, ArtifactRepository, ModelWatcher
+from .credit_scoring_model import CreditScoringModel, FEATURE_NAMES
+from .metrics import MODEL_RELOADS
+from .recommendation_grid import RecommendationGrid, active_grid
+from .soil_raster import RasterSoilDataFetcher
+from .site_index import SiteIndex
+
+logger = logging.getLogger(__name__)
+
+MODELS_DIR = os.path.dirname(__file__)
+TRAINING_DIR = os.path.join(MODELS_DIR, '..', 'training')
+CROP_MODEL_FILES = {
+    'maize': 'model_maize.joblib',
+    'cassava': 'model_cassava.joblib',
+    'beans': 'model_beans.joblib'
+}
+
+
+class ModelSet:
+    """
+    The credit and crop models of one artifact version, swapped in and out as a unit.
+
+    Attributes:
+        version (str): The artifact version the models were loaded from.
+        credit_model (CreditScoringModel): The credit scoring model.
+        crop_models (dict): Crop name to its yield model.
+    """
+    def __init__(self, version, credit_model, crop_models):
+        self.version = version
+        self.credit_model = credit_model
+        self.crop_models = crop_models
+
+    @classmethod
+    def load(cls, repository, version):
+        """
+        Verifies the checksums of a version and loads its models.
+
+        Raises:
+            ArtifactError: If the version is incomplete or fails its checksums.
+        """
+        import joblib
+        repository.verify(version)
+        paths = repository.model_paths(version)
+        missing = [name for name in ['credit'] + list(CROP_MODEL_FILES) if name not in paths]
+        if missing:
+            raise ArtifactError(f"Model version {version} is missing models: {missing}")
+        credit_model = CreditScoringModel()
+        credit_model.load_model(paths['credit'])
+        crop_models = {crop: joblib.load(paths[crop]) for crop in CROP_MODEL_FILES}
+        return cls(version, credit_model, crop_models)
+
+    def warm_up(self):
+        """
+        Runs one prediction with every model, failing before the set is swapped in
+        rather than on a request.
+        """
+        import pandas as pd
+        for model in self.crop_models.values():
+            model.predict(pd.DataFrame([[0.0] * len(model.feature_names_in_)], columns=model.feature_names_in_))
+        self.credit_model.predict(pd.DataFrame([[0.0] * len(FEATURE_NAMES)], columns=FEATURE_NAMES))
+
+
+class ModelStore:
+    """
+    Loads the credit and crop models, the nearest-site index, and the precomputed
+    recommendation grid and offline soil rasters if they are configured, once and
+    shares them between requests.
+
+    Models are loaded on first use, or all at once with preload(), which lets a
+    pre-forking server load them in the parent so the workers share the pages.
+
+    With an artifact directory, the credit and crop models come from its active
+    version instead, and reload() swaps in a newly activated version as one
+    ModelSet. Requests hold on to the model objects they fetched, so requests in
+    flight during a swap finish on the old version.
+
+    Attributes:
+        crop_model_dir (str): Directory holding the crop model files.
+        credit_model_path (str): Path of the credit scoring model.
+        recommendation_grid_path (str): Path of the recommendation grid, or None
+            to always run the live fertilizer pipeline.
+        soil_raster_dir (str): Directory of offline soil raster tiles, or None to
+            fetch soil data from SoilGrids.
+        site_tables (list): CSV site tables indexed for the nearest-site fallback;
+            empty to turn the fallback off.
+        artifacts (ArtifactRepository): Versioned models, or None to load the model
+            files from crop_model_dir and credit_model_path.
+    """
+    def __init__(self, crop_model_dir=TRAINING_DIR, credit_model_path=None, recommendation_grid_path=None,
+                 soil_raster_dir=None, site_tables=None, artifact_dir=None):
+        self.crop_model_dir = crop_model_dir
+        self.credit_model_path = credit_model_path or os.getenv(
+            'CREDIT_MODEL_PATH', os.path.join(MODELS_DIR, 'credit_scoring_model.pkl'))
+        self.recommendation_grid_path = recommendation_grid_path or os.getenv('RECOMMENDATION_GRID_PATH')
+        self.soil_raster_dir = soil_raster_dir or os.getenv('SOIL_RASTER_DIR')
+        # The bundled training table only has sites in Cuba, so the fallback is off
+        # until site tables covering the served region are configured
+        self.site_tables = site_tables or [path for path in os.getenv('SITE_TABLES', '').split(os.pathsep) if path]
+        artifact_dir = artifact_dir or os.getenv('MODEL_ARTIFACT_DIR')
+        self.artifacts = ArtifactRepository(artifact_dir) if artifact_dir else None
+        self._model_set = None
+        self._failed_version = None
+        self._reload_lock = threading.Lock()
+        self._watcher = None
+        self._crop_models = {}
+        self._credit_model = None
+        self._recommendation_grid = None
+        self._recommendation_grid_version = None
+        self._failed_grid_version = None
+        self._recommendation_grid_loaded = False
+        self._soil_rasters = None
+        self._soil_rasters_loaded = False
+        self._site_index = None
+        self._site_index_loaded = False
+        self._lock = threading.Lock()
+
+    def get_crop_model(self, crop_type):
+        """
+        Returns the yield model for a crop, loading it on first use.
+
+        Parameters:
+            crop_type (str): One of the keys of CROP_MODEL_FILES, in any case.
+
+        Returns:
+            RandomForestRegressor: The crop model, or None for an unknown crop.
+        """
+        crop = crop_type.lower()
+        if crop not in CROP_MODEL_FILES:
+            return None
+        if self.artifacts is not None:
+            return self.get_model_set().crop_models[crop]
+        model = self._crop_models.get(crop)
+        if model is None:
+            with self._lock:
+                model = self._crop_models.get(crop)
+                if model is None:
+                    import joblib
+                    model = joblib.load(os.path.join(self.crop_model_dir, CROP_MODEL_FILES[crop]))
+                    self._crop_models[crop] = model
+        return model
+
+    def get_credit_model(self):
+        """
+        Returns the credit scoring model, loading it on first use.
+
+        Returns:
+            CreditScoringModel: The loaded credit scoring model.
+        """
+        if self.artifacts is not None:
+            return self.get_model_set().credit_model
+        if self._credit_model is None:
+            with self._lock:
+                if self._credit_model is None:
+                    credit_model = CreditScoringModel()
+                    credit_model.load_model(self.credit_model_path)
+                    self._credit_model = credit_model
+        return self._credit_model
+
+    def get_model_set(self):
+        """
+        Returns the models of the active artifact version, loading them on first use.
+
+        Raises:
+            ArtifactError: If no version is active or it cannot be loaded.
+        """
+        model_set = self._model_set
+        if model_set is None:
+            with self._reload_lock:
+                model_set = self._model_set
+                if model_set is None:
+                    version = self.artifacts.current_version()
+                    if version is None:
+                        raise ArtifactError(f"No active model version in {self.artifacts.root}")
+                    model_set = ModelSet.load(self.artifacts, version)
+                    self._model_set = model_set
+        return model_set
+
+    def reload(self):
+        """
+        Swaps in the active artifact version and the active recommendation grid
+        if they changed since the last check.
+
+        The new version is verified, loaded and warmed up before the swap, which is
+        a single reference assignment. A version that fails is not retried until
+        another version has been activated.
+
+        Returns:
+            bool: Whether a new model version was swapped in.
+        """
+        self.reload_recommendation_grid()
+        if self.artifacts is None:
+            return False
+        version = self.artifacts.current_version()
+        current = self._model_set.version if self._model_set is not None else None
+        if version is None or version in (current, self._failed_version):
+            return False
+
+        with self._reload_lock:
+            start = time.perf_counter()
+            try:
+                model_set = ModelSet.load(self.artifacts, version)
+                model_set.warm_up()
+            except Exception:
+                logger.exception("Could not load model version %s; keeping %s", version, current)
+                self._failed_version = version
+                MODEL_RELOADS.inc(result='failed')
+                return False
+            self._model_set = model_set
+            self._failed_version = None
+        MODEL_RELOADS.inc(result='swapped')
+        logger.info("Swapped model version %s for %s in %.2fs", current, version, time.perf_counter() - start)
+        return True
+
+    def reload_recommendation_grid(self):
+        """
+        Swaps in the active version of the recommendation grid directory if it
+        changed since the grid was opened. Lookups in flight keep the grid they
+        fetched. A version that cannot be opened is logged once and the old grid
+        kept.
+
+        Returns:
+            bool: Whether a new grid was swapped in.
+        """
+        if not self._recommendation_grid_loaded or not self.recommendation_grid_path:
+            return False
+        version = None
+        try:
+            path, version = active_grid(self.recommendation_grid_path)
+            if version in (None, self._recommendation_grid_version, self._failed_grid_version):
+                return False
+            grid = RecommendationGrid.load(path)
+        except (OSError, ValueError, KeyError) as e:
+            logger.error("Could not open recommendation grid %s: %s", self.recommendation_grid_path, e)
+            self._failed_grid_version = version
+            return False
+        with self._lock:
+            self._recommendation_grid, self._recommendation_grid_version = grid, version
+        logger.info("Swapped in recommendation grid version %s", version)
+        return True
+
+    def start_watcher(self, interval=None):
+        """
+        Starts the background thread swapping in newly activated model versions
+        and recommendation grids.
+
+        Returns:
+            ModelWatcher: The running watcher, or None without an artifact
+                directory or a recommendation grid.
+        """
+        if self.artifacts is None and not self.recommendation_grid_path:
+            return None
+        if self._watcher is None:
+            self._watcher = ModelWatcher(self, interval or float(os.getenv('MODEL_WATCH_INTERVAL', 5)))
+        self._watcher.start()
+        return self._watcher
+
+    def get_recommendation_grid(self):
+        """
+        Returns the precomputed recommendation grid, opening it on first use.
+
+        For a grid directory this is its active version, which the model watcher
+        swaps for newer ones as they are published.
+
+        Returns:
+            RecommendationGrid: The memory-mapped grid, or None if no grid is
+                configured or it could not be opened.
+        """
+        if not self._recommendation_grid_loaded:
+            with self._lock:
+                if not self._recommendation_grid_loaded:
+                    if self.recommendation_grid_path:
+                        try:
+                            path, self._recommendation_grid_version = active_grid(self.recommendation_grid_path)
+                            self._recommendation_grid = RecommendationGrid.load(path)
+                        except (OSError, ValueError, KeyError) as e:
+                            logger.error("Could not open recommendation grid %s: %s", self.recommendation_grid_path, e)
+                    self._recommendation_grid_loaded = True
+        return self._recommendation_grid
+
+    def get_soil_rasters(self):
+        """
+        Returns the offline soil data backend, opening its rasters on first use.
+
+        Returns:
+            RasterSoilDataFetcher: The raster backend, or None if no rasters are
+                configured or they could not be opened.
+        """
+        if not self._soil_rasters_loaded:
+            with self._lock:
+                if not self._soil_rasters_loaded:
+                    if self.soil_raster_dir:
+                        try:
+                            self._soil_rasters = RasterSoilDataFetcher(self.soil_raster_dir)
+                        except (OSError, ValueError, KeyError) as e:
+                            logger.error("Could not open soil rasters in %s: %s", self.soil_raster_dir, e)
+                    self._soil_rasters_loaded = True
+        return self._soil_rasters
+
+    def get_site_index(self):
+        """
+        Returns the nearest-site index, building it on first use.
+
+        Returns:
+            SiteIndex: The index over the site tables, or None if none are
+                configured or they could not be read.
+        """
+        if not self._site_index_loaded:
+            with self._lock:
+                if not self._site_index_loaded and not self.site_tables:
+                    self._site_index_loaded = True
+                if not self._site_index_loaded:
+                    try:
+                        self._site_index = SiteIndex.from_csv(
+                            self.site_tables, float(os.getenv('SITE_MAX_DISTANCE_KM', 100)))
+                    except (OSError, ValueError) as e:
+                        logger.error("Could not build the site index from %s: %s", self.site_tables, e)
+                    self._site_index_loaded = True
+        return self._site_index
+
+    def preload(self):
+        """
+        Loads every model up front.
+        """
+        for crop in CROP_MODEL_FILES:
+            self.get_crop_model(crop)
+        self.get_credit_model()
+        self.get_recommendation_grid()
+        self.get_soil_rasters()
+        self.get_site_index()
+        if self.artifacts is not None:
+            logger.info("Preloaded model version %s", self._model_set.version)
+        else:
+            logger.info("Preloaded models: %s and credit model", sorted(self._crop_models))
+
+
+MODEL_STORE = ModelStore()
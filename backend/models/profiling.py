@@ -0,0 +1,192 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+# Longest profiling session accepted, in seconds
+MAX_DURATION = float(os.getenv('PROFILE_MAX_SECONDS', 60))
+
+# Shortest interval between stack samples, in seconds; shorter ones would have the
+# sampler busy-loop and starve the threads it samples
+MIN_INTERVAL = 0.001
+
+_session_lock = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    """
+    Raised when a profiling session is started while another one is running.
+    """
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def sample_stacks(duration, interval, stop=None, clock=time.monotonic):
+    """
+    Samples the stacks of every other thread at a fixed interval.
+
+    Parameters:
+        duration (float): Seconds to sample for.
+        interval (float): Seconds between samples, at least MIN_INTERVAL.
+        stop (threading.Event): Ends sampling early when set.
+
+    Returns:
+        tuple: Counter of collapsed stacks, outermost frame first and separated by
+            ';', and the number of samples taken.
+    """
+    own = threading.get_ident()
+    interval = max(interval, MIN_INTERVAL)
+    stop = stop or threading.Event()
+    stacks = Counter()
+    samples = 0
+    end = clock() + duration
+    while clock() < end and not stop.is_set():
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(frame_label(frame))
+                frame = frame.f_back
+            stacks[';'.join(reversed(labels))] += 1
+        samples += 1
+        stop.wait(interval)
+    return stacks, samples
+
+
+def collapsed(stacks):
+    """
+    Formats stacks in the collapsed format read by flamegraph.pl and speedscope.
+    """
+    return ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
+
+
+class ProfilingMiddleware:
+    """
+    WSGI middleware that runs requests under cProfile and merges their stats.
+
+    Only one request is profiled at a time, since a profiler hooks the whole
+    interpreter on recent Pythons; requests arriving meanwhile run unprofiled.
+    The middleware is installed for the duration of a session only, so there is
+    no cost when no session runs.
+    """
+    def __init__(self, wsgi_app, max_requests=None):
+        self.wsgi_app = wsgi_app
+        self.max_requests = max_requests
+        self.stats = None
+        self.requests = 0
+        self.done = threading.Event()
+        self._lock = threading.Lock()
+        self._profiling = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        if self.done.is_set() or not self._profiling.acquire(blocking=False):
+            return self.wsgi_app(environ, start_response)
+        try:
+            profile = cProfile.Profile()
+            response = profile.runcall(self.wsgi_app, environ, start_response)
+        finally:
+            self._profiling.release()
+        with self._lock:
+            if self.stats is None:
+                self.stats = pstats.Stats(profile)
+            else:
+                self.stats.add(profile)
+            self.requests += 1
+            if self.max_requests and self.requests >= self.max_requests:
+                self.done.set()
+        return response
+
+
+def format_stats(stats, sort='cumulative', top=30):
+    if stats is None:
+        return ''
+    output = io.StringIO()
+    stats.stream = output
+    stats.sort_stats(sort).print_stats(top)
+    return output.getvalue()
+
+
+def memory_diff(before, after, top=30):
+    """
+    Returns the source lines whose allocations grew the most between two
+    tracemalloc snapshots.
+    """
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    differences = after.filter_traces(filters).compare_to(before.filter_traces(filters), 'lineno')
+    return [str(difference) for difference in differences[:top]]
+
+
+def profile_app(app, mode='sampling', duration=10.0, max_requests=None, interval=0.005, trace_memory=False,
+                sort='cumulative', top=30):
+    """
+    Profiles a running Flask application in this process, blocking until the
+    session ends.
+
+    Parameters:
+        app (Flask): The application to profile.
+        mode (str): 'sampling' to sample the stacks of all threads, or 'cprofile'
+            to run requests under cProfile.
+        duration (float): Longest time the session runs, capped at MAX_DURATION.
+        max_requests (int): In cprofile mode, end after this many requests.
+        interval (float): In sampling mode, seconds between samples.
+        trace_memory (bool): Also report allocation growth with tracemalloc.
+        sort (str): pstats sort key of the cprofile report.
+        top (int): Entries in the cprofile and tracemalloc reports.
+
+    Returns:
+        dict: The report.
+
+    Raises:
+        ProfilerBusy: If another session is running.
+    """
+    if mode not in ('sampling', 'cprofile'):
+        raise ValueError(f"Unknown profiling mode {mode!r}")
+    duration = min(float(duration), MAX_DURATION)
+    if not _session_lock.acquire(blocking=False):
+        raise ProfilerBusy("A profiling session is already running")
+    started_tracing = False
+    try:
+        if trace_memory:
+            started_tracing = not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start(10)
+            before = tracemalloc.take_snapshot()
+
+        start = time.monotonic()
+        report = {'pid': os.getpid(), 'mode': mode}
+        if mode == 'sampling':
+            stacks, samples = sample_stacks(duration, interval)
+            report.update(samples=samples, collapsed=collapsed(stacks))
+        else:
+            # Wrap the instance attribute, as Flask's docs suggest for middleware,
+            # and restore whatever was there before
+            overridden = 'wsgi_app' in vars(app)
+            middleware = ProfilingMiddleware(app.wsgi_app, max_requests)
+            app.wsgi_app = middleware
+            try:
+                middleware.done.wait(duration)
+            finally:
+                if overridden:
+                    app.wsgi_app = middleware.wsgi_app
+                else:
+                    del app.wsgi_app
+                middleware.done.set()
+            report.update(requests=middleware.requests, pstats=format_stats(middleware.stats, sort, top))
+        report['duration'] = time.monotonic() - start
+
+        if trace_memory:
+            report['tracemalloc'] = memory_diff(before, tracemalloc.take_snapshot(), top)
+        return report
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+        _session_lock.release()
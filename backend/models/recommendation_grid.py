@@ -0,0 +1,212 @@
+import datetime
+import json
+import os
+import shutil
+
+import numpy as np
+
+from .artifacts import write_json_atomic
+
+# Nutrients stored per grid cell and crop, in the order used by FertilizerCalculator
+NUTRIENTS = ['N', 'P2O5', 'K2O']
+
+POINTER_FILE = 'current.json'
+GRID_NAME = 'grid'
+# Versions kept in a grid directory, so servers still reading the previous one
+# when a build is published are not left without a grid
+KEEP_VERSIONS = 2
+
+
+def active_grid(path):
+    """
+    Returns the grid to open for a grid path, and its version.
+
+    A directory written by build_recommendation_grid.py holds versions of the
+    grid and names the active one in current.json. Any other path is a single
+    grid, whose version is None.
+
+    Returns:
+        tuple: Path of the grid and the active version.
+    """
+    if not os.path.isdir(path):
+        return path, None
+    with open(os.path.join(path, POINTER_FILE)) as f:
+        version = json.load(f)['version']
+    return os.path.join(path, 'versions', version, GRID_NAME), version
+
+
+def new_grid_version(root):
+    """
+    Creates an empty staging directory for the next version of a grid directory.
+
+    Returns:
+        tuple: Name of the version and path of its staging directory.
+    """
+    version = datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')
+    staging = os.path.join(root, 'versions', f'.{version}.tmp')
+    os.makedirs(staging)
+    return version, staging
+
+
+def publish_grid_version(root, version, staging, keep=KEEP_VERSIONS):
+    """
+    Moves a staged grid into place and makes it the active version.
+
+    The array and header are renamed into place together as one directory, and
+    the version becomes active with a single atomic replace of current.json, so
+    readers see either the old grid or the new one. Versions beyond the newest
+    keep are deleted; servers that still have them mapped keep reading them.
+    """
+    versions_dir = os.path.join(root, 'versions')
+    os.rename(staging, os.path.join(versions_dir, version))
+    write_json_atomic(os.path.join(root, POINTER_FILE), {'version': version})
+    versions = sorted(name for name in os.listdir(versions_dir) if not name.startswith('.'))
+    for name in versions[:-keep]:
+        shutil.rmtree(os.path.join(versions_dir, name), ignore_errors=True)
+
+
+class RecommendationGrid:
+    """
+    Per-hectare nutrient requirements precomputed over a regular lat/lon grid.
+
+    The values are stored as a float32 .npy array of shape (n_lat, n_lon, n_crops, 3)
+    next to a JSON header describing the grid, and opened memory-mapped so that
+    lookups only touch the pages they read and forked workers share them. Cells
+    for which no recommendation could be computed hold NaN.
+
+    Attributes:
+        min_lat (float): Latitude of the first grid row.
+        min_lon (float): Longitude of the first grid column.
+        step (float): Spacing between grid points in degrees.
+        crops (list): Crop names in the order of the third array axis.
+        values (ndarray): Requirements in kg/ha, indexed [row, column, crop, nutrient].
+    """
+    def __init__(self, min_lat, min_lon, step, crops, values):
+        """
+        Initializes the RecommendationGrid.
+
+        Parameters:
+            min_lat (float): Latitude of the first grid row.
+            min_lon (float): Longitude of the first grid column.
+            step (float): Spacing between grid points in degrees.
+            crops (list): Crop names in the order of the third array axis.
+            values (ndarray): Array of shape (n_lat, n_lon, len(crops), 3).
+        """
+        if values.ndim != 4 or values.shape[2:] != (len(crops), len(NUTRIENTS)):
+            raise ValueError(f"Expected values of shape (n_lat, n_lon, {len(crops)}, {len(NUTRIENTS)})")
+        self.min_lat = float(min_lat)
+        self.min_lon = float(min_lon)
+        self.step = float(step)
+        self.crops = [crop.lower() for crop in crops]
+        self.values = values
+        self._crop_index = {crop: i for i, crop in enumerate(self.crops)}
+
+    @property
+    def shape(self):
+        return self.values.shape[:2]
+
+    def coordinates(self):
+        """
+        Returns the latitudes of the grid rows and the longitudes of its columns.
+        """
+        n_lat, n_lon = self.shape
+        return (self.min_lat + self.step * np.arange(n_lat),
+                self.min_lon + self.step * np.arange(n_lon))
+
+    def cell(self, latitude, longitude):
+        """
+        Finds the grid point nearest to a location.
+
+        Returns:
+            tuple: Row and column of the nearest grid point, or None if the location
+                is more than half a step outside the grid.
+        """
+        row = int(round((latitude - self.min_lat) / self.step))
+        column = int(round((longitude - self.min_lon) / self.step))
+        n_lat, n_lon = self.shape
+        if 0 <= row < n_lat and 0 <= column < n_lon:
+            return row, column
+        return None
+
+    def lookup(self, latitude, longitude, crop_type):
+        """
+        Returns the precomputed requirements of the grid point nearest to a location.
+
+        Parameters:
+            latitude (float): Latitude of the farm.
+            longitude (float): Longitude of the farm.
+            crop_type (str): Name of the crop, in any case.
+
+        Returns:
+            ndarray: N, P2O5 and K2O requirements in kg/ha, or None if the location
+                or crop is not covered.
+        """
+        crop = self._crop_index.get(crop_type.lower())
+        cell = self.cell(latitude, longitude)
+        if crop is None or cell is None:
+            return None
+        requirements = np.asarray(self.values[cell[0], cell[1], crop], dtype=float)
+        if np.isnan(requirements).any():
+            return None
+        return requirements
+
+    def header(self):
+        n_lat, n_lon = self.shape
+        return {
+            'min_lat': self.min_lat,
+            'min_lon': self.min_lon,
+            'step': self.step,
+            'n_lat': n_lat,
+            'n_lon': n_lon,
+            'crops': self.crops,
+            'nutrients': NUTRIENTS
+        }
+
+    @staticmethod
+    def paths(path):
+        """
+        Returns the array and header file paths for a grid stored at path.
+        """
+        base = path[:-len('.npy')] if path.endswith('.npy') else path
+        return base + '.npy', base + '.json'
+
+    @classmethod
+    def create(cls, path, min_lat, min_lon, step, n_lat, n_lon, crops):
+        """
+        Creates an empty grid file, filled with NaN, that can be written in place.
+
+        Returns:
+            RecommendationGrid: The grid, backed by a writable memory map.
+        """
+        array_path, header_path = cls.paths(path)
+        values = np.lib.format.open_memmap(array_path, mode='w+', dtype=np.float32,
+                                           shape=(n_lat, n_lon, len(crops), len(NUTRIENTS)))
+        values[:] = np.nan
+        grid = cls(min_lat, min_lon, step, crops, values)
+        with open(header_path, 'w') as f:
+            json.dump(grid.header(), f, indent=2)
+        return grid
+
+    @classmethod
+    def load(cls, path):
+        """
+        Opens a grid read-only and memory-mapped.
+
+        Parameters:
+            path (str): Path of the grid, with or without the .npy extension.
+
+        Returns:
+            RecommendationGrid: The loaded grid.
+        """
+        array_path, header_path = cls.paths(path)
+        with open(header_path) as f:
+            header = json.load(f)
+        values = np.load(array_path, mmap_mode='r')
+        if values.shape[:2] != (header['n_lat'], header['n_lon']):
+            raise ValueError(f"Grid array {array_path} does not match its header")
+        return cls(header['min_lat'], header['min_lon'], header['step'], header['crops'], values)
+
+    def flush(self):
+        if isinstance(self.values, np.memmap):
+            self.values.flush()
+
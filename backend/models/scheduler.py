@@ -0,0 +1,382 @@
+import asyncio
+import contextvars
+import email.utils
+import heapq
+import itertools
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from .metrics import OUTBOUND_WAIT_SECONDS, OUTBOUND_REJECTIONS, UPSTREAM_BACKOFFS
+
+logger = logging.getLogger(__name__)
+
+# Lower values are served first
+INTERACTIVE = 0
+BATCH = 10
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', BATCH: 'batch'}
+
+# Requests per second and burst of each upstream, overridable with RATE_LIMITS:
+# Nominatim's usage policy allows 1 request per second, SoilGrids asks for at
+# most 5 per minute and the OpenWeather free tier allows 60 per minute
+DEFAULT_RATE_LIMITS = {
+    'nominatim': (1.0, 1),
+    'soilgrids': (5 / 60, 5),
+    'openweather': (1.0, 10),
+}
+DEFAULT_DB_PATH = os.path.join(tempfile.gettempdir(), 'farmai-ratelimit.sqlite3')
+
+# Interval at which async callers check whether they reached the head of the queue
+ASYNC_POLL_SECONDS = 0.05
+
+# Seconds past its expected turn that a waiting interactive caller keeps batch
+# callers of every process away from the bucket, covering its wake-up latency
+INTERACTIVE_HOLD_SECONDS = 0.5
+
+priority_var = contextvars.ContextVar('outbound_priority', default=INTERACTIVE)
+
+
+@contextmanager
+def outbound_priority(priority):
+    """
+    Runs the outbound calls made in the block at the given priority.
+    """
+    token = priority_var.set(priority)
+    try:
+        yield
+    finally:
+        priority_var.reset(token)
+
+
+@asynccontextmanager
+async def held(lock):
+    """
+    Holds a threading lock from a coroutine without blocking the event loop.
+
+    A lock held by another thread is waited for in a worker thread, so the lock
+    must be a plain Lock, which any thread may release.
+    """
+    if not lock.acquire(blocking=False):
+        acquiring = asyncio.get_running_loop().run_in_executor(None, lock.acquire)
+        try:
+            await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            # The worker still takes the lock, so release it once it has
+            acquiring.add_done_callback(lambda future: lock.release())
+            raise
+    try:
+        yield
+    finally:
+        lock.release()
+
+
+def parse_retry_after(value, now=None):
+    """
+    Returns the seconds to wait given by a Retry-After header, which holds either
+    a number of seconds or an HTTP date, or None if it cannot be parsed.
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+    return max(when - (time.time() if now is None else now), 0.0)
+
+
+def parse_rate_limits(value):
+    """
+    Parses RATE_LIMITS, such as 'nominatim=1:1,soilgrids=0.1:5', into upstream to
+    (requests per second, burst). 'off' disables pacing.
+    """
+    if value.strip().lower() == 'off':
+        return {}
+    limits = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        upstream, limit = item.split('=', 1)
+        rate, _, burst = limit.partition(':')
+        limits[upstream.strip()] = (float(rate), int(burst or 1))
+    return limits
+
+
+class SharedTokenBucket:
+    """
+    Token bucket whose state lives in a SQLite database, so that every process on
+    the host draws from the same bucket.
+
+    Priorities hold across processes as well: an interactive caller that has to
+    wait marks the bucket until its turn, and batch callers take no token while
+    it is marked. Batch callers also leave the reserve to interactive ones.
+
+    Every update runs in an immediate transaction, which serializes the workers.
+    If the database cannot be used the bucket lets calls through, so pacing never
+    fails a request.
+
+    Attributes:
+        name (str): The upstream the bucket paces.
+        rate (float): Tokens added per second.
+        burst (int): Tokens the bucket holds at most.
+        reserve (int): Tokens only interactive callers may take; by default one
+            if the burst allows it.
+    """
+    def __init__(self, path, name, rate, burst=1, clock=time.time, reserve=None):
+        self.path = path
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.reserve = min(1, burst - 1) if reserve is None else reserve
+        self.clock = clock
+        self._local = threading.local()
+
+    def _connection(self):
+        # Connections are not carried across a fork, so reconnect in a new process
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL NOT NULL, '
+                               'updated REAL NOT NULL, blocked_until REAL NOT NULL, '
+                               'interactive_until REAL NOT NULL DEFAULT 0)')
+            # Databases created before priorities were shared lack the column
+            if 'interactive_until' not in {row[1] for row in connection.execute('PRAGMA table_info(buckets)')}:
+                try:
+                    connection.execute('ALTER TABLE buckets ADD COLUMN interactive_until REAL NOT NULL DEFAULT 0')
+                except sqlite3.OperationalError:
+                    # Another worker added it first
+                    pass
+            local.connection, local.pid = connection, os.getpid()
+        return local.connection
+
+    def _update(self, change):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            now = self.clock()
+            row = connection.execute('SELECT tokens, updated, blocked_until, interactive_until FROM buckets '
+                                     'WHERE name = ?', (self.name,)).fetchone()
+            tokens, updated, blocked_until, interactive_until = row if row else (self.burst, now, 0.0, 0.0)
+            # No tokens accrue while blocked, so calls resume at the rate rather than in a burst
+            tokens = min(self.burst, tokens + max(now - max(updated, blocked_until), 0.0) * self.rate)
+            tokens, blocked_until, interactive_until, result = change(now, tokens, blocked_until, interactive_until)
+            connection.execute('INSERT OR REPLACE INTO buckets (name, tokens, updated, blocked_until, interactive_until) '
+                               'VALUES (?, ?, ?, ?, ?)', (self.name, tokens, now, blocked_until, interactive_until))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return result
+
+    def try_acquire(self, priority=INTERACTIVE, remaining=None):
+        """
+        Takes a token if one is available to a caller of the given priority.
+
+        Parameters:
+            priority (int): Priority of the caller.
+            remaining (float): Seconds the caller is willing to wait, or None
+                for no limit. An interactive caller only holds the bucket back
+                from batch callers if it will wait for its token.
+
+        Returns:
+            float: 0 if a token was taken, else the seconds until one may be.
+        """
+        def take(now, tokens, blocked_until, interactive_until):
+            if now < blocked_until:
+                return tokens, blocked_until, interactive_until, blocked_until - now
+            if priority > INTERACTIVE and now < interactive_until:
+                return tokens, blocked_until, interactive_until, interactive_until - now
+            needed = 1 if priority <= INTERACTIVE else 1 + self.reserve
+            if tokens >= needed:
+                return tokens - 1, blocked_until, interactive_until, 0.0
+            wait = (needed - tokens) / self.rate
+            if priority <= INTERACTIVE and (remaining is None or wait <= remaining):
+                interactive_until = max(interactive_until, now + wait + INTERACTIVE_HOLD_SECONDS)
+            return tokens, blocked_until, interactive_until, wait
+
+        try:
+            return self._update(take)
+        except sqlite3.Error as e:
+            logger.warning("Rate limit state for %s is unavailable: %s", self.name, e)
+            return 0.0
+
+    def block(self, seconds):
+        """
+        Withholds tokens for the given number of seconds, as asked by a Retry-After header.
+        """
+        try:
+            self._update(lambda now, tokens, blocked_until, interactive_until: (
+                0.0, max(blocked_until, now + seconds), interactive_until, None))
+        except sqlite3.Error as e:
+            logger.warning("Rate limit state for %s is unavailable: %s", self.name, e)
+
+
+class OutboundScheduler:
+    """
+    Paces outbound calls to each upstream with a token bucket shared by the
+    workers on the host.
+
+    Within a process, callers waiting for the same upstream queue by priority,
+    then arrival, so interactive requests go ahead of batch and warm-up jobs.
+    Only the head of the queue draws from the bucket, which keeps batch callers
+    of other processes back while interactive ones wait. Upstreams without a
+    limit are not paced.
+
+    Attributes:
+        buckets (dict): Upstream to its SharedTokenBucket.
+    """
+    def __init__(self, limits, path=DEFAULT_DB_PATH):
+        """
+        Initializes the OutboundScheduler.
+
+        Parameters:
+            limits (dict): Upstream to (requests per second, burst).
+            path (str): Database holding the state of the buckets.
+        """
+        self.buckets = {name: SharedTokenBucket(path, name, rate, burst) for name, (rate, burst) in limits.items()}
+        self._queues = {name: [] for name in limits}
+        # Plain locks, since async callers may take them in one thread and release them in another
+        self._conditions = {name: threading.Condition(threading.Lock()) for name in limits}
+        self._sequence = itertools.count()
+
+    def acquire(self, upstream, priority=None, deadline=None):
+        """
+        Waits until a call to the upstream may be made.
+
+        Parameters:
+            upstream (str): Name of the upstream.
+            priority (int): Queue priority; the current outbound_priority if None.
+            deadline (float): time.monotonic() value after which to give up.
+
+        Returns:
+            bool: True if the call may be made, False if it could not be made
+                before the deadline.
+        """
+        bucket = self.buckets.get(upstream)
+        if bucket is None:
+            return True
+        priority = priority_var.get() if priority is None else priority
+        queue, condition = self._queues[upstream], self._conditions[upstream]
+        ticket = (priority, next(self._sequence))
+        start = time.monotonic()
+        with condition:
+            heapq.heappush(queue, ticket)
+        try:
+            while True:
+                # The queue lock is only held for queue operations, never while the
+                # bucket is read, so async callers checking their turn never wait long
+                wait = None
+                with condition:
+                    head = queue[0] == ticket
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if head:
+                    wait = bucket.try_acquire(priority, remaining)
+                    if wait == 0:
+                        OUTBOUND_WAIT_SECONDS.observe(time.monotonic() - start, upstream=upstream,
+                                                      priority=PRIORITY_NAMES.get(priority, str(priority)))
+                        return True
+                if remaining is not None and (remaining <= 0 or (wait is not None and wait > remaining)):
+                    OUTBOUND_REJECTIONS.inc(upstream=upstream)
+                    return False
+                with condition:
+                    # Unless the head left while the bucket was read, sleep until notified
+                    if head or queue[0] != ticket:
+                        condition.wait(min(filter(lambda x: x is not None, (wait, remaining)), default=None))
+        finally:
+            with condition:
+                queue.remove(ticket)
+                heapq.heapify(queue)
+                condition.notify_all()
+
+    async def acquire_async(self, upstream, priority=None, deadline=None):
+        """
+        Waits like acquire() without blocking the event loop.
+
+        Async callers share the queue with threads; while waiting they sleep on
+        the event loop and check their turn every ASYNC_POLL_SECONDS. The queue
+        lock is taken without blocking the loop, and the shared bucket is read
+        in a worker thread.
+
+        Returns:
+            bool: True if the call may be made, False if it could not be made
+                before the deadline.
+        """
+        bucket = self.buckets.get(upstream)
+        if bucket is None:
+            return True
+        priority = priority_var.get() if priority is None else priority
+        queue, condition = self._queues[upstream], self._conditions[upstream]
+        ticket = (priority, next(self._sequence))
+        start = time.monotonic()
+        async with held(condition):
+            heapq.heappush(queue, ticket)
+        try:
+            while True:
+                wait = None
+                async with held(condition):
+                    head = queue[0] == ticket
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if head:
+                    wait = await asyncio.to_thread(bucket.try_acquire, priority, remaining)
+                    if wait == 0:
+                        OUTBOUND_WAIT_SECONDS.observe(time.monotonic() - start, upstream=upstream,
+                                                      priority=PRIORITY_NAMES.get(priority, str(priority)))
+                        return True
+                if remaining is not None and (remaining <= 0 or (wait is not None and wait > remaining)):
+                    OUTBOUND_REJECTIONS.inc(upstream=upstream)
+                    return False
+                await asyncio.sleep(min(x for x in (wait, remaining, ASYNC_POLL_SECONDS) if x is not None))
+        finally:
+            async with held(condition):
+                queue.remove(ticket)
+                heapq.heapify(queue)
+                condition.notify_all()
+
+    def back_off(self, upstream, seconds):
+        """
+        Stops calls to the upstream from every worker for the given number of seconds.
+        """
+        bucket = self.buckets.get(upstream)
+        if bucket is None:
+            return
+        logger.warning("%s asked to retry after %.1fs", upstream, seconds)
+        UPSTREAM_BACKOFFS.inc(upstream=upstream)
+        bucket.block(seconds)
+
+
+_scheduler = None
+
+
+def get_scheduler():
+    """
+    Returns the configured OutboundScheduler, or None if calls are not paced.
+    """
+    return _scheduler
+
+
+def configure_scheduler(limits=None, db_path=None):
+    """
+    Creates the scheduler that paces outbound calls, replacing any existing one.
+
+    Parameters:
+        limits (dict): Upstream to (requests per second, burst). Defaults to
+            RATE_LIMITS if set, else DEFAULT_RATE_LIMITS; empty disables pacing.
+        db_path (str): Database of the shared buckets; defaults to
+            RATE_LIMIT_DB_PATH, else farmai-ratelimit.sqlite3 in the temporary
+            directory.
+
+    Returns:
+        OutboundScheduler: The scheduler, or None if pacing is disabled.
+    """
+    global _scheduler
+    if limits is None:
+        limits = parse_rate_limits(os.environ['RATE_LIMITS']) if 'RATE_LIMITS' in os.environ else DEFAULT_RATE_LIMITS
+    db_path = db_path or os.getenv('RATE_LIMIT_DB_PATH', DEFAULT_DB_PATH)
+    _scheduler = OutboundScheduler(limits, db_path) if limits else None
+    return _scheduler
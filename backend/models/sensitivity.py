@@ -0,0 +1,173 @@
+import numpy as np
+
+from .credit_scoring_model import FEATURE_NAMES
+
+
+class SensitivityAnalyzer:
+    """
+    Evaluates credit scores over Cartesian grids of feature values.
+
+    Grid points are generated chunk by chunk from their flat index, so the memory
+    used is bounded by chunk_size regardless of how many points the grid has.
+
+    Attributes:
+        credit_model (CreditScoringModel): The model used to score grid points.
+        chunk_size (int): Maximum number of grid points scored at once.
+        method (str): 'model' to score with the trained forest, 'formula' to use
+            the rule-based credit score.
+    """
+    def __init__(self, credit_model, chunk_size=65536, method='model'):
+        """
+        Initializes the SensitivityAnalyzer.
+
+        Parameters:
+            credit_model (CreditScoringModel): The model used to score grid points.
+            chunk_size (int): Maximum number of grid points scored at once.
+            method (str): Either 'model' or 'formula'.
+        """
+        if method not in ('model', 'formula'):
+            raise ValueError("method must be 'model' or 'formula'")
+        self.credit_model = credit_model
+        self.chunk_size = int(chunk_size)
+        self.method = method
+
+    def _score(self, features):
+        if self.method == 'formula':
+            return self.credit_model.calculate_credit_scores(features)
+        import pandas as pd
+        return self.credit_model.predict(pd.DataFrame(features, columns=FEATURE_NAMES))
+
+    @staticmethod
+    def _resolve(grid, base):
+        """
+        Splits the features into grid axes and fixed base values.
+
+        Returns:
+            tuple: Axis feature names, axis value arrays and the fixed value of every
+                feature (NaN for features that vary along an axis).
+        """
+        base = base or {}
+        unknown = [name for name in list(grid) + list(base) if name not in FEATURE_NAMES]
+        if unknown:
+            raise ValueError(f"Unknown features: {unknown}")
+
+        axes = [name for name in FEATURE_NAMES if name in grid]
+        values = [np.asarray(grid[name], dtype=float).ravel() for name in axes]
+        if not axes or any(len(v) == 0 for v in values):
+            raise ValueError("The grid must contain at least one non-empty feature")
+
+        fixed = np.full(len(FEATURE_NAMES), np.nan)
+        for i, name in enumerate(FEATURE_NAMES):
+            if name in grid:
+                continue
+            if name not in base:
+                raise ValueError(f"Feature '{name}' is neither on the grid nor in the base values")
+            fixed[i] = float(base[name])
+        return axes, values, fixed
+
+    def _iter_chunks(self, axes, values, fixed):
+        """
+        Yields (axis indices, scores) for consecutive chunks of the flattened grid.
+        """
+        shape = tuple(len(v) for v in values)
+        columns = [FEATURE_NAMES.index(name) for name in axes]
+        total = int(np.prod(shape))
+
+        for start in range(0, total, self.chunk_size):
+            stop = min(start + self.chunk_size, total)
+            indices = np.unravel_index(np.arange(start, stop), shape)
+            features = np.broadcast_to(fixed, (stop - start, len(FEATURE_NAMES))).copy()
+            for column, axis_values, axis_indices in zip(columns, values, indices):
+                features[:, column] = axis_values[axis_indices]
+            yield indices, self._score(features)
+
+    def grid_summary(self, grid, base=None, bins=50):
+        """
+        Scores every point of a Cartesian grid and summarizes the results.
+
+        The full grid is never materialized; each chunk is folded into per-feature
+        marginal statistics and a score histogram before the next one is built.
+
+        Parameters:
+            grid (dict): Maps feature names to the values to sweep.
+            base (dict): Values for features that are not part of the grid.
+            bins (int): Number of histogram bins over the 0-100 score range.
+
+        Returns:
+            dict: Overall score statistics, a histogram and, for every grid feature,
+                the mean, min and max score at each of its values.
+        """
+        axes, values, fixed = self._resolve(grid, base)
+        sums = [np.zeros(len(v)) for v in values]
+        mins = [np.full(len(v), np.inf) for v in values]
+        maxs = [np.full(len(v), -np.inf) for v in values]
+        histogram = np.zeros(bins, dtype=np.int64)
+        edges = np.linspace(0, 100, bins + 1)
+        count, total, lowest, highest = 0, 0.0, np.inf, -np.inf
+
+        for indices, scores in self._iter_chunks(axes, values, fixed):
+            for axis, axis_indices in enumerate(indices):
+                sums[axis] += np.bincount(axis_indices, weights=scores, minlength=len(values[axis]))
+                np.minimum.at(mins[axis], axis_indices, scores)
+                np.maximum.at(maxs[axis], axis_indices, scores)
+            histogram += np.histogram(np.clip(scores, 0, 100), bins=edges)[0]
+            count += len(scores)
+            total += float(scores.sum())
+            lowest = min(lowest, float(scores.min()))
+            highest = max(highest, float(scores.max()))
+
+        marginals = {}
+        for axis, name in enumerate(axes):
+            points_per_value = count // len(values[axis])
+            marginals[name] = {
+                'values': values[axis].tolist(),
+                'mean': (sums[axis] / points_per_value).tolist(),
+                'min': mins[axis].tolist(),
+                'max': maxs[axis].tolist()
+            }
+
+        return {
+            'points': count,
+            'mean': total / count,
+            'min': lowest,
+            'max': highest,
+            'histogram': {'edges': edges.tolist(), 'counts': histogram.tolist()},
+            'marginals': marginals
+        }
+
+    def what_if(self, farmer, grid, max_points=10000):
+        """
+        Scores one farmer across a grid of alternative feature values.
+
+        Parameters:
+            farmer (dict): The farmer's current value for every model feature; other
+                keys, such as a name or id, are ignored.
+            grid (dict): Maps the features to vary to the values to try.
+            max_points (int): Largest grid accepted in a single call.
+
+        Returns:
+            dict: The farmer's base score and, for every grid combination, the score
+                and its change from the base score as nested lists indexed by the
+                grid features in 'features' order.
+        """
+        missing = [name for name in FEATURE_NAMES if name not in farmer]
+        if missing:
+            raise ValueError(f"Missing farmer features: {missing}")
+        farmer = {name: farmer[name] for name in FEATURE_NAMES}
+        axes, values, fixed = self._resolve(grid, farmer)
+        shape = tuple(len(v) for v in values)
+        if int(np.prod(shape)) > max_points:
+            raise ValueError(f"Grid has more than {max_points} points")
+
+        base_features = np.array([[float(farmer[name]) for name in FEATURE_NAMES]])
+        base_score = float(self._score(base_features)[0])
+        scores = np.concatenate([chunk_scores for _, chunk_scores in self._iter_chunks(axes, values, fixed)])
+        scores = scores.reshape(shape)
+
+        return {
+            'base_score': base_score,
+            'features': axes,
+            'values': {name: v.tolist() for name, v in zip(axes, values)},
+            'scores': scores.tolist(),
+            'deltas': (scores - base_score).tolist()
+        }
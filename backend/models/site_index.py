@@ -0,0 +1,118 @@
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+SOIL_FEATURES = ['PHAQ', 'TOTC', 'TOTN', 'CECS']
+WEATHER_FEATURES = ['TEMP', 'RAIN', 'HUMI', 'SUNH']
+SITE_FEATURES = SOIL_FEATURES + WEATHER_FEATURES
+# The crop models' training table, whose sites are all in Cuba
+DEFAULT_SITE_TABLE = os.path.join(os.path.dirname(__file__), '..', 'data', 'soil_climate_yield_data.csv')
+
+
+class SiteIndex:
+    """
+    Ball tree over measured sites, estimating model features at any location.
+
+    Estimates are the inverse-distance weighted mean of the k nearest sites, using
+    great-circle distances. They are in the units of the site tables, which are the
+    units the crop models were trained on.
+
+    Attributes:
+        latitudes (ndarray): Latitude of every site.
+        longitudes (ndarray): Longitude of every site.
+        features (ndarray): Feature values of every site, in SITE_FEATURES order.
+        max_distance_km (float): Locations whose nearest site is further away get no
+            estimate.
+    """
+    def __init__(self, latitudes, longitudes, features, max_distance_km=100.0):
+        """
+        Initializes the SiteIndex.
+
+        Parameters:
+            latitudes (array-like): Latitude of every site.
+            longitudes (array-like): Longitude of every site.
+            features (array-like): Array of shape (sites, len(SITE_FEATURES)).
+            max_distance_km (float): Largest distance to the nearest site for which
+                an estimate is returned.
+        """
+        from sklearn.neighbors import BallTree
+
+        self.latitudes = np.asarray(latitudes, dtype=float)
+        self.longitudes = np.asarray(longitudes, dtype=float)
+        self.features = np.asarray(features, dtype=float)
+        if self.features.shape != (len(self.latitudes), len(SITE_FEATURES)) or len(self.latitudes) == 0:
+            raise ValueError(f"Expected features of shape (sites, {len(SITE_FEATURES)}) for at least one site")
+        self.max_distance_km = max_distance_km
+        self._tree = BallTree(np.radians(np.column_stack([self.latitudes, self.longitudes])), metric='haversine')
+
+    @classmethod
+    def from_csv(cls, paths, max_distance_km=100.0):
+        """
+        Builds an index from one or more site tables.
+
+        Every table needs LATI and LNGI columns plus the SITE_FEATURES columns. Rows
+        sharing coordinates, such as repeated samples of one site, are averaged into
+        a single site, and missing values are filled with the column mean.
+
+        Parameters:
+            paths (list): Paths of CSV site tables.
+            max_distance_km (float): See SiteIndex.
+
+        Returns:
+            SiteIndex: The index over every site in the tables.
+        """
+        import pandas as pd
+        columns = ['LATI', 'LNGI'] + SITE_FEATURES
+        sites = pd.concat([pd.read_csv(path, usecols=columns) for path in paths], ignore_index=True)
+        sites = sites.dropna(subset=['LATI', 'LNGI'])
+        sites = sites.fillna(sites[SITE_FEATURES].mean()).groupby(['LATI', 'LNGI'], as_index=False).mean()
+        logger.info("Indexed %s sites from %s", len(sites), paths)
+        return cls(sites['LATI'], sites['LNGI'], sites[SITE_FEATURES].to_numpy(), max_distance_km)
+
+    def __len__(self):
+        return len(self.latitudes)
+
+    def estimate_batch(self, latitudes, longitudes, k=5, power=2.0):
+        """
+        Estimates the features at a batch of locations.
+
+        Parameters:
+            latitudes (array-like): Latitudes of the locations.
+            longitudes (array-like): Longitudes of the locations.
+            k (int): Number of nearest sites averaged.
+            power (float): Exponent of the inverse-distance weights.
+
+        Returns:
+            tuple: Estimates of shape (locations, len(SITE_FEATURES)), NaN for locations
+                beyond max_distance_km, and the distance in km to the nearest site.
+        """
+        points = np.radians(np.column_stack([np.atleast_1d(latitudes), np.atleast_1d(longitudes)]).astype(float))
+        distances, indices = self._tree.query(points, k=min(k, len(self)))
+        distances = distances * EARTH_RADIUS_KM
+
+        # A site at the location itself gets all the weight
+        weights = 1.0 / np.maximum(distances, 1e-6) ** power
+        weights /= weights.sum(axis=1, keepdims=True)
+        estimates = np.einsum('pk,pkf->pf', weights, self.features[indices])
+        nearest = distances[:, 0]
+        if self.max_distance_km is not None:
+            estimates[nearest > self.max_distance_km] = np.nan
+        return estimates, nearest
+
+    def estimate(self, latitude, longitude, k=5, power=2.0):
+        """
+        Estimates the features at one location.
+
+        Returns:
+            dict: Feature name to estimated value, or None if the nearest site is
+                beyond max_distance_km.
+        """
+        estimates, nearest = self.estimate_batch([latitude], [longitude], k, power)
+        if np.isnan(estimates[0]).any():
+            logger.warning("Nearest site to (%s, %s) is %.0f km away; no estimate", latitude, longitude, nearest[0])
+            return None
+        return dict(zip(SITE_FEATURES, estimates[0].tolist()))
@@ -0,0 +1,231 @@
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Properties read by DataPreparer, at the only depth it uses
+SOIL_PROPERTIES = ['phh2o', 'soc', 'nitrogen', 'cec']
+DEPTH = '0-5cm'
+HEADER_FILE = 'header.json'
+
+# SoilGrids serves integers in mapped units; dividing by a property's d_factor gives
+# the conventional units of the site tables the crop models were trained on: pH,
+# g/kg of organic carbon, g/kg of nitrogen and cmol(c)/kg
+D_FACTORS = {'phh2o': 10, 'soc': 10, 'nitrogen': 100, 'cec': 10}
+
+
+def write_raster(tile_dir, prop, values, west, north, cell_size, tile_size=1024, nodata=None):
+    """
+    Splits a north-up lat/lon raster into .npy tiles and records it in the header.
+
+    Parameters:
+        tile_dir (str): Directory holding the tiles and their header.
+        prop (str): Soil property, such as 'phh2o'.
+        values (ndarray): 2D array whose first row is the northernmost, in SoilGrids
+            mapped units.
+        west (float): Longitude of the western edge of the raster.
+        north (float): Latitude of the northern edge of the raster.
+        cell_size (float): Pixel size in degrees.
+        tile_size (int): Width and height of a tile in pixels.
+        nodata (float): Value marking pixels without data; stored as NaN.
+
+    Returns:
+        dict: The georeferencing entry written to the header.
+    """
+    values = np.asarray(values, dtype=np.float32)
+    if nodata is not None:
+        values = np.where(values == nodata, np.float32(np.nan), values)
+    rows, cols = values.shape
+    os.makedirs(os.path.join(tile_dir, prop), exist_ok=True)
+    for top in range(0, rows, tile_size):
+        for left in range(0, cols, tile_size):
+            np.save(os.path.join(tile_dir, prop, f'{top // tile_size}_{left // tile_size}.npy'),
+                    values[top:top + tile_size, left:left + tile_size])
+
+    header_path = os.path.join(tile_dir, HEADER_FILE)
+    header = {'depth': DEPTH, 'properties': {}}
+    if os.path.exists(header_path):
+        with open(header_path) as f:
+            header = json.load(f)
+    entry = {'west': float(west), 'north': float(north), 'cell_size': float(cell_size),
+             'rows': rows, 'cols': cols, 'tile_size': tile_size}
+    header['properties'][prop] = entry
+    with open(header_path, 'w') as f:
+        json.dump(header, f, indent=2)
+    return entry
+
+
+def to_model_units(values):
+    """
+    Converts soil properties from SoilGrids mapped units into model units.
+
+    Parameters:
+        values (array-like): Values whose last axis is in SOIL_PROPERTIES order.
+
+    Returns:
+        ndarray: The values divided by the d_factor of their property.
+    """
+    return np.asarray(values, dtype=float) / np.array([D_FACTORS[prop] for prop in SOIL_PROPERTIES], dtype=float)
+
+
+class SoilRaster:
+    """
+    One soil property stored as memory-mapped tiles of a north-up lat/lon raster.
+
+    Tiles are opened on first use and kept open, so a query only reads the pages
+    holding the pixels it samples.
+
+    Attributes:
+        tile_dir (str): Directory holding the property's tiles.
+        west (float): Longitude of the western edge of the raster.
+        north (float): Latitude of the northern edge of the raster.
+        cell_size (float): Pixel size in degrees.
+        rows (int): Height of the raster in pixels.
+        cols (int): Width of the raster in pixels.
+        tile_size (int): Width and height of a tile in pixels.
+    """
+    def __init__(self, tile_dir, west, north, cell_size, rows, cols, tile_size):
+        self.tile_dir = tile_dir
+        self.west = west
+        self.north = north
+        self.cell_size = cell_size
+        self.rows = rows
+        self.cols = cols
+        self.tile_size = tile_size
+        self._tiles = {}
+        self._lock = threading.Lock()
+
+    def _tile(self, key):
+        tile = self._tiles.get(key)
+        if tile is None:
+            with self._lock:
+                tile = self._tiles.get(key)
+                if tile is None:
+                    tile = np.load(os.path.join(self.tile_dir, f'{key[0]}_{key[1]}.npy'), mmap_mode='r')
+                    self._tiles[key] = tile
+        return tile
+
+    def sample(self, latitudes, longitudes):
+        """
+        Reads the pixels containing each point.
+
+        Parameters:
+            latitudes (ndarray): Latitudes of the points.
+            longitudes (ndarray): Longitudes of the points.
+
+        Returns:
+            ndarray: Pixel values, NaN for points without data or outside the raster.
+        """
+        rows = np.floor((self.north - latitudes) / self.cell_size).astype(np.int64)
+        cols = np.floor((longitudes - self.west) / self.cell_size).astype(np.int64)
+        result = np.full(len(rows), np.nan)
+        inside = (rows >= 0) & (rows < self.rows) & (cols >= 0) & (cols < self.cols)
+        if not inside.any():
+            return result
+
+        # Points are grouped by tile so that each tile is indexed once per query
+        tile_rows, tile_cols = rows // self.tile_size, cols // self.tile_size
+        points = np.flatnonzero(inside)
+        keys = tile_rows[points] * (self.cols // self.tile_size + 1) + tile_cols[points]
+        for key in np.unique(keys):
+            group = points[keys == key]
+            tile = self._tile((int(tile_rows[group[0]]), int(tile_cols[group[0]])))
+            result[group] = tile[rows[group] % self.tile_size, cols[group] % self.tile_size]
+        return result
+
+
+class RasterSoilDataFetcher:
+    """
+    Soil data backend reading locally stored SoilGrids rasters instead of the REST API.
+
+    Answers the same fetch_soil_data calls as SoilDataFetcher, plus batch queries,
+    from tiles written by training/ingest_soil_rasters.py, without any network
+    access. Values are in SoilGrids mapped units, like the API returns them.
+
+    Attributes:
+        tile_dir (str): Directory holding the tiles and their header.
+        rasters (dict): Soil property name to its SoilRaster.
+    """
+    def __init__(self, tile_dir):
+        """
+        Initializes the RasterSoilDataFetcher.
+
+        Parameters:
+            tile_dir (str): Directory holding the tiles and their header.
+        """
+        with open(os.path.join(tile_dir, HEADER_FILE)) as f:
+            header = json.load(f)
+        missing = [prop for prop in SOIL_PROPERTIES if prop not in header['properties']]
+        if missing:
+            raise ValueError(f"Soil rasters in {tile_dir} are missing properties: {missing}")
+        self.tile_dir = tile_dir
+        self.rasters = {
+            prop: SoilRaster(os.path.join(tile_dir, prop), **header['properties'][prop])
+            for prop in SOIL_PROPERTIES
+        }
+
+    @property
+    def columns(self):
+        return [f'{prop}_{DEPTH}_mean' for prop in SOIL_PROPERTIES]
+
+    def query(self, latitudes, longitudes):
+        """
+        Reads every soil property at a batch of points.
+
+        Parameters:
+            latitudes (array-like): Latitudes of the points.
+            longitudes (array-like): Longitudes of the points.
+
+        Returns:
+            ndarray: Array of shape (points, properties) in SOIL_PROPERTIES order,
+                NaN where a raster has no data.
+        """
+        latitudes = np.atleast_1d(np.asarray(latitudes, dtype=float))
+        longitudes = np.atleast_1d(np.asarray(longitudes, dtype=float))
+        return np.column_stack([self.rasters[prop].sample(latitudes, longitudes) for prop in SOIL_PROPERTIES])
+
+    def fetch_soil_data_batch(self, latitudes, longitudes):
+        """
+        Reads the soil properties of a batch of points.
+
+        Returns:
+            DataFrame: One row per point with the columns used by DataPreparer.
+        """
+        import pandas as pd
+        return pd.DataFrame(self.query(latitudes, longitudes), columns=self.columns)
+
+    def fetch_soil_data(self, latitude, longitude, radius=0.5, max_attempts=10, step=0.05, deadline=None):
+        """
+        Reads soil data at a point, or at the nearest of the points around it with data.
+
+        Like SoilDataFetcher, the neighbourhood is a grid of offsets of the given step
+        within radius, but it is tried nearest first and in a single batch.
+
+        Parameters:
+            latitude (float): Latitude of the location.
+            longitude (float): Longitude of the location.
+            radius (float): Largest offset tried in either direction.
+            max_attempts (int): Maximum number of points tried.
+            step (float): Spacing between the offsets tried.
+            deadline (float): Accepted for compatibility with SoilDataFetcher; local
+                reads do not wait on anything.
+
+        Returns:
+            DataFrame: Single-row DataFrame of soil properties, or None if no point
+                tried has data for every property.
+        """
+        shifts = np.arange(-radius, radius + step / 2, step) if radius > 0 else np.zeros(1)
+        lat_shifts, lon_shifts = (axis.ravel() for axis in np.meshgrid(shifts, shifts, indexing='ij'))
+        order = np.argsort(lat_shifts ** 2 + lon_shifts ** 2, kind='stable')[:max_attempts]
+        values = self.query(latitude + lat_shifts[order], longitude + lon_shifts[order])
+
+        valid = np.flatnonzero(~np.isnan(values).any(axis=1))
+        if len(valid) == 0:
+            logger.error("No raster soil data within %s degrees of (%s, %s).", radius, latitude, longitude)
+            return None
+        import pandas as pd
+        return pd.DataFrame(values[valid[:1]], columns=self.columns)
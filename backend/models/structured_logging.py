@@ -0,0 +1,250 @@
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+from .metrics import REGISTRY
+
+LOG_RECORDS_DROPPED = REGISTRY.counter(
+    'farmai_log_records_dropped_total', 'Log records dropped because the log queue was full.')
+
+# Correlation id of the request being handled on the current thread or task
+request_id_var = contextvars.ContextVar('request_id', default='-')
+
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+def get_request_id():
+    return request_id_var.get()
+
+
+def set_request_id(request_id):
+    """
+    Sets the correlation id attached to every record logged from the current context.
+
+    Returns:
+        Token: Pass to request_id_var.reset() to restore the previous id.
+    """
+    return request_id_var.set(request_id)
+
+
+def log_payload(logger, message, payload, level=logging.INFO, **fields):
+    """
+    Logs a request or response payload, subject to the logger's sampling rate.
+
+    The payload is attached to the record unserialized; it is only converted to
+    text, and truncated, by the formatter on the logging thread.
+
+    Parameters:
+        logger (Logger): The logger to emit the record on.
+        message (str): A short description of the payload.
+        payload (object): Any JSON-serializable object.
+        level (int): Logging level of the record.
+        fields: Extra key-value pairs to include in the record.
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, message, extra=dict(fields, payload=payload))
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    Stamps records with the correlation id of the context that logged them.
+    """
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class PayloadSampler(logging.Filter):
+    """
+    Drops a fraction of payload-carrying records and sets their size cap.
+
+    Rates and caps are looked up by the longest configured prefix of the logger name.
+
+    Attributes:
+        rates (dict): Logger name prefix to the fraction of payload records kept.
+        max_bytes (dict): Logger name prefix to the maximum serialized payload size.
+        default_rate (float): Rate for loggers without a configured prefix.
+        default_max_bytes (int): Size cap for loggers without a configured prefix.
+    """
+    def __init__(self, rates=None, max_bytes=None, default_rate=1.0, default_max_bytes=2048):
+        super().__init__()
+        self.rates = rates or {}
+        self.max_bytes = max_bytes or {}
+        self.default_rate = default_rate
+        self.default_max_bytes = default_max_bytes
+
+    @staticmethod
+    def _lookup(table, name, default):
+        while name:
+            if name in table:
+                return table[name]
+            name = name.rpartition('.')[0]
+        return table.get('', default)
+
+    def filter(self, record):
+        if not hasattr(record, 'payload'):
+            return True
+        rate = self._lookup(self.rates, record.name, self.default_rate)
+        if rate < 1.0 and random.random() >= rate:
+            return False
+        record.payload_max_bytes = self._lookup(self.max_bytes, record.name, self.default_max_bytes)
+        return True
+
+
+class KeyValueFormatter(logging.Formatter):
+    """
+    Formats records as a single line of key=value pairs.
+
+    Standard fields come first (ts, level, logger, request_id, msg), followed by any
+    extra fields passed to the logging call and finally the payload, serialized as
+    JSON and truncated to the record's size cap.
+    """
+    def format(self, record):
+        pairs = [
+            ('ts', self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f'.{int(record.msecs):03d}'),
+            ('level', record.levelname),
+            ('logger', record.name),
+            ('request_id', getattr(record, 'request_id', '-')),
+            ('msg', record.getMessage())
+        ]
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and key not in ('request_id', 'payload', 'payload_max_bytes'):
+                pairs.append((key, value))
+        if hasattr(record, 'payload'):
+            pairs.append(('payload', self._serialize(record.payload, getattr(record, 'payload_max_bytes', None))))
+
+        line = ' '.join(f'{key}={self._quote(value)}' for key, value in pairs)
+        if record.exc_text:
+            line += ' exc=' + self._quote(record.exc_text)
+        return line
+
+    @staticmethod
+    def _serialize(payload, max_bytes):
+        try:
+            text = json.dumps(payload, default=str, separators=(',', ':'))
+        except (TypeError, ValueError):
+            text = repr(payload)
+        if max_bytes is not None and len(text) > max_bytes:
+            text = f'{text[:max_bytes]}...<{len(text) - max_bytes} more bytes>'
+        return text
+
+    @staticmethod
+    def _quote(value):
+        text = str(value)
+        if text and not any(c in text for c in ' "=\n'):
+            return text
+        return '"' + text.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+
+
+class AsyncQueueHandler(QueueHandler):
+    """
+    Hands records to a background listener through a bounded queue.
+
+    Only the message itself is rendered on the calling thread; payloads and the
+    final line are formatted by the listener. Records are dropped, and counted,
+    rather than blocking the caller when the queue is full.
+    """
+    def prepare(self, record):
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+_state = {'listener': None, 'handler': None}
+_state_lock = threading.Lock()
+
+
+def _parse_rates(spec):
+    rates = {}
+    for item in filter(None, (part.strip() for part in (spec or '').split(','))):
+        name, _, value = item.partition('=')
+        rates[name.strip() if name.strip() != 'root' else ''] = float(value)
+    return rates
+
+
+def _start_listener(handler, output_handlers, queue_size):
+    handler.queue = queue.Queue(maxsize=queue_size)
+    listener = QueueListener(handler.queue, *output_handlers, respect_handler_level=True)
+    listener.start()
+    _state['listener'] = listener
+
+
+def configure_logging(level=None, stream=None, sample_rates=None, payload_max_bytes=None, queue_size=10000):
+    """
+    Routes all logging through a queue to a background thread writing key=value lines.
+
+    Settings not passed in are read from LOG_LEVEL, LOG_PAYLOAD_SAMPLING (for
+    example 'app=0.1,models=0.01') and LOG_PAYLOAD_MAX_BYTES. Calling it again
+    replaces the previous configuration. Forked children restart the listener,
+    since the parent's logging thread does not survive the fork.
+
+    Parameters:
+        level (str or int): Root logging level.
+        stream (file): Where log lines are written; defaults to stderr.
+        sample_rates (dict): Logger name prefix to the fraction of payloads kept.
+        payload_max_bytes (int): Maximum serialized payload size.
+        queue_size (int): Records buffered before new ones are dropped.
+
+    Returns:
+        QueueListener: The running listener.
+    """
+    level = level or os.getenv('LOG_LEVEL', 'INFO')
+    sample_rates = sample_rates if sample_rates is not None else _parse_rates(os.getenv('LOG_PAYLOAD_SAMPLING', ''))
+    if payload_max_bytes is None:
+        payload_max_bytes = int(os.getenv('LOG_PAYLOAD_MAX_BYTES', 2048))
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(KeyValueFormatter())
+
+    with _state_lock:
+        shutdown_logging()
+        handler = AsyncQueueHandler(None)
+        handler.addFilter(RequestContextFilter())
+        handler.addFilter(PayloadSampler(sample_rates, default_max_bytes=payload_max_bytes))
+        _start_listener(handler, [output], queue_size)
+        _state['handler'] = handler
+        _state['outputs'] = [output]
+        _state['queue_size'] = queue_size
+
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(handler)
+        root.setLevel(level)
+    return _state['listener']
+
+
+def shutdown_logging():
+    """
+    Stops the listener after it has written every queued record.
+    """
+    listener = _state.get('listener')
+    if listener is not None:
+        listener.stop()
+        _state['listener'] = None
+
+
+def _restart_after_fork():
+    if _state.get('handler') is not None:
+        _start_listener(_state['handler'], _state['outputs'], _state['queue_size'])
+
+
+os.register_at_fork(after_in_child=_restart_after_fork)
+atexit.register(shutdown_logging)
@@ -0,0 +1,126 @@
+"""
+Production entry point: a pre-forking WSGI server for the FarmAI backend.
+
+The parent process builds the app, loads every model once and freezes the garbage
+collector so the loaded objects stay in pages shared copy-on-write with the workers.
+It then binds the listening socket and forks the workers, which all accept from that
+socket. With MODEL_ARTIFACT_DIR set, every worker watches for newly activated model
+versions and swaps them in on its own. Workers that exit are replaced; SIGTERM or SIGINT stops them all.
+
+Usage:
+    python serve.py --host 0.0.0.0 --port 5000 --workers 4 --threads 8
+
+WEB_CONCURRENCY and WEB_THREADS set the defaults for --workers and --threads.
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+from werkzeug.serving import make_server
+
+from app import create_app
+from models.model_store import MODEL_STORE
+
+
+def bind_socket(host, port, backlog=2048):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock, threads):
+    """Serve requests from the inherited socket until told to stop."""
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    MODEL_STORE.start_watcher()
+    host, port = sock.getsockname()[:2]
+    server = make_server(host, port, app, threaded=threads > 1, fd=sock.fileno())
+    server.serve_forever()
+
+
+class PreforkServer:
+    """
+    Supervises a fixed number of forked workers sharing one listening socket.
+
+    Attributes:
+        app (Flask): The application served by every worker.
+        sock (socket): The bound listening socket.
+        workers (int): Number of worker processes to keep running.
+        threads (int): Request threads per worker; 1 serves requests serially.
+    """
+    def __init__(self, app, sock, workers, threads):
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.threads = threads
+        self.children = set()
+        self.stopping = False
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(self.app, self.sock, self.threads)
+            finally:
+                os._exit(0)
+        self.children.add(pid)
+        return pid
+
+    def stop(self, signum=None, frame=None):
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for _ in range(self.workers):
+            self.spawn()
+        logging.info(f"Serving on {self.sock.getsockname()} with workers {sorted(self.children)}")
+
+        while self.children:
+            try:
+                pid, _ = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            self.children.discard(pid)
+            if not self.stopping:
+                logging.warning(f"Worker {pid} exited, starting a replacement")
+                time.sleep(0.1)
+                self.spawn()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the FarmAI backend with pre-forked workers.')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=int(os.getenv('PORT', 5000)))
+    parser.add_argument('--workers', type=int, default=int(os.getenv('WEB_CONCURRENCY', os.cpu_count() or 1)))
+    parser.add_argument('--threads', type=int, default=int(os.getenv('WEB_THREADS', 4)))
+    args = parser.parse_args(argv)
+
+    app = create_app(preload_models=True, watch_models=False)
+    # Move everything loaded so far out of the collector's reach so that collections
+    # in the workers do not write to, and therefore copy, the shared model pages.
+    gc.collect()
+    gc.freeze()
+
+    sock = bind_socket(args.host, args.port)
+    PreforkServer(app, sock, args.workers, args.threads).run()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
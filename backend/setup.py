@@ -16,4 +16,7 @@ setup(
         'python-dotenv',
         'openai',
     ],
+    extras_require={
+        'asgi': ['uvicorn', 'httpx', 'asgiref'],
+    },
 )
\ No newline at end of file
@@ -0,0 +1,132 @@
+"""
+Precompute per-hectare fertilizer requirements over a lat/lon grid.
+
+Walks every grid point of a bounding box, fetches its soil and weather data with
+the same fetchers as the live pipeline, predicts the yield of every crop in one
+batch per crop and stores the resulting N, P2O5 and K2O requirements as a new
+version of a memory-mapped RecommendationGrid in the output directory. Point
+RECOMMENDATION_GRID_PATH at the directory to have /fertilizer_recommendation
+answer covered locations from its active version. Its upstream
+calls share the host's rate limits with the servers, at batch priority.
+
+Usage:
+    python build_recommendation_grid.py --bbox -1.5 29.5 1.5 35.0 --step 0.05 --output recommendation_grid
+"""
+import argparse
+import logging
+import os
+import shutil
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from models.fertilizer_recomm_oo import SoilDataFetcher, WeatherDataFetcher, DataPreparer, FertilizerCalculator
+from models.model_store import CROP_MODEL_FILES, MODEL_STORE
+from models.recommendation_grid import (GRID_NAME, RecommendationGrid, active_grid, new_grid_version,
+                                       publish_grid_version)
+from models.scheduler import BATCH, configure_scheduler, outbound_priority
+
+logger = logging.getLogger('build_recommendation_grid')
+
+
+def build_grid(output, min_lat, min_lon, max_lat, max_lon, step, crops, api_key,
+               soil_fetcher=None, weather_fetcher=None):
+    """
+    Builds a recommendation grid and publishes it as the active version of output.
+
+    The grid is written into a staging directory and published once complete,
+    so servers that have the previous grid mapped keep reading it undisturbed
+    until they switch to the new one.
+
+    Parameters:
+        output (str): Directory holding the versions of the grid.
+        min_lat, min_lon, max_lat, max_lon (float): Bounding box of the grid.
+        step (float): Spacing between grid points in degrees.
+        crops (list): Crops to precompute.
+        api_key (str): OpenWeatherMap API key.
+        soil_fetcher (SoilDataFetcher): Fetcher used for soil data; defaults to the
+            offline soil rasters if SOIL_RASTER_DIR is set, else the SoilGrids API.
+        weather_fetcher (WeatherDataFetcher): Fetcher used for weather data.
+
+    Returns:
+        dict: Number of grid points and how many of them are covered per crop.
+    """
+    soil_fetcher = soil_fetcher or MODEL_STORE.get_soil_rasters() or SoilDataFetcher()
+    weather_fetcher = weather_fetcher or WeatherDataFetcher()
+    n_lat = int(round((max_lat - min_lat) / step)) + 1
+    n_lon = int(round((max_lon - min_lon) / step)) + 1
+
+    version, staging = new_grid_version(output)
+    try:
+        grid = RecommendationGrid.create(os.path.join(staging, GRID_NAME), min_lat, min_lon, step, n_lat, n_lon,
+                                         crops)
+        latitudes, longitudes = grid.coordinates()
+
+        cells, rows = [], []
+        with outbound_priority(BATCH):
+            for i, latitude in enumerate(latitudes):
+                for j, longitude in enumerate(longitudes):
+                    # Only look around the point within its own cell, so that every cell is
+                    # described by soil from inside it
+                    soil_df = soil_fetcher.fetch_soil_data(latitude, longitude, radius=step / 2, step=step / 4)
+                    if soil_df is None:
+                        continue
+                    weather_data = weather_fetcher.fetch_weather_data(latitude, longitude, api_key)
+                    if not weather_data:
+                        continue
+                    prepared_df = DataPreparer.prepare_data_for_model(soil_df, weather_data)
+                    if prepared_df is not None:
+                        cells.append((i, j))
+                        rows.append(prepared_df)
+                logger.info("Fetched row %s/%s: %s points with data so far", i + 1, n_lat, len(cells))
+
+        covered = {}
+        if rows:
+            import pandas as pd
+            features = pd.concat(rows, ignore_index=True)
+            cell_rows, cell_columns = (np.array(axis) for axis in zip(*cells))
+            calculator = FertilizerCalculator()
+            for crop_index, crop in enumerate(grid.crops):
+                requirements_per_ha = calculator.predict_requirements_per_ha(features, crop)
+                if requirements_per_ha is not None:
+                    grid.values[cell_rows, cell_columns, crop_index] = requirements_per_ha
+                    covered[crop] = len(cells)
+        grid.flush()
+        del grid
+
+        publish_grid_version(output, version, staging)
+    except BaseException:
+        # A failed or interrupted build must not leave its partial grid behind
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return {'points': n_lat * n_lon, 'covered': covered}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Precompute fertilizer requirements over a lat/lon grid.')
+    parser.add_argument('--bbox', type=float, nargs=4, required=True,
+                        metavar=('MIN_LAT', 'MIN_LON', 'MAX_LAT', 'MAX_LON'))
+    parser.add_argument('--step', type=float, default=0.05, help='Grid spacing in degrees')
+    parser.add_argument('--crops', nargs='+', default=list(CROP_MODEL_FILES))
+    parser.add_argument('--output', default=os.getenv('RECOMMENDATION_GRID_PATH', 'recommendation_grid'))
+    parser.add_argument('--api-key', default=os.getenv('WEATHER_API_KEY'))
+    args = parser.parse_args(argv)
+
+    if not args.api_key:
+        parser.error('An OpenWeatherMap API key is required (--api-key or WEATHER_API_KEY)')
+    min_lat, min_lon, max_lat, max_lon = args.bbox
+    if min_lat > max_lat or min_lon > max_lon or args.step <= 0:
+        parser.error('Invalid bounding box or step')
+
+    logging.basicConfig(level=logging.INFO)
+    configure_scheduler()
+    summary = build_grid(args.output, min_lat, min_lon, max_lat, max_lon, args.step, args.crops, args.api_key)
+    array_path = RecommendationGrid.paths(active_grid(args.output)[0])[0]
+    print(f"Wrote {array_path}: {summary['points']} grid points, covered {summary['covered']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""
+Build offline soil raster tiles from downloaded SoilGrids rasters.
+
+Takes one 0-5 cm mean raster per soil property, in SoilGrids mapped units and
+reprojected to lat/lon (EPSG:4326), and writes it as memory-mapped .npy tiles with
+a georeferencing header that RasterSoilDataFetcher reads. ESRI ASCII grids (.asc)
+are read natively; GeoTIFFs require rasterio.
+
+Usage:
+    python ingest_soil_rasters.py --output /data/soil_tiles \
+        phh2o=phh2o_0-5cm_mean.tif soc=soc_0-5cm_mean.tif \
+        nitrogen=nitrogen_0-5cm_mean.tif cec=cec_0-5cm_mean.tif
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from models.soil_raster import SOIL_PROPERTIES, write_raster
+
+
+def read_ascii_grid(path):
+    """
+    Reads an ESRI ASCII grid.
+
+    Returns:
+        tuple: The values with the northernmost row first, the western and northern
+            edges of the raster, its cell size and its nodata value.
+    """
+    header = {}
+    with open(path) as f:
+        while True:
+            position = f.tell()
+            line = f.readline()
+            key = line.split()[0].lower() if line.strip() else ''
+            if not key or not key[0].isalpha():
+                f.seek(position)
+                break
+            header[key] = float(line.split()[1])
+        values = np.loadtxt(f, dtype=np.float32, ndmin=2)
+
+    rows, cols, cell_size = int(header['nrows']), int(header['ncols']), header['cellsize']
+    if values.shape != (rows, cols):
+        raise ValueError(f"{path}: expected {rows}x{cols} values, found {values.shape[0]}x{values.shape[1]}")
+    # Corners may be given for the lower left pixel's corner or its centre
+    west = header['xllcorner'] if 'xllcorner' in header else header['xllcenter'] - cell_size / 2
+    south = header['yllcorner'] if 'yllcorner' in header else header['yllcenter'] - cell_size / 2
+    return values, west, south + rows * cell_size, cell_size, header.get('nodata_value')
+
+
+def read_geotiff(path):
+    """
+    Reads a single-band lat/lon GeoTIFF with rasterio.
+
+    Returns:
+        tuple: Same as read_ascii_grid.
+    """
+    try:
+        import rasterio
+    except ImportError:
+        raise SystemExit(f"{path}: reading GeoTIFFs requires rasterio; install it or convert the raster to ESRI ASCII")
+    with rasterio.open(path) as dataset:
+        if dataset.crs is not None and dataset.crs.to_epsg() != 4326:
+            raise ValueError(f"{path}: expected an EPSG:4326 raster, found {dataset.crs}")
+        transform = dataset.transform
+        if transform.b != 0 or transform.d != 0 or transform.a != -transform.e:
+            raise ValueError(f"{path}: expected a north-up raster with square pixels")
+        return dataset.read(1), transform.c, transform.f, transform.a, dataset.nodata
+
+
+def read_raster(path):
+    if path.lower().endswith('.asc'):
+        return read_ascii_grid(path)
+    return read_geotiff(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build offline soil raster tiles.')
+    parser.add_argument('rasters', nargs='+', metavar='PROPERTY=PATH',
+                        help=f"One raster per property: {', '.join(SOIL_PROPERTIES)}")
+    parser.add_argument('--output', default=os.getenv('SOIL_RASTER_DIR', 'soil_tiles'))
+    parser.add_argument('--tile-size', type=int, default=1024, help='Tile width and height in pixels')
+    args = parser.parse_args(argv)
+
+    rasters = dict(item.split('=', 1) for item in args.rasters)
+    unknown = sorted(set(rasters) - set(SOIL_PROPERTIES))
+    if unknown:
+        parser.error(f"Unknown soil properties: {unknown}")
+
+    for prop, path in rasters.items():
+        values, west, north, cell_size, nodata = read_raster(path)
+        entry = write_raster(args.output, prop, values, west, north, cell_size, args.tile_size, nodata)
+        print(f"{prop}: {entry['rows']}x{entry['cols']} pixels of {cell_size} degrees from ({north}, {west})")
+
+    missing = [prop for prop in SOIL_PROPERTIES if not os.path.exists(os.path.join(args.output, prop))]
+    if missing:
+        print(f"Still missing before the tiles can be served: {', '.join(missing)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""
+Manage versioned model artifacts served with MODEL_ARTIFACT_DIR.
+
+Running servers swap in the active version within MODEL_WATCH_INTERVAL seconds of
+it changing, without a restart.
+
+Usage:
+    python model_artifacts.py publish --activate                 # models in this folder
+    python model_artifacts.py publish --model maize=new/model_maize.joblib --activate
+    python model_artifacts.py list
+    python model_artifacts.py activate 20240601T120000Z
+    python model_artifacts.py rollback
+    python model_artifacts.py verify 20240601T120000Z
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from models.artifacts import ArtifactError, ArtifactRepository
+from models.model_store import CROP_MODEL_FILES, MODELS_DIR
+
+TRAINING_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def default_models():
+    """
+    Returns the model files the trainers write, keyed by model name.
+    """
+    models = {crop: os.path.join(TRAINING_DIR, filename) for crop, filename in CROP_MODEL_FILES.items()}
+    models['credit'] = os.getenv('CREDIT_MODEL_PATH', os.path.join(MODELS_DIR, 'credit_scoring_model.pkl'))
+    return {name: path for name, path in models.items() if os.path.exists(path)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Manage versioned model artifacts.')
+    parser.add_argument('--root', default=os.getenv('MODEL_ARTIFACT_DIR'),
+                        help='Artifact directory; defaults to MODEL_ARTIFACT_DIR')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    publish = commands.add_parser('publish', help='Copy model files into a new version')
+    publish.add_argument('--model', action='append', default=[], metavar='NAME=PATH',
+                         help='Model to include; defaults to every trained model found')
+    publish.add_argument('--version', help='Version name; a UTC timestamp by default')
+    publish.add_argument('--activate', action='store_true')
+    commands.add_parser('list', help='List the versions, marking the active one')
+    activate = commands.add_parser('activate', help='Make a version the active one')
+    activate.add_argument('version')
+    commands.add_parser('rollback', help='Reactivate the previously active version')
+    verify = commands.add_parser('verify', help='Check the checksums of a version')
+    verify.add_argument('version', nargs='?')
+    args = parser.parse_args(argv)
+
+    if not args.root:
+        parser.error('An artifact directory is required (--root or MODEL_ARTIFACT_DIR)')
+    repository = ArtifactRepository(args.root)
+
+    try:
+        if args.command == 'publish':
+            models = dict(item.split('=', 1) for item in args.model) if args.model else default_models()
+            version = repository.publish(models, args.version, base=repository.current_version(),
+                                         activate=args.activate)
+            print(f"Published {version}" + (' and activated it' if args.activate else ''))
+        elif args.command == 'list':
+            current = repository.current_version()
+            for version in repository.list_versions():
+                models = ', '.join(sorted(repository.manifest(version)['models']))
+                print(f"{'*' if version == current else ' '} {version}  {models}")
+        elif args.command == 'activate':
+            repository.activate(args.version)
+            print(f"Activated {args.version}")
+        elif args.command == 'rollback':
+            print(f"Rolled back to {repository.rollback()}")
+        elif args.command == 'verify':
+            version = args.version or repository.current_version()
+            if version is None:
+                raise ArtifactError('No active model version')
+            repository.verify(version)
+            print(f"{version}: all checksums match")
+    except ArtifactError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
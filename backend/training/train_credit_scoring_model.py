@@ -1,3 +1,4 @@
+import argparse
 import numpy as np
 import pandas as pd
 import joblib
@@ -7,7 +8,8 @@ import sys
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
 sys.path.append(project_root)
 
-from backend.models.credit_scoring_model import CreditScoringModel 
+from backend.models.credit_scoring_model import CreditScoringModel, FEATURE_NAMES
+from backend.models.dataset import load_dataset
 
 def calculate_variances(values):
     """
@@ -50,12 +52,19 @@ def generate_synthetic_data(n):
     
     return data
 
-def train_credit_scoring():
+def train_credit_scoring(data_path=None):
     """
-    Main function to train the credit scoring model using synthetic data.
+    Main function to train the credit scoring model.
+
+    Parameters:
+        data_path (str): CSV table of farmer features to train on, read through its
+            columnar cache. Synthetic data is generated when it is not given.
     """
-    # Generate synthetic data
-    data = generate_synthetic_data(1000)
+    if data_path:
+        data = load_dataset(data_path, FEATURE_NAMES)
+    else:
+        # Generate synthetic data
+        data = generate_synthetic_data(1000)
 
     # Initialize model
     model = CreditScoringModel()
@@ -80,4 +89,7 @@ def train_credit_scoring():
     print(f'Model saved to {model_path}')
 
 if __name__ == '__main__':
-    train_credit_scoring()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Train the credit scoring model.')
+    parser.add_argument('--data', help='CSV table of farmer features; synthetic data is used if omitted')
+    args = parser.parse_args()
+    train_credit_scoring(args.data)
\ No newline at end of file
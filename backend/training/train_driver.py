@@ -0,0 +1,264 @@
+"""
+Train the crop yield models in parallel, optionally searching their hyperparameters.
+
+All crops share one train/test split of the soil and climate table. With --search,
+every (crop, n_estimators, max_depth) candidate is fitted in parallel on part of
+the training split and scored on the rest. For each crop, the candidate chosen is
+the one with the fastest single-row prediction among those whose validation RMSE
+is within --tolerance of the best, since the backend predicts one farm at a time.
+The final models are then fitted in parallel, one process per crop, and a report
+with fit time, model size, predict latency and test metrics is written.
+
+Usage:
+    python train_driver.py --n-jobs 3
+    python train_driver.py --search --n-estimators 25 50 100 --max-depth 8 16 0 --n-jobs 4
+"""
+import argparse
+import io
+import itertools
+import json
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from models.dataset import SOIL_YIELD_CSV, load_dataset
+from models.model_store import CROP_MODEL_FILES
+
+FEATURES = ['PHAQ', 'TOTC', 'TOTN', 'CECS', 'TEMP', 'RAIN', 'HUMI', 'SUNH']
+TARGETS = {
+    'maize': 'Estimated_Maize_Yield',
+    'cassava': 'Estimated_Cassava_Yield',
+    'beans': 'Estimated_Beans_Yield'
+}
+TRAINING_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def shared_split(n_rows, test_size=0.2, random_state=42):
+    """
+    Splits row positions once so that every crop trains and tests on the same rows.
+
+    Returns:
+        tuple: Training and test row positions.
+    """
+    from sklearn.model_selection import train_test_split
+    return train_test_split(np.arange(n_rows), test_size=test_size, random_state=random_state)
+
+
+def model_size(model):
+    """
+    Returns the size in bytes of a model as joblib writes it.
+    """
+    buffer = io.BytesIO()
+    joblib.dump(model, buffer)
+    return buffer.tell()
+
+
+def predict_latency(model, X, repeats=50):
+    """
+    Returns the median time in seconds to predict a single row, as the backend does.
+    """
+    row = X.iloc[:1]
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        model.predict(row)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def evaluate(model, X, y):
+    from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+    predictions = model.predict(X)
+    return {
+        'rmse': float(np.sqrt(mean_squared_error(y, predictions))),
+        'mae': float(mean_absolute_error(y, predictions)),
+        'r2': float(r2_score(y, predictions))
+    }
+
+
+def fit_model(crop, params, X_train, y_train, X_eval, y_eval, random_state=42, latency_repeats=50):
+    """
+    Fits one forest and measures it. Runs in a worker process.
+
+    Parameters:
+        crop (str): Crop the model is for.
+        params (dict): n_estimators and max_depth of the forest.
+        X_train, y_train: Data the forest is fitted on.
+        X_eval, y_eval: Data the forest is scored on.
+
+    Returns:
+        dict: The fitted model and its fit time, size, predict latency and metrics.
+    """
+    from sklearn.ensemble import RandomForestRegressor
+    model = RandomForestRegressor(random_state=random_state, n_jobs=1, **params)
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+    return {
+        'crop': crop,
+        'params': params,
+        'model': model,
+        'fit_seconds': fit_seconds,
+        'model_bytes': model_size(model),
+        'predict_latency_ms': predict_latency(model, X_eval, latency_repeats) * 1000,
+        **evaluate(model, X_eval, y_eval)
+    }
+
+
+def select_candidate(candidates, tolerance=0.02):
+    """
+    Picks the candidate with the lowest predict latency among those whose RMSE is
+    within tolerance of the best RMSE.
+
+    Parameters:
+        candidates (list): Results of fit_model for one crop.
+        tolerance (float): Accepted relative increase of RMSE over the best candidate.
+
+    Returns:
+        dict: The chosen candidate.
+    """
+    best_rmse = min(candidate['rmse'] for candidate in candidates)
+    acceptable = [candidate for candidate in candidates if candidate['rmse'] <= best_rmse * (1 + tolerance)]
+    return min(acceptable, key=lambda candidate: (candidate['predict_latency_ms'], candidate['rmse']))
+
+
+def pareto_front(candidates):
+    """
+    Returns the candidates no other candidate beats on both RMSE and predict latency.
+    """
+    def dominates(a, b):
+        return (a['rmse'] <= b['rmse'] and a['predict_latency_ms'] <= b['predict_latency_ms']
+                and (a['rmse'] < b['rmse'] or a['predict_latency_ms'] < b['predict_latency_ms']))
+    return [candidate for candidate in candidates if not any(dominates(other, candidate) for other in candidates)]
+
+
+def search(X, targets, train_rows, param_grid, n_jobs, tolerance, validation_size=0.25, random_state=42):
+    """
+    Runs the hyperparameter search for every crop in one pool of worker processes.
+
+    The training rows are split once more into fitting and validation rows, so the
+    test rows stay unseen until the final models are scored.
+
+    Returns:
+        dict: Crop to its chosen parameters and the Pareto front of its candidates.
+    """
+    from sklearn.model_selection import train_test_split
+    fit_rows, validation_rows = train_test_split(train_rows, test_size=validation_size, random_state=random_state)
+    tasks = [
+        joblib.delayed(fit_model)(crop, params, X.iloc[fit_rows], y.iloc[fit_rows],
+                                  X.iloc[validation_rows], y.iloc[validation_rows], random_state)
+        for crop, y in targets.items() for params in param_grid
+    ]
+    results = joblib.Parallel(n_jobs=n_jobs)(tasks)
+
+    chosen = {}
+    for crop in targets:
+        candidates = [dict(result, model=None) for result in results if result['crop'] == crop]
+        best = select_candidate(candidates, tolerance)
+        chosen[crop] = {
+            'params': best['params'],
+            'pareto_front': [{key: c[key] for key in ('params', 'rmse', 'predict_latency_ms', 'model_bytes')}
+                             for c in sorted(pareto_front(candidates), key=lambda c: c['rmse'])]
+        }
+    return chosen
+
+
+def train_all(data, crops=None, params=None, param_grid=None, n_jobs=-1, tolerance=0.02, output_dir=None,
+              test_size=0.2, random_state=42):
+    """
+    Trains a yield model for every crop in parallel on one shared split.
+
+    Parameters:
+        data (DataFrame): The FEATURES and the target column of every crop.
+        crops (list): Crops to train; all of TARGETS if None.
+        params (dict): Forest parameters used when there is no search.
+        param_grid (list): Parameter dicts to search over, or None to skip the search.
+        n_jobs (int): Worker processes, -1 for one per CPU.
+        tolerance (float): See select_candidate.
+        output_dir (str): Where the models are saved; not saved if None.
+
+    Returns:
+        dict: The training report.
+    """
+    crops = crops or list(TARGETS)
+    X = data[FEATURES]
+    targets = {crop: data[TARGETS[crop]] for crop in crops}
+    train_rows, test_rows = shared_split(len(data), test_size, random_state)
+
+    report = {'rows': len(data), 'train_rows': len(train_rows), 'test_rows': len(test_rows), 'crops': {}}
+    chosen = {crop: {'params': params or {'n_estimators': 100, 'max_depth': None}} for crop in crops}
+    if param_grid:
+        start = time.perf_counter()
+        chosen = search(X, targets, train_rows, param_grid, n_jobs, tolerance, random_state=random_state)
+        report['search_seconds'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = joblib.Parallel(n_jobs=n_jobs)(
+        joblib.delayed(fit_model)(crop, chosen[crop]['params'], X.iloc[train_rows], y.iloc[train_rows],
+                                  X.iloc[test_rows], y.iloc[test_rows], random_state)
+        for crop, y in targets.items()
+    )
+    report['train_seconds'] = time.perf_counter() - start
+
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    for result in results:
+        crop = result.pop('crop')
+        model = result.pop('model')
+        if output_dir:
+            path = os.path.join(output_dir, CROP_MODEL_FILES[crop])
+            joblib.dump(model, path)
+            result['path'] = path
+        if 'pareto_front' in chosen[crop]:
+            result['pareto_front'] = chosen[crop]['pareto_front']
+        report['crops'][crop] = result
+    return report
+
+
+def parse_depth(value):
+    depth = int(value)
+    return None if depth <= 0 else depth
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Train the crop yield models in parallel.')
+    parser.add_argument('--data', default=SOIL_YIELD_CSV)
+    parser.add_argument('--crops', nargs='+', choices=list(TARGETS), default=list(TARGETS))
+    parser.add_argument('--n-jobs', type=int, default=-1, help='Worker processes, -1 for one per CPU')
+    parser.add_argument('--search', action='store_true', help='Search n_estimators and max_depth')
+    parser.add_argument('--n-estimators', type=int, nargs='+', default=[25, 50, 100, 200])
+    parser.add_argument('--max-depth', type=parse_depth, nargs='+', default=[8, 12, 16, None],
+                        help='Depths to try; 0 for unlimited')
+    parser.add_argument('--tolerance', type=float, default=0.02,
+                        help='Accepted relative RMSE increase in exchange for faster prediction')
+    parser.add_argument('--output-dir', default=TRAINING_DIR)
+    parser.add_argument('--report', default=os.path.join(TRAINING_DIR, 'training_report.json'))
+    args = parser.parse_args(argv)
+
+    data = load_dataset(args.data, FEATURES + [TARGETS[crop] for crop in args.crops])
+    param_grid = None
+    if args.search:
+        param_grid = [{'n_estimators': n, 'max_depth': d} for n, d in itertools.product(args.n_estimators, args.max_depth)]
+
+    report = train_all(data, args.crops, param_grid=param_grid, n_jobs=args.n_jobs, tolerance=args.tolerance,
+                       output_dir=args.output_dir)
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{report['rows']} rows, {report['train_rows']} train / {report['test_rows']} test, "
+          f"trained in {report['train_seconds']:.1f}s"
+          + (f" after a {report['search_seconds']:.1f}s search" if 'search_seconds' in report else ''))
+    for crop, result in report['crops'].items():
+        print(f"  {crop:<8} {result['params']} fit={result['fit_seconds']:.2f}s size={result['model_bytes'] / 1024:.0f}KiB "
+              f"predict={result['predict_latency_ms']:.2f}ms rmse={result['rmse']:.1f} r2={result['r2']:.4f}")
+    print(f"Report written to {args.report}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
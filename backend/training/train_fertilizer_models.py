@@ -1,15 +1,20 @@
-import pandas as pd
+import os
+import sys
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 from sklearn.model_selection import train_test_split
 import joblib
 
-# Load the combined dataset
-df = pd.read_csv('../data/soil_climate_yield_data.csv')
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from models.dataset import SOIL_YIELD_CSV, load_dataset
 
 # Define the features used for the model. These are 
 # the environmental and soil characteristics.
 features = ['PHAQ', 'TOTC', 'TOTN', 'CECS','TEMP', 'RAIN', 'HUMI', 'SUNH']
+
+# Load the combined dataset from its columnar cache, reading only the columns used here
+df = load_dataset(SOIL_YIELD_CSV, features + ['Estimated_Maize_Yield', 'Estimated_Cassava_Yield', 'Estimated_Beans_Yield'])
 X = df[features]
 y_maize = df['Estimated_Maize_Yield']
 y_cassava = df['Estimated_Cassava_Yield']
@@ -30,10 +35,11 @@ model_maize.fit(X_train_maize, y_train_maize)
 model_cassava.fit(X_train_cassava, y_train_cassava)
 model_beans.fit(X_train_beans, y_train_beans)
 
-# Save the models
-joblib.dump(model_maize, 'model_maize.joblib')
-joblib.dump(model_cassava, 'model_cassava.joblib')
-joblib.dump(model_beans, 'model_beans.joblib')
+# Save the models next to this script, where the backend loads them from
+training_dir = os.path.dirname(os.path.abspath(__file__))
+joblib.dump(model_maize, os.path.join(training_dir, 'model_maize.joblib'))
+joblib.dump(model_cassava, os.path.join(training_dir, 'model_cassava.joblib'))
+joblib.dump(model_beans, os.path.join(training_dir, 'model_beans.joblib'))
 
 # Predict on the test set
 y_pred_maize = model_maize.predict(X_test_maize)